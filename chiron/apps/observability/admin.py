@@ -0,0 +1,84 @@
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.utils.translation import gettext_lazy as _
+from . import models, profiling
+
+
+class ProfileAdmin(admin.ModelAdmin):
+    verbose_name = _("profile")
+    verbose_name_plural = _("profiles")
+    model = models.Profile
+    list_display = [
+        "route",
+        "method",
+        "status",
+        "duration_ms",
+        "reason",
+        "date_created",
+        "download",
+    ]
+    list_filter = ["reason", "route"]
+    search_fields = ["route", "path"]
+    fields = [
+        "route",
+        "method",
+        "path",
+        "status",
+        "duration_ms",
+        "reason",
+        "date_created",
+        "download",
+        "summary",
+    ]
+    readonly_fields = fields
+    can_delete = True
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description=_("duration (ms)"), ordering="duration")
+    def duration_ms(self, profile):
+        return round(profile.duration * 1000, 1)
+
+    @admin.display(description=_("profile"))
+    def download(self, profile):
+        url = reverse("admin:observability_profile_download", args=[profile.pk])
+        return format_html('<a href="{}">{}</a>', url, profile.file)
+
+    @admin.display(description=_("slowest functions (cumulative)"))
+    def summary(self, profile):
+        try:
+            text = profiling.summary(profile)
+        except OSError:
+            text = _("The profile file is missing.")
+        return format_html("<pre>{}</pre>", text)
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:pk>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="observability_profile_download",
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        profile = self.get_object(request, str(pk))
+        if profile is None or not self.has_view_permission(request, profile):
+            raise Http404
+        try:
+            return FileResponse(
+                open(profile.path_on_disk, "rb"),
+                as_attachment=True,
+                filename=profile.file,
+            )
+        except FileNotFoundError:
+            raise Http404
+
+
+admin.site.register(models.Profile, ProfileAdmin)
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class ObservabilityConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "chiron.apps.observability"
+
+    def ready(self):
+        from . import instrumentation, signals  # noqa: F401
+
+        connection_created.connect(instrumentation.install)
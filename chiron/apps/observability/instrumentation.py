@@ -0,0 +1,86 @@
+"""
+Where the time of a request goes: SQL queries and serialization.
+
+Measurements go to the `Record` in `recording`, set by the middleware for sampled
+requests only. Everything else pays for one context variable lookup per query and
+per rendered body, plus timing queries for the slow query log. Context variables
+follow `sync_to_async`, async views get their queries recorded as well.
+"""
+
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from . import slowlog
+
+recording = ContextVar("recording", default=None)
+# the request being served, whatever the sampling
+current_request = ContextVar("current_request", default=None)
+
+
+class Record:
+    """
+    The measurements of one request, durations in seconds.
+    """
+
+    __slots__ = ("began", "queries", "db", "serialize", "serializing")
+
+    def __init__(self):
+        self.began = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.serializing = False
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.began
+
+
+def route(request):
+    # view names, paths of unmatched requests would be unbounded label values
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "unmatched"
+
+
+def origin():
+    request = current_request.get()
+    if request is None:
+        return None
+    return f"{request.method} {route(request)} {request.path}"
+
+
+def record_query(execute, sql, params, many, context):
+    began = time.perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed = time.perf_counter() - began
+    record = recording.get()
+    if record is not None:
+        record.queries += 1
+        record.db += elapsed
+    if elapsed >= settings.SLOW_QUERIES["THRESHOLD"]:
+        slowlog.report(sql, params, many, context["connection"], elapsed, origin())
+    return result
+
+
+def install(sender, connection, **kwargs):
+    """
+    Record and watch for slow ones the queries of every new database connection.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed(function):
+    def timed_function(*args, **kwargs):
+        record = recording.get()
+        if record is None or record.serializing:
+            return function(*args, **kwargs)
+        record.serializing = True
+        began = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record.serialize += time.perf_counter() - began
+            record.serializing = False
+
+    return timed_function
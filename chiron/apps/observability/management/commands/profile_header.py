@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from chiron.apps.observability import profiling
+
+
+class Command(BaseCommand):
+    help = "Print a signed header that has requests carrying it profiled."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{settings.PROFILING['HEADER']}: {profiling.sign()}")
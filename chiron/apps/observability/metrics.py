@@ -0,0 +1,126 @@
+"""
+In-process counters and histograms, exposed in the Prometheus text format.
+
+Each process serves its own metrics, labelled with the `worker` (host and process
+id) they come from: the workers behind a single `/metrics/` address answer scrapes
+in turn, and their series mustn't mix. Totals are sums over `worker`.
+"""
+
+import bisect
+import os
+import socket
+import threading
+
+
+def format_pair(name, value):
+    value = str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+    return f'{name}="{value}"'
+
+
+def format_labels(names, values, extra=()):
+    pairs = [format_pair(name, value) for name, value in zip(names, values)]
+    pairs.extend(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def worker():
+    # looked up on each exposition, workers fork after this module is imported
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}  # label values -> count
+        self.lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def samples(self, extra=()):
+        with self.lock:
+            series = sorted(self.series.items())
+        for labels, value in series:
+            yield f"{self.name}{format_labels(self.labels, labels, extra)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, labels=(), value=0):
+        with self.lock:
+            self.series[labels] = value
+
+    def samples(self, extra=()):
+        with self.lock:
+            series = sorted(self.series.items())
+        for labels, value in series:
+            value = format_value(value)
+            yield f"{self.name}{format_labels(self.labels, labels, extra)} {value}"
+
+
+class Histogram(Counter):
+    """
+    Observations counted in cumulative `buckets` (upper bounds, ascending).
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = list(buckets)
+
+    def observe(self, labels, value):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # a count per bucket and +Inf, then the sum
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def samples(self, extra=()):
+        with self.lock:
+            series = sorted(
+                (labels, list(values)) for labels, values in self.series.items()
+            )
+        bounds = [format_value(float(bound)) for bound in self.buckets] + ["+Inf"]
+        for labels, values in series:
+            total = 0
+            for bound, count in zip(bounds, values):
+                total += count
+                le = format_labels(self.labels, labels, (*extra, f'le="{bound}"'))
+                yield f"{self.name}_bucket{le} {total}"
+            labels = format_labels(self.labels, labels, extra)
+            yield f"{self.name}_sum{labels} {format_value(values[-1])}"
+            yield f"{self.name}_count{labels} {total}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def expose(self):
+        lines = []
+        extra = (format_pair("worker", worker()),)
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples(extra))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
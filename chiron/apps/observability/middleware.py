@@ -0,0 +1,119 @@
+"""
+Per-request timing of sampled requests: the number and duration of SQL queries,
+serialization and the whole request, as per-route metrics at `/metrics/` and,
+if `SERVER_TIMING` is set, as a `Server-Timing` header. Every request is the origin of its slow queries,
+see `slowlog`.
+
+Durations cover the view and the middleware after this one, up to the response;
+streamed bodies are produced after it and aren't part of them.
+"""
+
+import asyncio
+import random
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+from . import instrumentation
+from .metrics import Counter, Gauge, Histogram, registry
+
+LABELS = ("route", "method")
+
+requests = registry.register(
+    Counter(
+        "chiron_requests_total",
+        "Sampled requests by route, method and status code.",
+        LABELS + ("status",),
+    )
+)
+duration = registry.register(
+    Histogram(
+        "chiron_request_duration_seconds",
+        "Time to respond to sampled requests.",
+        LABELS,
+        settings.OBSERVABILITY["BUCKETS"],
+    )
+)
+db = registry.register(
+    Histogram(
+        "chiron_request_db_seconds",
+        "Time spent in SQL queries per sampled request.",
+        LABELS,
+        settings.OBSERVABILITY["BUCKETS"],
+    )
+)
+serialize = registry.register(
+    Histogram(
+        "chiron_request_serialize_seconds",
+        "Time spent rendering response bodies per sampled request.",
+        LABELS,
+        settings.OBSERVABILITY["BUCKETS"],
+    )
+)
+queries = registry.register(
+    Histogram(
+        "chiron_request_queries",
+        "SQL queries per sampled request.",
+        LABELS,
+        settings.OBSERVABILITY["QUERY_BUCKETS"],
+    )
+)
+sample_rate = registry.register(
+    Gauge("chiron_request_sample_rate", "Fraction of the requests measured.")
+)
+
+
+def start(request):
+    tokens = [instrumentation.current_request.set(request)]
+    rate = settings.OBSERVABILITY["SAMPLE_RATE"]
+    sample_rate.set(value=rate)
+    if rate <= 0 or random.random() >= rate:
+        return None, tokens
+    record = instrumentation.Record()
+    tokens.append(instrumentation.recording.set(record))
+    return record, tokens
+
+
+def stop(tokens):
+    for token in reversed(tokens):
+        token.var.reset(token)
+
+
+def finish(request, response, record):
+    elapsed = record.elapsed
+    labels = (instrumentation.route(request), request.method)
+    requests.inc(labels + (str(response.status_code),))
+    duration.observe(labels, elapsed)
+    db.observe(labels, record.db)
+    serialize.observe(labels, record.serialize)
+    queries.observe(labels, record.queries)
+    if settings.OBSERVABILITY["SERVER_TIMING"]:
+        response["Server-Timing"] = (
+            f'db;dur={record.db * 1000:.2f};desc="{record.queries} queries", '
+            f"serialize;dur={record.serialize * 1000:.2f}, "
+            f"app;dur={elapsed * 1000:.2f}"
+        )
+    return response
+
+
+@sync_and_async_middleware
+def request_metrics(get_response):
+    if asyncio.iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            record, tokens = start(request)
+            try:
+                response = await get_response(request)
+            finally:
+                stop(tokens)
+            return response if record is None else finish(request, response, record)
+
+    else:
+
+        def middleware(request):
+            record, tokens = start(request)
+            try:
+                response = get_response(request)
+            finally:
+                stop(tokens)
+            return response if record is None else finish(request, response, record)
+
+    return middleware
@@ -0,0 +1,64 @@
+# Generated by Django 4.0.2 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Profile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "route",
+                    models.CharField(
+                        db_index=True, max_length=255, verbose_name="route"
+                    ),
+                ),
+                ("method", models.CharField(max_length=10, verbose_name="method")),
+                ("path", models.CharField(max_length=255, verbose_name="path")),
+                ("status", models.PositiveSmallIntegerField(verbose_name="status")),
+                (
+                    "duration",
+                    models.FloatField(help_text="In seconds.", verbose_name="duration"),
+                ),
+                (
+                    "reason",
+                    models.CharField(
+                        choices=[("slow", "slow"), ("requested", "requested")],
+                        max_length=16,
+                        verbose_name="reason",
+                    ),
+                ),
+                (
+                    "file",
+                    models.CharField(
+                        editable=False, max_length=255, verbose_name="file"
+                    ),
+                ),
+                (
+                    "size",
+                    models.PositiveIntegerField(
+                        help_text="In bytes.", verbose_name="size"
+                    ),
+                ),
+                (
+                    "date_created",
+                    models.DateTimeField(auto_now_add=True, verbose_name="date added"),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+import os
+from django.conf import settings
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class Profile(models.Model):
+    """
+    A cProfile profile of one request, stored as `file` in `PROFILING["DIRECTORY"]`.
+    """
+
+    SLOW = "slow"
+    REQUESTED = "requested"
+    REASONS = [(SLOW, _("slow")), (REQUESTED, _("requested"))]
+
+    route = models.CharField(_("route"), max_length=255, db_index=True)
+    method = models.CharField(_("method"), max_length=10)
+    path = models.CharField(_("path"), max_length=255)
+    status = models.PositiveSmallIntegerField(_("status"))
+    duration = models.FloatField(_("duration"), help_text=_("In seconds."))
+    reason = models.CharField(_("reason"), max_length=16, choices=REASONS)
+    file = models.CharField(_("file"), max_length=255, editable=False)
+    size = models.PositiveIntegerField(_("size"), help_text=_("In bytes."))
+    date_created = models.DateTimeField(_("date added"), auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.method} {self.route} ({self.duration * 1000:.0f} ms)"
+
+    @property
+    def path_on_disk(self):
+        return os.path.join(settings.PROFILING["DIRECTORY"], self.file)
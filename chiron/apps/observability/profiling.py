@@ -0,0 +1,124 @@
+"""
+cProfile profiles of single requests, kept in a bounded directory and browsable
+from the admin.
+
+A request is profiled when it carries a valid signed `PROFILING["HEADER"]` (see
+`sign`) or, for a `PROFILING["SAMPLE_RATE"]` fraction of requests, kept only if it
+turned out slower than `PROFILING["THRESHOLD"]`. Requests that aren't profiled
+cost one random number and one header lookup.
+
+Only synchronous requests are profiled, a profile of the event loop would mix the
+requests it serves at the same time.
+"""
+
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import time
+from django.conf import settings
+from django.core import signing
+from django.utils.decorators import sync_and_async_middleware
+from . import instrumentation, models
+
+SALT = "chiron.observability.profiling"
+REQUESTED = "profile"
+
+
+def sign():
+    """
+    A value of the profiling header, valid for `PROFILING["MAX_AGE"]` seconds.
+    """
+    return signing.TimestampSigner(salt=SALT).sign(REQUESTED)
+
+
+def requested(request):
+    value = request.headers.get(settings.PROFILING["HEADER"])
+    if not value:
+        return False
+    try:
+        signer = signing.TimestampSigner(salt=SALT)
+        return signer.unsign(value, max_age=settings.PROFILING["MAX_AGE"]) == REQUESTED
+    except signing.BadSignature:
+        return False
+
+
+def directory():
+    path = settings.PROFILING["DIRECTORY"]
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def save(profiler, request, response, duration, reason):
+    """
+    Write the profile of `request` next to the others, dropping the oldest ones
+    beyond `PROFILING["MAX_PROFILES"]`.
+    """
+    route = instrumentation.route(request)
+    name = "{}-{}.prof".format(time.time_ns(), re.sub(r"[^\w.-]", "_", route))
+    path = os.path.join(directory(), name)
+    profiler.dump_stats(path)
+    profile = models.Profile.objects.create(
+        route=route,
+        method=request.method,
+        path=request.path[:255],
+        status=response.status_code,
+        duration=duration,
+        reason=reason,
+        file=name,
+        size=os.path.getsize(path),
+    )
+    stale = models.Profile.objects.order_by("-pk")[settings.PROFILING["MAX_PROFILES"] :]
+    # deleting each removes its file, see signals
+    for old in stale:
+        old.delete()
+    return profile
+
+
+def summary(profile, limit=40):
+    """
+    The `limit` functions of `profile` with the highest cumulative time, as text.
+    """
+    output = io.StringIO()
+    stats = pstats.Stats(profile.path_on_disk, stream=output)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
+
+
+def profile_request(get_response, request):
+    config = settings.PROFILING
+    reason = None
+    if requested(request):
+        reason = models.Profile.REQUESTED
+    elif config["SAMPLE_RATE"] > 0 and random.random() < config["SAMPLE_RATE"]:
+        reason = models.Profile.SLOW
+    if reason is None:
+        return get_response(request)
+
+    profiler = cProfile.Profile()
+    began = time.perf_counter()
+    profiler.enable()
+    try:
+        response = get_response(request)
+    finally:
+        profiler.disable()
+    duration = time.perf_counter() - began
+    if reason == models.Profile.REQUESTED or duration >= config["THRESHOLD"]:
+        profile = save(profiler, request, response, duration, reason)
+        if reason == models.Profile.REQUESTED:
+            response["X-Profile-Id"] = str(profile.pk)
+    return response
+
+
+@sync_and_async_middleware
+def request_profiling(get_response):
+    if asyncio.iscoroutinefunction(get_response):
+        return get_response
+
+    def middleware(request):
+        return profile_request(get_response, request)
+
+    return middleware
@@ -0,0 +1,16 @@
+"""
+DRF's renderers, timing the response bodies they render as the serialization time
+of sampled requests (see `instrumentation`). Representations built by the views
+before rendering are part of the view's time.
+"""
+
+from rest_framework import renderers
+from .instrumentation import timed
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    render = timed(renderers.JSONRenderer.render)
+
+
+class BrowsableAPIRenderer(renderers.BrowsableAPIRenderer):
+    render = timed(renderers.BrowsableAPIRenderer.render)
@@ -0,0 +1,12 @@
+import os
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from . import models
+
+
+@receiver(post_delete, sender=models.Profile)
+def delete_profile_file(sender, instance, **kwargs):
+    try:
+        os.remove(instance.path_on_disk)
+    except FileNotFoundError:
+        pass
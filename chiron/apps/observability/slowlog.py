@@ -0,0 +1,104 @@
+"""
+Log of the queries slower than `settings.SLOW_QUERIES["THRESHOLD"]`, to the
+`chiron.slow_queries` logger (a rotating file, see `settings.LOGGING`).
+
+Queries are told apart by their fingerprint, the SQL without its values. An entry
+is written the 1st, 2nd, 4th, 8th... time a fingerprint is slow, with its counters
+so far, the view it came from and the query plan at that moment, so a hot slow
+query can't flood the log.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.db import DatabaseError
+
+logger = logging.getLogger("chiron.slow_queries")
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s|\?")
+LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+SPACES = re.compile(r"\s+")
+
+
+def normalize(sql):
+    """
+    `sql` without values: literals and placeholders become `?` and lists of them
+    `(...)`, so queries differing by their parameters or `IN` lengths match.
+    """
+    sql = LITERALS.sub("?", sql)
+    sql = LISTS.sub("(...)", sql)
+    return SPACES.sub(" ", sql).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def explain(connection, sql, params):
+    """
+    The query plan of `sql`, straight from the database cursor so that it isn't
+    recorded (or explained) itself.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.cursor.execute(
+                f"{connection.ops.explain_query_prefix()} {sql}", params
+            )
+            return [
+                " ".join(str(column) for column in row) for row in cursor.fetchall()
+            ]
+    except DatabaseError as error:
+        return [f"unavailable: {error}"]
+
+
+class SlowQueries:
+    """
+    The counters of the slow queries of this process, by fingerprint, keeping the
+    `size` most recently seen ones.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, normalized, duration):
+        """
+        Count a slow query, returning its counters when it is due to be logged.
+        """
+        key = fingerprint(normalized)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                entry = dict(
+                    fingerprint=key, sql=normalized, count=0, total_ms=0.0, max_ms=0.0
+                )
+            self.entries[key] = entry
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+            entry["count"] += 1
+            entry["total_ms"] += duration * 1000
+            entry["max_ms"] = max(entry["max_ms"], duration * 1000)
+            count = entry["count"]
+            return dict(entry) if count & (count - 1) == 0 else None
+
+
+queries = SlowQueries(settings.SLOW_QUERIES["MAX_FINGERPRINTS"])
+
+
+def report(sql, params, many, connection, duration, origin):
+    entry = queries.add(normalize(sql), duration)
+    if entry is None:
+        return
+    entry.update(
+        origin=origin,
+        duration_ms=round(duration * 1000, 3),
+        total_ms=round(entry["total_ms"], 3),
+        max_ms=round(entry["max_ms"], 3),
+        plan=None if many else explain(connection, sql, params),
+    )
+    logger.warning(json.dumps(entry))
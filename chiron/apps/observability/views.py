@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from .metrics import registry
+
+# set by reverse proxies, whose own address is then REMOTE_ADDR whoever the client
+FORWARDED = ("HTTP_X_FORWARDED_FOR", "HTTP_FORWARDED", "HTTP_X_REAL_IP")
+
+
+def may_scrape(request):
+    token = settings.OBSERVABILITY["METRICS_TOKEN"]
+    if token:
+        authorization = request.META.get("HTTP_AUTHORIZATION", "")
+        return constant_time_compare(authorization, f"Bearer {token}")
+    if any(header in request.META for header in FORWARDED):
+        return False
+    return request.META.get("REMOTE_ADDR") in settings.OBSERVABILITY["METRICS_IPS"]
+
+
+@require_GET
+def metrics(request):
+    """
+    This process' metrics in the Prometheus text format, for scraping agents with the
+    `METRICS_TOKEN` bearer token, or local ones reaching the server directly.
+    """
+    if not may_scrape(request):
+        raise Http404
+    return HttpResponse(
+        registry.expose(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from django.utils.translation import gettext_lazy as _
+from . import models
+
+
+class EmailAdmin(admin.ModelAdmin):
+    verbose_name = _("email")
+    verbose_name_plural = _("emails")
+    model = models.Email
+    search_fields = ["to", "subject"]
+    list_display = ["to", "subject", "date_created", "attempts", "sent_at", "failed"]
+    list_filter = ["failed"]
+    readonly_fields = ["date_created", "claimed_until", "sent_at", "last_error"]
+    can_delete = True
+
+
+admin.site.register(models.Email, EmailAdmin)
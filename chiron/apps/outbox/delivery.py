@@ -0,0 +1,70 @@
+import logging
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.utils import timezone
+from .models import Email
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts):
+    """
+    How long to wait before attempt number `attempts + 1`, doubling every time.
+    """
+    config = settings.OUTBOX
+    return min(config["RETRY_DELAY"] * 2 ** (attempts - 1), config["MAX_RETRY_DELAY"])
+
+
+def send_batch(emails, connection):
+    """
+    Send the claimed `emails` over the one (already opened) `connection` and record
+    the outcome of each right after it, returning how many were sent.
+    """
+    sent = 0
+    for email in emails:
+        message = EmailMessage(
+            email.subject, email.body, to=[email.to], connection=connection
+        )
+        try:
+            # reopens the connection if an earlier failure closed it, no-op otherwise
+            connection.open()
+            message.send()
+        except Exception as error:
+            logger.warning(
+                "sending email %s to %s failed: %s", email.pk, email.to, error
+            )
+            connection.close()
+            attempts = email.attempts + 1
+            Email.objects.filter(pk=email.pk).update(
+                attempts=F("attempts") + 1,
+                last_error=str(error),
+                next_attempt=timezone.now() + retry_delay(attempts),
+                failed=attempts >= settings.OUTBOX["MAX_ATTEMPTS"],
+                claim=None,
+                claimed_until=None,
+            )
+        else:
+            # at once, a crash later in the batch mustn't have it sent again
+            Email.objects.filter(pk=email.pk).update(
+                sent_at=timezone.now(),
+                attempts=F("attempts") + 1,
+                claim=None,
+                claimed_until=None,
+            )
+            sent += 1
+    return sent
+
+
+def deliver(batch_size=None, connection=None):
+    """
+    Claim one batch of due emails and send it, returning `(claimed, sent)`.
+    """
+    config = settings.OUTBOX
+    emails = Email.objects.claim(batch_size or config["BATCH_SIZE"], config["LEASE"])
+    if not emails:
+        return 0, 0
+    if connection is not None:
+        return len(emails), send_batch(emails, connection)
+    with get_connection() as connection:
+        return len(emails), send_batch(emails, connection)
@@ -0,0 +1,46 @@
+import time
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from chiron.apps.outbox import delivery
+
+
+class Command(BaseCommand):
+    help = "Deliver queued emails in batches, over one reused connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no email is due instead of waiting for more.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.OUTBOX["BATCH_SIZE"]
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.OUTBOX["POLL_INTERVAL"],
+            help="Seconds to wait for new emails when the outbox is empty.",
+        )
+
+    def handle(self, *args, once=False, batch_size=None, interval=None, **options):
+        total = 0
+        connection = get_connection()
+        try:
+            while True:
+                claimed, sent = delivery.deliver(batch_size, connection=connection)
+                total += sent
+                if claimed:
+                    self.stdout.write(f"sent {sent} of {claimed} emails")
+                    continue
+                if once:
+                    break
+                # don't hold the SMTP connection open while idle
+                connection.close()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+        self.stdout.write(self.style.SUCCESS(f"sent {total} emails"))
@@ -0,0 +1,87 @@
+# Generated by Django 4.0.2 on 2026-10-18 18:25
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Email",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("to", models.EmailField(max_length=254, verbose_name="to")),
+                ("subject", models.CharField(max_length=255, verbose_name="subject")),
+                ("body", models.TextField(verbose_name="body")),
+                (
+                    "date_created",
+                    models.DateTimeField(auto_now_add=True, verbose_name="date added"),
+                ),
+                (
+                    "next_attempt",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="next attempt"
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="attempts"
+                    ),
+                ),
+                (
+                    "last_error",
+                    models.TextField(blank=True, default="", verbose_name="last error"),
+                ),
+                (
+                    "claim",
+                    models.UUIDField(
+                        blank=True, editable=False, null=True, verbose_name="claim"
+                    ),
+                ),
+                (
+                    "claimed_until",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="claimed until"
+                    ),
+                ),
+                (
+                    "sent_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="sent at"),
+                ),
+                (
+                    "failed",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Delivery was given up after too many attempts.",
+                        verbose_name="failed",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="email",
+            index=models.Index(
+                condition=models.Q(("failed", False), ("sent_at__isnull", True)),
+                fields=["next_attempt"],
+                name="outbox_email_due",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="email",
+            index=models.Index(fields=["claim"], name="outbox_email_claim"),
+        ),
+    ]
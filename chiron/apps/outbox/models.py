@@ -0,0 +1,90 @@
+import uuid
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class EmailQuerySet(models.QuerySet):
+    def enqueue(self, to, subject, body):
+        """
+        Queue an email for delivery. Call it inside the transaction of the change the
+        email is about, so that the two are committed (or rolled back) together.
+        """
+        return self.create(to=to, subject=subject, body=body)
+
+    def enqueue_many(self, emails):
+        """
+        Queue `(to, subject, body)` emails with a single `INSERT`.
+        """
+        return self.bulk_create(
+            self.model(to=to, subject=subject, body=body)
+            for to, subject, body in emails
+        )
+
+    def due(self, now=None):
+        """
+        Unsent emails whose next attempt is due and that no worker holds a lease on.
+        """
+        now = now or timezone.now()
+        return self.filter(
+            Q(claimed_until__isnull=True) | Q(claimed_until__lt=now),
+            sent_at__isnull=True,
+            failed=False,
+            next_attempt__lte=now,
+        )
+
+    def claim(self, size, lease):
+        """
+        Lease up to `size` due emails to the caller for `lease` (a timedelta).
+
+        The candidates are taken over with a conditional `UPDATE` that re-checks they
+        are still due, so concurrent workers never claim the same email.
+        """
+        now = timezone.now()
+        candidates = list(
+            self.due(now)
+            .order_by("next_attempt", "id")
+            .values_list("pk", flat=True)[:size]
+        )
+        if not candidates:
+            return []
+        claim = uuid.uuid4()
+        self.due(now).filter(pk__in=candidates).update(
+            claim=claim, claimed_until=now + lease
+        )
+        return list(self.filter(claim=claim).order_by("next_attempt", "id"))
+
+
+class Email(models.Model):
+    to = models.EmailField(_("to"))
+    subject = models.CharField(_("subject"), max_length=255)
+    body = models.TextField(_("body"))
+    date_created = models.DateTimeField(_("date added"), auto_now_add=True)
+
+    next_attempt = models.DateTimeField(_("next attempt"), default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(_("attempts"), default=0)
+    last_error = models.TextField(_("last error"), blank=True, default="")
+    claim = models.UUIDField(_("claim"), null=True, blank=True, editable=False)
+    claimed_until = models.DateTimeField(_("claimed until"), null=True, blank=True)
+    sent_at = models.DateTimeField(_("sent at"), null=True, blank=True)
+    failed = models.BooleanField(
+        _("failed"),
+        default=False,
+        help_text=_("Delivery was given up after too many attempts."),
+    )
+
+    objects = EmailQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt"],
+                condition=Q(sent_at__isnull=True, failed=False),
+                name="outbox_email_due",
+            ),
+            models.Index(fields=["claim"], name="outbox_email_claim"),
+        ]
+
+    def __str__(self):
+        return f"{self.to}: {self.subject}"
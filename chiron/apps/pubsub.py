@@ -0,0 +1,89 @@
+"""
+Publish/subscribe of messages on named channels, for pushing events to open
+connections. The backend is `settings.EVENTS["BROKER"]`.
+"""
+
+import asyncio
+import threading
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """
+    The messages of one channel for one consumer, buffered up to `size` messages.
+
+    A consumer falling further behind loses messages instead of growing the buffer,
+    `overflowed` then tells it to catch up from the source of truth.
+    """
+
+    def __init__(self, channel, size):
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+    def offer(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class LocalBroker:
+    """
+    Broker reaching the subscribers of the current process only.
+
+    Messages can be published from any thread, they are handed to each subscriber's
+    event loop. Deployments running several processes need a shared backend with the
+    same interface.
+    """
+
+    def __init__(self, buffer=16):
+        self.buffer = buffer
+        self.subscriptions = {}  # channel -> set of subscriptions
+        self.lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """
+        Start buffering the messages of `channel`, must be called from an event loop.
+        """
+        subscription = Subscription(channel, self.buffer)
+        with self.lock:
+            self.subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.channel, None)
+
+    def publish(self, channels, message):
+        with self.lock:
+            subscriptions = [
+                subscription
+                for channel in channels
+                for subscription in self.subscriptions.get(channel, ())
+            ]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                # the subscriber's loop is gone, it unsubscribes on its way out
+                pass
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        config = settings.EVENTS
+        _broker = import_string(config["BROKER"])(buffer=config["BUFFER"])
+    return _broker
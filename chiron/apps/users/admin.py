@@ -4,7 +4,8 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
 from rest_framework.authtoken.models import TokenProxy
 from rest_framework.authtoken.admin import TokenAdmin as DRF_TokenAdmin
-from . import models
+from chiron.apps.admin import ApproximateCountPaginator
+from . import models, search
 
 # website configurations
 admin.site.site_header = _("Chiron Administration")
@@ -20,8 +21,17 @@ class TokenAdmin(DRF_TokenAdmin):
     fields = ["user", "key", "created"]
     readonly_fields = ["key", "created"]
     list_view = ["user__username", "key", "created"]
+    list_select_related = ["user"]
+    search_fields = ["user__username"]
+    show_full_result_count = False
     can_delete = True
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        users = models.User.objects.filter(search.user_filter(search_term))
+        return queryset.filter(user__in=users.values("pk")), False
+
 
 class UserAdmin(BaseUserAdmin):
     fieldsets = (
@@ -57,6 +67,16 @@ class UserAdmin(BaseUserAdmin):
         ),
     )
     list_display = ("username", "email", "first_name", "last_name", "phone", "is_staff")
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Users found by `search.user_filter`, for the changelist and autocompletion.
+        """
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(search.user_filter(search_term)), False
 
 
 admin.site.unregister(AuthGroup)
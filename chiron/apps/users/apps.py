@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "chiron.apps.users"
+
+    def ready(self):
+        from chiron.apps import versions
+        from . import authentication, signals  # noqa: F401
+
+        versions.check_shared_cache()
+        authentication.check_token_cache()
@@ -0,0 +1,32 @@
+"""
+Async versions of the hottest read-only user endpoints, served under `/async/`,
+conditional like their viewset actions.
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from chiron.apps.utils import async_api_view, json_response
+from . import directory, serializers
+from .views import (
+    directory_etag,
+    directory_last_modified,
+    profile_etag,
+    profile_last_modified,
+)
+
+
+@async_api_view(etag_func=profile_etag, last_modified_func=profile_last_modified)
+async def me(request):
+    """
+    Same as `GET /user/me/`, rendered straight from the authenticated user.
+    """
+    return json_response(serializers.EgoUserSerializer(request.user).data)
+
+
+@async_api_view(etag_func=directory_etag, last_modified_func=directory_last_modified)
+async def drs(request):
+    """
+    Same as `GET /user/drs/`, the paginated doctor directory.
+    """
+    content = await sync_to_async(directory.render)(request, serializers.UserSerializer)
+    return HttpResponse(content, content_type="application/json")
@@ -0,0 +1,195 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+
+class LocalTokenCache:
+    """
+    Bounded in-process LRU cache of resolved tokens with a per-entry time to live.
+
+    Invalidation only reaches the current process, the time to live bounds how long
+    other workers may keep serving a revoked token.
+    """
+
+    blocking = False  # lookups never wait on I/O, safe to call from the event loop
+
+    def __init__(self, max_entries=10000, timeout=300):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()  # key -> (expires, user, token)
+        self._user_keys = {}  # user id -> set of cached keys
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, user, token = entry
+            if expires < time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+        # hand out copies so that request handlers can't alter the cached user
+        user = copy.copy(user)
+        token = copy.copy(token)
+        token.user = user
+        return user, token
+
+    def set(self, key, user, token):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + self.timeout, user, token)
+            self._user_keys.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            for key in list(self._user_keys.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._user_keys.get(entry[1].pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[entry[1].pk]
+
+
+class DjangoTokenCache:
+    """
+    Token cache stored in one of the configured Django caches, shared by all workers.
+    """
+
+    prefix = "auth-token:"
+    blocking = True
+
+    def __init__(self, alias="default", timeout=300):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(self.prefix + key)
+
+    def set(self, key, user, token):
+        self.cache.set(self.prefix + key, (user, token), self.timeout)
+
+    def delete(self, key):
+        self.cache.delete(self.prefix + key)
+
+    def delete_user(self, user_id):
+        keys = Token.objects.filter(user_id=user_id).values_list("key", flat=True)
+        self.cache.delete_many([self.prefix + key for key in keys])
+
+    def clear(self):
+        self.cache.clear()
+
+
+def _build_token_cache():
+    config = getattr(settings, "TOKEN_CACHE", {})
+    timeout = config.get("TIMEOUT", 300)
+    if config.get("BACKEND", "local") == "django":
+        return DjangoTokenCache(
+            alias=config.get("CACHE_ALIAS", "default"), timeout=timeout
+        )
+    return LocalTokenCache(
+        max_entries=config.get("MAX_ENTRIES", 10000), timeout=timeout
+    )
+
+
+token_cache = _build_token_cache()
+
+
+def check_token_cache():
+    """
+    Refuse to serve from several processes with the local token cache: logouts,
+    deactivations and deletions would only reach the process handling them.
+    """
+    if settings.WORKERS > 1 and isinstance(token_cache, LocalTokenCache):
+        raise ImproperlyConfigured(
+            f"{settings.WORKERS} workers can't share the local token cache, set "
+            'TOKEN_CACHE_BACKEND to "django"'
+        )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that remembers resolved tokens, sparing the `Token` + `User`
+    lookup on every request. Entries are dropped when the token is deleted (logout)
+    and whenever its user is saved (deactivation, password change) or deleted.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
+
+    async def authenticate_async(self, request):
+        """
+        Async `authenticate` for plain Django requests, a cached token is resolved
+        without leaving the event loop.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            msg = _("Invalid token header. No credentials provided.")
+            raise exceptions.AuthenticationFailed(msg)
+        elif len(auth) > 2:
+            msg = _("Invalid token header. Token string should not contain spaces.")
+            raise exceptions.AuthenticationFailed(msg)
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            msg = _(
+                "Invalid token header. Token string should not contain invalid characters."
+            )
+            raise exceptions.AuthenticationFailed(msg)
+
+        if not token_cache.blocking:
+            cached = token_cache.get(key)
+            if cached is not None:
+                return cached
+        return await sync_to_async(self.authenticate_credentials)(key)
+
+
+async def authenticate_async(request):
+    """
+    The `(user, token)` of a plain Django request as the API's session + token
+    authentication pair would resolve it, or `None` for anonymous requests.
+    """
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        user = await sync_to_async(get_user)(request)
+        if user.is_active:
+            return user, None
+    return await CachedTokenAuthentication().authenticate_async(request)
@@ -0,0 +1,132 @@
+import json
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+from chiron.apps import versions
+from chiron.apps.utils import values_plan
+from . import models, serializers
+
+VERSION_KEY = "doctor-directory:version"
+# user fields that show up in any rendering of the directory
+FIELDS = set(serializers.UserSerializer.Meta.fields) | set(
+    serializers.EgoUserSerializer.Meta.fields
+)
+
+
+def get_version():
+    return versions.get(VERSION_KEY)
+
+
+def bump_version():
+    """
+    Invalidate every cached directory page, called whenever a doctor changes.
+    """
+    versions.touch(VERSION_KEY)
+
+
+def get_or_build(key, build, timeout=None, lock_timeout=10, poll=0.02):
+    """
+    Fetch `key` from the cache or fill it with `build()`, letting only one caller
+    rebuild a missing entry while concurrent callers wait for its result.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+    lock = f"{key}:lock"
+    if cache.add(lock, True, lock_timeout):
+        try:
+            value = build()
+            cache.set(key, value, timeout)
+            return value
+        finally:
+            cache.delete(lock)
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(poll)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    # the rebuilding caller vanished, serve this request without caching
+    return build()
+
+
+def get_page(serializer_class, page, page_size):
+    """
+    The rendered JSON of one page of the doctor directory, as `(count, results)`.
+    """
+    key = "doctor-directory:{version}:{serializer}:{page}:{size}".format(
+        version=get_version(),
+        serializer=serializer_class.__name__,
+        page=page,
+        size=page_size,
+    )
+
+    def build():
+        doctors = models.User.objects.filter(is_doctor=True).order_by("username")
+        offset = (page - 1) * page_size
+        plan = values_plan(serializer_class)
+        rows = plan.values(doctors)[offset : offset + page_size]
+        results = JSONRenderer().render(plan.represent(rows))
+        return doctors.count(), results
+
+    return get_or_build(key, build, timeout=settings.DOCTOR_DIRECTORY["TIMEOUT"])
+
+
+def render_page(count, results, next_url, previous_url):
+    return b'{"count":%d,"next":%s,"previous":%s,"results":%s}' % (
+        count,
+        json.dumps(next_url).encode(),
+        json.dumps(previous_url).encode(),
+        results,
+    )
+
+
+def page_params(request):
+    """
+    The `(page, page_size)` that `request` asks for, raising `NotFound` for invalid ones.
+    """
+    config = settings.DOCTOR_DIRECTORY
+    try:
+        page = int(request.GET.get("page", 1))
+        page_size = min(
+            int(request.GET.get("page_size", config["PAGE_SIZE"])),
+            config["MAX_PAGE_SIZE"],
+        )
+    except ValueError:
+        raise NotFound(_("Invalid page."))
+    if page < 1 or page_size < 1:
+        raise NotFound(_("Invalid page."))
+    return page, page_size
+
+
+def render_links(request, page, page_size, count, results):
+    """
+    `results` as the JSON of a page with links to its neighbours, raising
+    `NotFound` for pages out of range.
+    """
+    if page > 1 and (page - 1) * page_size >= count:
+        raise NotFound(_("Invalid page."))
+
+    url = request.build_absolute_uri()
+    next_url = previous_url = None
+    if page * page_size < count:
+        next_url = replace_query_param(url, "page", page + 1)
+    if page == 2:
+        previous_url = remove_query_param(url, "page")
+    elif page > 2:
+        previous_url = replace_query_param(url, "page", page - 1)
+    return render_page(count, results, next_url, previous_url)
+
+
+def render(request, serializer_class):
+    """
+    The JSON of the directory page that `request` asks for with `page` and
+    `page_size`, raising `NotFound` for pages out of range.
+    """
+    page, page_size = page_params(request)
+    count, results = get_page(serializer_class, page, page_size)
+    return render_links(request, page, page_size, count, results)
@@ -0,0 +1,27 @@
+"""
+Emails sent to users, as `(to, subject, body)` ready for the outbox.
+"""
+
+from django.utils.translation import gettext as _
+
+
+def welcome(user):
+    return (
+        user.email,
+        _("Welcome to Chiron"),
+        _("Hello %(name)s,\n\nyour Chiron account %(username)s has been created.")
+        % {"name": user.name.strip() or user.username, "username": user.username},
+    )
+
+
+def invitation(sender, email):
+    return (
+        email,
+        _("%(name)s invites you to Chiron")
+        % {"name": sender.name.strip() or sender.username},
+        _(
+            "Hello,\n\n%(name)s (%(username)s) invites you to join Chiron, the online "
+            "doctor's office."
+        )
+        % {"name": sender.name.strip() or sender.username, "username": sender.username},
+    )
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# an external content table: the index only, the text stays in users_user. SQLite
+# drops the triggers whenever a migration rebuilds users_user, such a migration has
+# to run DROP and CREATE again.
+CREATE = [
+    """
+    CREATE VIRTUAL TABLE users_user_fts USING fts5(
+        first_name, last_name, username, address,
+        content='users_user', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER users_user_fts_insert AFTER INSERT ON users_user BEGIN
+        INSERT INTO users_user_fts(rowid, first_name, last_name, username, address)
+        VALUES (new.id, new.first_name, new.last_name, new.username, new.address);
+    END
+    """,
+    """
+    CREATE TRIGGER users_user_fts_delete AFTER DELETE ON users_user BEGIN
+        INSERT INTO users_user_fts(
+            users_user_fts, rowid, first_name, last_name, username, address
+        )
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.username,
+                old.address);
+    END
+    """,
+    """
+    CREATE TRIGGER users_user_fts_update
+    AFTER UPDATE OF first_name, last_name, username, address ON users_user BEGIN
+        INSERT INTO users_user_fts(
+            users_user_fts, rowid, first_name, last_name, username, address
+        )
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.username,
+                old.address);
+        INSERT INTO users_user_fts(rowid, first_name, last_name, username, address)
+        VALUES (new.id, new.first_name, new.last_name, new.username, new.address);
+    END
+    """,
+    "INSERT INTO users_user_fts(users_user_fts) VALUES ('rebuild')",
+]
+
+DROP = [
+    "DROP TRIGGER IF EXISTS users_user_fts_update",
+    "DROP TRIGGER IF EXISTS users_user_fts_delete",
+    "DROP TRIGGER IF EXISTS users_user_fts_insert",
+    "DROP TABLE IF EXISTS users_user_fts",
+]
+
+
+def run(statements):
+    # other databases search by scanning, see chiron.apps.users.search
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor == "sqlite":
+            for statement in statements:
+                schema_editor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_user_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -4,6 +4,21 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from django.core.validators import MinLengthValidator
+from django.db import transaction
+from functools import partial
+from chiron.apps import versions
+
+# version stamp of a user's own profile, shared by every worker unlike cached users
+PROFILE_VERSION_KEY = "user:profile:version:{user}"
+
+
+def profile_changed(user):
+    """
+    Give the profile of the given user (id) a new version stamp once the current
+    transaction commits.
+    """
+    key = PROFILE_VERSION_KEY.format(user=user)
+    transaction.on_commit(partial(versions.touch, key))
 
 
 class User(AbstractUser):
@@ -50,6 +65,30 @@ class User(AbstractUser):
         help_text=_("Is this person a patient [default: True]."),
     )
 
+    updated_at = models.DateTimeField(_("date updated"), auto_now=True)
+
+    # stored values that signal handlers compare with the saved ones
+    TRACKED_FIELDS = ("is_doctor", "username", "first_name", "last_name")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_stored()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # after the post_save handlers, whatever app they belong to
+        self.remember_stored()
+
+    def remember_stored(self):
+        # deferred fields aren't known, nor saved
+        self._stored = {
+            name: self.__dict__[name]
+            for name in self.TRACKED_FIELDS
+            if name in self.__dict__
+        }
+
     @property
     def user(self):
         return self
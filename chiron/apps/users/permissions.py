@@ -1,11 +1,60 @@
+from django.contrib.auth import get_user_model
 from rest_framework.permissions import BasePermission
 
 
-class IsSelfOrAdmin(BasePermission):
+class ScopedPermission(BasePermission):
+    """
+    A permission checked by the database: `scope` narrows the view's queryset to the
+    objects the request may act on, see `scope_queryset`. Other objects aren't found
+    (404) instead of being loaded and then refused.
+    """
+
+    def scope(self, request, view, queryset):
+        return queryset
+
+    def branches(self, request, view, queryset):
+        """
+        The scope as querysets whose results together make it up, for scopes that are
+        a union each part of which is cheaper to read on its own.
+        """
+        return [self.scope(request, view, queryset)]
+
+
+def scope_queryset(request, view, queryset):
+    """
+    `queryset` narrowed by every scoped permission of `view`.
+    """
+    for permission in view.get_permissions():
+        if isinstance(permission, ScopedPermission):
+            queryset = permission.scope(request, view, queryset)
+    return queryset
+
+
+def scope_branches(request, view, queryset):
+    """
+    Like `scope_queryset`, as the list of querysets of `ScopedPermission.branches`.
+    """
+    branches = [queryset]
+    for permission in view.get_permissions():
+        if isinstance(permission, ScopedPermission):
+            branches = [
+                part
+                for branch in branches
+                for part in permission.branches(request, view, branch)
+            ]
+    return branches
+
+
+class IsSelfOrAdmin(ScopedPermission):
     """
     Allow access to admin users or the user himself.
     """
 
+    def scope(self, request, view, queryset):
+        if request.user.is_staff:
+            return queryset
+        return queryset.filter(pk=request.user.pk)
+
     def has_object_permission(self, request, view, obj):
         if request.user and request.user.is_staff:
             return True
@@ -14,14 +63,23 @@ class IsSelfOrAdmin(BasePermission):
         return False
 
 
-class IsOwnerOrAdmin(BasePermission):
+class IsOwnerOrAdmin(ScopedPermission):
     """
     Allow access to admin users or the objects owner (assuming that the object has a user attribute
     """
 
+    def scope(self, request, view, queryset):
+        if request.user.is_staff:
+            return queryset
+        if queryset.model is get_user_model():
+            return queryset.filter(pk=request.user.pk)
+        return queryset.filter(user=request.user)
+
     def has_object_permission(self, request, view, obj):
         if request.user and request.user.is_staff:
             return True
-        elif request.user and (obj == request.user or obj.user == request.user):
+        elif request.user and (
+            obj == request.user or getattr(obj, "user_id", None) == request.user.pk
+        ):
             return True
         return False
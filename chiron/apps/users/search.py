@@ -0,0 +1,121 @@
+"""
+Full-text search of doctors by name, username and address.
+
+On SQLite, the search goes through the FTS5 table `users_user_fts` that the
+migration `0003_user_search` keeps in sync with `users_user` through triggers.
+Results are ranked by BM25, with names weighing more than the username and the
+address, and every word of the query matches as a prefix: `jo sm` finds
+"John Smith". Other databases fall back to scanning with `icontains`.
+"""
+
+import re
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework.renderers import JSONRenderer
+from . import directory, models
+
+TABLE = "users_user_fts"
+FIELDS = ["first_name", "last_name", "username", "address"]
+# BM25 weights of FIELDS
+WEIGHTS = [10.0, 10.0, 5.0, 1.0]
+# longer queries don't narrow down results any further in practice
+MAX_TERMS = 8
+
+
+def terms(text):
+    return re.findall(r"\w+", text)[:MAX_TERMS]
+
+
+def match_expression(text):
+    """
+    The FTS5 query matching every word of `text` as a prefix, quoted so that no
+    word is taken for an FTS5 operator.
+    """
+    return " ".join(f'"{term}"*' for term in terms(text))
+
+
+def contains(text):
+    """
+    The filter of users with every word of `text` somewhere in FIELDS.
+    """
+    matches = Q()
+    for term in terms(text):
+        anywhere = Q()
+        for field in FIELDS:
+            anywhere |= Q(**{f"{field}__icontains": term})
+        matches &= anywhere
+    return matches
+
+
+def scan(text):
+    """
+    The doctors matching every word of `text` in any field, by scanning the table.
+    """
+    doctors = models.User.objects.filter(is_doctor=True).filter(contains(text))
+    return doctors.order_by("username")
+
+
+def user_filter(text):
+    """
+    The filter of users whose username, phone number or email address is `text`,
+    or whose FIELDS match every word of `text`, through indexes only except for
+    email addresses.
+    """
+    text = text.strip()
+    exact = Q(username=text)
+    exact |= Q(email__iexact=text) if "@" in text else Q(phone=text)
+    if not terms(text):
+        return exact
+    if connection.vendor != "sqlite":
+        return exact | contains(text)
+    matches = RawSQL(
+        f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s", [match_expression(text)]
+    )
+    return exact | Q(id__in=matches)
+
+
+def search(text, offset, limit):
+    """
+    The doctors matching `text`, best matches first, as `(count, doctors)` with
+    the `limit` doctors after the first `offset` ones.
+    """
+    if not terms(text):
+        return 0, []
+    if connection.vendor != "sqlite":
+        doctors = scan(text)
+        return doctors.count(), list(doctors[offset : offset + limit])
+
+    matches = f"""
+        FROM {TABLE} JOIN users_user ON users_user.id = {TABLE}.rowid
+        WHERE {TABLE} MATCH %s AND users_user.is_doctor
+    """
+    expression = match_expression(text)
+    weights = ", ".join(str(weight) for weight in WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) {matches}", [expression])
+        count = cursor.fetchone()[0]
+        if offset >= count:
+            return count, []
+        cursor.execute(
+            f"""
+            SELECT users_user.id {matches}
+            ORDER BY bm25({TABLE}, {weights}), users_user.username
+            LIMIT %s OFFSET %s
+            """,
+            [expression, limit, offset],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    doctors = models.User.objects.in_bulk(ids)
+    return count, [doctors[pk] for pk in ids if pk in doctors]
+
+
+def render(request, text, serializer_class):
+    """
+    The JSON of the page of search results that `request` asks for with `page`
+    and `page_size`, paginated like the doctor directory.
+    """
+    page, page_size = directory.page_params(request)
+    count, doctors = search(text, (page - 1) * page_size, page_size)
+    results = JSONRenderer().render(serializer_class(doctors, many=True).data)
+    return directory.render_links(request, page, page_size, count, results)
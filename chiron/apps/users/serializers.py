@@ -1,6 +1,8 @@
 from rest_framework import serializers
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
-from . import models
+from chiron.apps.outbox.models import Email
+from . import models, emails
 
 
 class RegistrationSerializer(serializers.ModelSerializer):
@@ -42,7 +44,10 @@ class RegistrationSerializer(serializers.ModelSerializer):
         )
         if confirm and password and confirm == password:
             user.set_password(password)
-            user.save()
+            with transaction.atomic():
+                user.save()
+                if user.email:
+                    Email.objects.enqueue(*emails.welcome(user))
             user.is_active = False  # wait until email activation
         else:
             raise serializers.ValidationError(
@@ -58,6 +63,17 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class NameSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.User
+        fields = ["first_name", "last_name"]
+        read_only_fields = fields
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+
+
 class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(
         required=True, write_only=True, style={"input_type": "password"}
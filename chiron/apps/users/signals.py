@@ -0,0 +1,60 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from . import models, directory
+from .authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    transaction.on_commit(partial(token_cache.delete, instance.key))
+
+
+@receiver(post_save, sender=models.User)
+@receiver(post_delete, sender=models.User)
+def forget_user_tokens(sender, instance, **kwargs):
+    # covers deactivation and password changes, and keeps cached users fresh; after
+    # the commit, requests until then would cache the old row again
+    transaction.on_commit(partial(token_cache.delete_user, instance.pk))
+
+
+@receiver(post_save, sender=models.User)
+@receiver(post_delete, sender=models.User)
+def bump_profile_version(sender, instance, **kwargs):
+    models.profile_changed(instance.pk)
+
+
+@receiver(pre_save, sender=models.User)
+def remember_doctor_status(sender, instance, update_fields=None, **kwargs):
+    # a doctor losing the flag has to leave the directory as well
+    instance._was_doctor = False
+    if "is_doctor" not in instance.__dict__ or instance.is_doctor:
+        return
+    if instance.pk is None or (
+        update_fields is not None and "is_doctor" not in update_fields
+    ):
+        return
+    stored = getattr(instance, "_stored", {})
+    if "is_doctor" in stored:
+        instance._was_doctor = bool(stored["is_doctor"])
+    else:
+        # saved without being loaded first
+        instance._was_doctor = models.User.objects.filter(
+            pk=instance.pk, is_doctor=True
+        ).exists()
+
+
+@receiver(post_save, sender=models.User)
+def refresh_doctor_directory(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not directory.FIELDS.intersection(update_fields):
+        return
+    if instance.is_doctor or getattr(instance, "_was_doctor", False):
+        transaction.on_commit(directory.bump_version)
+
+
+@receiver(post_delete, sender=models.User)
+def drop_from_doctor_directory(sender, instance, **kwargs):
+    if instance.is_doctor:
+        transaction.on_commit(directory.bump_version)
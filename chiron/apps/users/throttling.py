@@ -0,0 +1,10 @@
+from rest_framework.throttling import UserRateThrottle
+
+
+class InviteRateThrottle(UserRateThrottle):
+    """
+    Limit the invitations each user sends, every one of them an email to an address
+    of their choosing, at the "invite" rate of `DEFAULT_THROTTLE_RATES`.
+    """
+
+    scope = "invite"
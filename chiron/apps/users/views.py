@@ -1,4 +1,4 @@
-from rest_framework.authentication import TokenAuthentication, SessionAuthentication
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.response import Response
 import django.shortcuts as shortcuts
 from rest_framework.decorators import action
@@ -9,14 +9,50 @@ from rest_framework import (
     permissions as drf_permissions,
     mixins,
 )
-from . import serializers, models, permissions
+from . import serializers, models, permissions, directory, emails, search
+from chiron.apps.outbox.models import Email
+from .authentication import CachedTokenAuthentication
+from .throttling import InviteRateThrottle
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.serializers import AuthTokenSerializer
-from django.core.mail import send_mail
-from django.conf import settings
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from chiron.apps import versions
+from chiron.db.routers import ReplicaReadsMixin
+from django.utils.translation import gettext_lazy as _
+
+
+def profile_version(request):
+    # not `updated_at`: the user may come from a token cached before the last save
+    return versions.get(models.PROFILE_VERSION_KEY.format(user=request.user.pk))
+
+
+def profile_etag(request, *args, **kwargs):
+    # the browsable API and JSON renderings of a version are different entities
+    return "{user}-{version}-{format}".format(
+        user=request.user.pk,
+        version=profile_version(request),
+        format=request.accepted_renderer.format,
+    )
+
+
+def profile_last_modified(request, *args, **kwargs):
+    return versions.timestamp(profile_version(request))
+
+
+def directory_etag(request, *args, **kwargs):
+    return "{version}-{format}".format(
+        version=directory.get_version(), format=request.accepted_renderer.format
+    )
+
+
+def directory_last_modified(request, *args, **kwargs):
+    return versions.timestamp(directory.get_version())
 
 
 class UserViewSet(
+    ReplicaReadsMixin,
     viewsets.GenericViewSet,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -28,16 +64,19 @@ class UserViewSet(
     * **Login** [[/user/login/](/user/login/) | `POST`]: obtain a valid authentication token by sending valid credentials
     * **Logout** [[/user/logout/](/user/logout/) | `POST`]: invalidate currently owned authentication token
     * **Retrieve User** [`/user/<username>/` | `GET`]: obtain user information (by looking up username)
-    * **Doctors** [[/user/drs/](/user/drs/) | `GET`]: get the list of all doctors
+    * **Doctors** [[/user/drs/](/user/drs/) | `GET`]: get the (paginated) list of all doctors (supports `If-None-Match`/`If-Modified-Since`)
+    * **Search Doctors** [`/user/search/?q=<words>` | `GET`]: the (paginated) doctors whose name, username or address match every word, best matches first
     * **Profile Management** [[/user/me/](/user/me/)]:
         * [`PUT`]: update ego user's information (excluding the password)
-        * [`GET`]: obtain current user information
+        * [`GET`]: obtain current user information (supports `If-None-Match`/`If-Modified-Since`)
     * **Change Password** [/user/cpw/](/user/cpw/) | `POST`]: update user password (old password is required)
+    * **Invite** [[/user/invite/](/user/invite/) | `POST`]: invite someone to the platform by email
     """
 
+    replica_actions = ["retrieve", "search"]
     lookup_field = "username"
     lookup_url_kwarg = "username"
-    authentication_classes = [SessionAuthentication, TokenAuthentication]
+    authentication_classes = [SessionAuthentication, CachedTokenAuthentication]
     serializer_class = serializers.EgoUserSerializer
     queryset = models.User.objects.all()
 
@@ -66,6 +105,9 @@ class UserViewSet(
             return serializers.InviteSerializer
         return serializers.UserSerializer
 
+    def filter_queryset(self, queryset):
+        return permissions.scope_queryset(self.request, self, queryset)
+
     def get_permissions(self):
         """
         Instantiates and returns the list of permissions that this view requires.
@@ -77,13 +119,16 @@ class UserViewSet(
                 permissions.IsSelfOrAdmin,
                 drf_permissions.IsAuthenticated,
             ]
-        elif self.action in ["retrieve", "list", "invite"]:
+        elif self.action in ["retrieve", "list", "invite", "search"]:
             permission_list = [drf_permissions.IsAuthenticated]
         else:
             permission_list = [drf_permissions.AllowAny]
         return [permission() for permission in permission_list]
 
     @action(methods=["GET", "PUT"], detail=False, name="Profile Management")
+    @method_decorator(
+        condition(etag_func=profile_etag, last_modified_func=profile_last_modified)
+    )
     def me(self, request):
         """
         Retrieve and change the current user's account information.
@@ -102,18 +147,42 @@ class UserViewSet(
         return Response(status=status.HTTP_404_NOT_FOUND)
 
     @action(methods=["GET"], detail=False, name="Doctors")
+    @method_decorator(
+        condition(etag_func=directory_etag, last_modified_func=directory_last_modified)
+    )
     def drs(self, request):
         """
-        Retrieve the list of all doctors.
+        Retrieve the list of all doctors, ordered by username and paginated
+        with `page` and `page_size`.
 
         **Permissions**:
 
         * _Authentication_ is required
         """
+        return HttpResponse(
+            directory.render(request, self.get_serializer_class()),
+            content_type="application/json",
+        )
 
-        doctors = models.User.objects.filter(is_doctor=True)
+    @action(methods=["GET"], detail=False, name="Search Doctors")
+    def search(self, request):
+        """
+        Search doctors by first and last name, username and address: every word of
+        `q` has to start a word of one of them. Best matches come first, paginated
+        with `page` and `page_size`.
 
-        return Response(self.get_serializer_class()(doctors, many=True).data)
+        **Permissions**:
+
+        * _Authentication_ is required
+        """
+        query = serializers.SearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return HttpResponse(
+            search.render(
+                request, query.validated_data["q"], self.get_serializer_class()
+            ),
+            content_type="application/json",
+        )
 
     @action(methods=["POST"], detail=False, name="Change Password")
     def cpw(self, request, format=None):
@@ -130,15 +199,15 @@ class UserViewSet(
 
         if serializer.is_valid():
             # Check old password
-            if not user.check_password(serializer.data.get("old_password")):
+            if not user.check_password(serializer.validated_data.get("old_password")):
                 return Response(
                     {"old_password": ["Wrong password."]},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
             # confirm the new passwords match
-            new_password = serializer.data.get("new_password")
-            confirm_new_password = serializer.data.get("confirm_new_password")
+            new_password = serializer.validated_data.get("new_password")
+            confirm_new_password = serializer.validated_data.get("confirm_new_password")
             if new_password != confirm_new_password:
                 return Response(
                     {"new_password": ["New passwords must match"]},
@@ -146,8 +215,8 @@ class UserViewSet(
                 )
 
             # set_password also hashes the password that the user will get
-            user.set_password(serializer.data.get("new_password"))
-            user.object.save()
+            user.set_password(serializer.validated_data.get("new_password"))
+            user.save()
             return Response(
                 {"response": "successfully changed password"}, status=status.HTTP_200_OK
             )
@@ -183,3 +252,28 @@ class UserViewSet(
         """
         shortcuts.get_object_or_404(Token, user=request.user).delete()
         return Response(status=status.HTTP_202_ACCEPTED)
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        name="Invite",
+        throttle_classes=[InviteRateThrottle],
+    )
+    def invite(self, request):
+        """
+        Invite someone to Chiron by `email`, the invitation is delivered in the background.
+
+        **Permissions**:
+
+        * _Authentication_ is required
+        * Invitations are rate limited per user (`429` past `INVITE_RATE`)
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        email = serializer.validated_data.get("email")
+        if not email:
+            raise drf_serializers.ValidationError(
+                {"email": [_("Invitations are sent by email.")]}
+            )
+        Email.objects.enqueue(*emails.invitation(request.user, email))
+        return Response(status=status.HTTP_202_ACCEPTED)
@@ -1,20 +1,234 @@
+import functools
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.functional import cached_property
+from django.utils.http import http_date, quote_etag
+from rest_framework import exceptions, serializers
+from rest_framework.settings import ISO_8601, api_settings
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from chiron.apps.users.authentication import authenticate_async
+from chiron.db.routers import replica_reads
+
+
 class FlattenMixin:
-    """Flatens the specified related objects in this representation"""
+    """
+    Flattens the related objects of `Meta.flatten`, `(field, serializer_class)` pairs,
+    into this representation, as `<field>__<key>` (just `<key>` with a false
+    `Meta.composite_names`).
 
-    def to_representation(self, obj):
+    The nested serializers and the keys of their fields are set up once per serializer
+    instance, and the child of a list serializer is a single instance: N rows share
+    one plan and only pay for reading their fields.
+    """
+
+    @cached_property
+    def flatten_plan(self):
+        """
+        `(field, [(key, nested field), ...])` for each flattened related object.
+        """
         assert hasattr(
             self.Meta, "flatten"
         ), 'Class {serializer_class} missing "Meta.flatten" attribute'.format(
             serializer_class=self.__class__.__name__
         )
         composite_names = getattr(self.Meta, "composite_names", True)
-        # Get the current object representation
-        rep = super(FlattenMixin, self).to_representation(obj)
-        # Iterate the specified related objects with their serializer
+        plan = []
         for field, serializer_class in self.Meta.flatten:
+            prefix = field + "__" if composite_names else ""
             serializer = serializer_class(context=self.context)
-            objrep = serializer.to_representation(getattr(obj, field))
-            # Include their fields, prefixed, in the current   representation
-            for key in objrep:
-                rep[(field + "__" + key) if composite_names else key] = objrep[key]
+            keys = [
+                (prefix + nested.field_name, nested)
+                for nested in serializer._readable_fields
+            ]
+            plan.append((field, keys))
+        return plan
+
+    def to_representation(self, obj):
+        rep = super(FlattenMixin, self).to_representation(obj)
+        for field, keys in self.flatten_plan:
+            related = getattr(obj, field)
+            # as Serializer.to_representation does for the related object's fields
+            for key, nested in keys:
+                try:
+                    attribute = (
+                        None if related is None else nested.get_attribute(related)
+                    )
+                except SkipField:
+                    continue
+                check_for_none = (
+                    attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+                )
+                rep[key] = (
+                    None
+                    if check_for_none is None
+                    else nested.to_representation(attribute)
+                )
         return rep
+
+
+class ValuesPlan:
+    """
+    A read-only rendering of a serializer's representation from `values()` rows,
+    without building model instances nor running the serializer per row.
+
+    Every readable field (and flattened field, see `FlattenMixin`) reads one column:
+    its `source`, or the lookup `Meta.values` gives for it, e.g. the username of a
+    related user. Columns go through the field's `to_representation`, which gives the
+    same output as the serializer for fields of plain values, except for datetimes:
+    their timezone is looked up once per call rather than for every value.
+    """
+
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        lookups = getattr(serializer.Meta, "values", {})
+        self.fields = []
+        for field in serializer._readable_fields:
+            assert field.source != "*", "{} can't be read from a column".format(
+                field.field_name
+            )
+            lookup = lookups.get(field.field_name, field.source.replace(".", "__"))
+            self.fields.append((field.field_name, lookup, field))
+        if isinstance(serializer, FlattenMixin):
+            for related, keys in serializer.flatten_plan:
+                for key, nested in keys:
+                    lookup = f"{related}__{nested.source.replace('.', '__')}"
+                    self.fields.append((key, lookup, nested))
+        self.keys = [key for key, _, _ in self.fields]
+        self.lookups = list(dict.fromkeys(lookup for _, lookup, _ in self.fields))
+
+    def values(self, queryset):
+        """
+        `queryset` as the `values()` rows that `represent` takes.
+        """
+        return queryset.values(*self.lookups)
+
+    def represent(self, rows):
+        fields = [
+            (key, lookup, represent_datetime(field) or field.to_representation)
+            for key, lookup, field in self.fields
+        ]
+        return [
+            {
+                key: None if (value := row[lookup]) is None else represent(value)
+                for key, lookup, represent in fields
+            }
+            for row in rows
+        ]
+
+
+def represent_datetime(field):
+    """
+    `field.to_representation` for aware datetimes in ISO 8601, in the timezone that
+    is current now, or None for any other field.
+    """
+    if not isinstance(field, serializers.DateTimeField):
+        return None
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    field_timezone = getattr(field, "timezone", field.default_timezone())
+    if output_format is None or output_format.lower() != ISO_8601:
+        return None
+    if field_timezone is None:
+        return None
+
+    def represent(value):
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+    return represent
+
+
+@functools.lru_cache(maxsize=None)
+def values_plan(serializer_class):
+    return ValuesPlan(serializer_class)
+
+
+def json_response(data, status=200):
+    # rendered like the viewsets' JSON, by the first of the default renderers
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    return HttpResponse(
+        renderer.render(data), status=status, content_type=renderer.media_type
+    )
+
+
+def validators(request, etag_func, last_modified_func, *args, **kwargs):
+    """
+    The quoted `ETag` and the `Last-Modified` timestamp of `request`'s response, as
+    Django's `condition()` computes them.
+    """
+    etag = last_modified = None
+    if etag_func is not None:
+        etag = quote_etag(etag_func(request, *args, **kwargs))
+    if last_modified_func is not None:
+        date = last_modified_func(request, *args, **kwargs)
+        if date is not None:
+            last_modified = int(date.timestamp())
+    return etag, last_modified
+
+
+def async_api_view(
+    methods=("GET",), etag_func=None, last_modified_func=None, replica=False
+):
+    """
+    Turns an async function view into a JSON endpoint that authenticates, checks
+    the method and reports errors the way the API's viewsets do, only authenticated
+    users get through.
+
+    Like the viewsets again, `etag_func` and `last_modified_func` answer conditional
+    requests the way `condition()` does, and a `replica` view reads from the replica
+    (see `ReplicaReadsMixin`).
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                resolved = await authenticate_async(request)
+                if resolved is None:
+                    raise exceptions.NotAuthenticated()
+                request.user, request.auth = resolved
+                if request.method not in methods:
+                    raise exceptions.MethodNotAllowed(request.method)
+                # what `json_response` renders with, for the `ETag` functions
+                request.accepted_renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+                with replica_reads(replica):
+                    return await respond(request, *args, **kwargs)
+            except Http404:
+                error = exceptions.NotFound()
+            except exceptions.APIException as exception:
+                error = exception
+            if isinstance(
+                error, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+            ):
+                # what the viewsets answer too, session authentication comes first
+                error.status_code = 403
+            detail = error.detail
+            if not isinstance(detail, (list, dict)):
+                detail = {"detail": detail}
+            return json_response(detail, status=error.status_code)
+
+        async def respond(request, *args, **kwargs):
+            if etag_func is None and last_modified_func is None:
+                return await view(request, *args, **kwargs)
+            # the stamps are in the cache, out of the event loop in one hop
+            etag, last_modified = await sync_to_async(validators)(
+                request, etag_func, last_modified_func, *args, **kwargs
+            )
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ("GET", "HEAD"):
+                if last_modified and not response.has_header("Last-Modified"):
+                    response.headers["Last-Modified"] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault("ETag", etag)
+            return response
+
+        return wrapper
+
+    return decorator
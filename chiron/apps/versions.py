@@ -0,0 +1,53 @@
+"""
+Version stamps of cached or conditionally served data, kept in the shared cache.
+
+A stamp is the time of the last change in nanoseconds, so it doubles as the
+`Last-Modified` date. Missing stamps (never set or evicted) start afresh at the
+current time, which at worst costs clients one full response.
+"""
+
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+# backends whose entries other processes don't see
+PROCESS_LOCAL = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def get(key):
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, time.time_ns(), None)
+        stamp = cache.get(key)
+    return stamp
+
+
+def touch(*keys):
+    """
+    Stamp `keys` with the current time, any change to a stamp is a new version.
+    """
+    stamp = time.time_ns()
+    cache.set_many({key: stamp for key in keys}, None)
+    return stamp
+
+
+def timestamp(stamp):
+    return datetime.fromtimestamp(stamp / 1e9, tz=timezone.utc)
+
+
+def check_shared_cache():
+    """
+    Refuse to serve from several processes with a process-local cache: a change would
+    only invalidate the stamps of the process that made it.
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.WORKERS > 1 and backend in PROCESS_LOCAL:
+        raise ImproperlyConfigured(
+            f"{settings.WORKERS} workers can't share {backend}, set CACHE_BACKEND "
+            "to a cache shared between processes"
+        )
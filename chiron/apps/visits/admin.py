@@ -1,5 +1,9 @@
 from django.contrib import admin
+from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
+from chiron.apps.admin import ApproximateCountPaginator
+from chiron.apps.users import search
+from chiron.apps.users.models import User
 from . import models
 
 
@@ -24,21 +28,23 @@ class AppointmentAdmin(admin.ModelAdmin):
     )
     autocomplete_fields = ["patient", "doctor"]
     read_only_fields = ["picture"]
-    search_fields = [
-        "patient__username",
-        "patient__phone",
-        "patient__email",
-        "patient__first_name",
-        "patient__last_name",
-        "doctor__username",
-        "doctor__phone",
-        "doctor__email",
-        "doctor__first_name",
-        "doctor__last_name",
-    ]
+    # searched through indexes by get_search_results
+    search_fields = ["patient__username", "doctor__username"]
     readonly_fields = ["date_created"]
     list_display = ["patient", "doctor", "date", "approved"]
+    list_select_related = ["patient", "doctor"]
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
     can_delete = True
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        The appointments of any patient or doctor found by `search.user_filter`.
+        """
+        if not search_term.strip():
+            return queryset, False
+        users = User.objects.filter(search.user_filter(search_term)).values("pk")
+        return queryset.filter(Q(patient__in=users) | Q(doctor__in=users)), False
+
 
 admin.site.register(models.Appointment, AppointmentAdmin)
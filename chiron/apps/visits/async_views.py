@@ -0,0 +1,57 @@
+"""
+Async versions of the hottest read-only appointment endpoints, served under `/async/`.
+
+Django has no async ORM yet, each view awaits its queries in a single `sync_to_async`
+hop while authentication of cached tokens, serialization and rendering stay on the
+event loop. They answer conditional requests and read from the replica like their
+viewset actions.
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from rest_framework.request import Request
+from chiron.apps.utils import async_api_view, json_response
+from . import models, pagination, serializers
+from .views import list_etag, list_last_modified
+
+
+def appointments(user):
+    queryset = models.Appointment.objects.involving(user)
+    return serializers.AppointmentSerializer.plan_queryset(queryset)
+
+
+def roles(user):
+    queryset = serializers.AppointmentSerializer.plan_queryset(
+        models.Appointment.objects.all()
+    )
+    return queryset.roles(user)
+
+
+@async_api_view(etag_func=list_etag, last_modified_func=list_last_modified)
+async def appointment_list(request):
+    """
+    Same as `GET /appointment/`: the current user's appointments, cursor paginated.
+    """
+    paginator = pagination.AppointmentCursorPagination()
+    page = await sync_to_async(paginator.paginate_queryset)(
+        roles(request.user), Request(request)
+    )
+    data = serializers.AppointmentSerializer(page, many=True).data
+    return json_response(
+        {
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "results": data,
+        }
+    )
+
+
+@async_api_view(replica=True)
+async def appointment_detail(request, pk):
+    """
+    Same as `GET /appointment/<appointment_id>/`, for appointments of the current user.
+    """
+    appointment = await sync_to_async(appointments(request.user).filter(pk=pk).first)()
+    if appointment is None:
+        raise Http404
+    return json_response(serializers.AppointmentSerializer(appointment).data)
@@ -0,0 +1,205 @@
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import cache
+from . import models
+
+DAY = 24 * 60 * 60
+VERSION_KEY = "availability:version"
+
+
+def timestamp(value):
+    return int(value.timestamp())
+
+
+def from_timestamp(value):
+    return datetime.fromtimestamp(value, tz=timezone.utc)
+
+
+class BusyIndex:
+    """
+    Booked intervals of every doctor, as sorted arrays of epoch seconds, from which
+    free slots are derived.
+
+    Slots are `slot` seconds long, aligned to the opening hour and confined to the
+    daily opening hours (UTC). Booked intervals are assumed to last at most
+    `max_duration` seconds, which bounds how far back a lookup has to look.
+    """
+
+    def __init__(self, opening, closing, slot, max_duration):
+        self.opening, self.closing = opening, closing
+        self.slot, self.max_duration = slot, max_duration
+        self.starts, self.ends = {}, {}  # doctor id -> array of starts/ends
+
+    def add(self, doctor, start, end):
+        starts = self.starts.setdefault(doctor, array("q"))
+        ends = self.ends.setdefault(doctor, array("q"))
+        position = bisect_right(starts, start)
+        starts.insert(position, start)
+        ends.insert(position, end)
+
+    def remove(self, doctor, start, end):
+        starts, ends = self.starts.get(doctor), self.ends.get(doctor)
+        if not starts:
+            return
+        position = bisect_left(starts, start)
+        while position < len(starts) and starts[position] == start:
+            if ends[position] == end:
+                del starts[position], ends[position]
+                return
+            position += 1
+
+    def busy_until(self, doctor, start, end):
+        """
+        The latest end of the booked intervals intersecting `[start, end)`, or `None`.
+        """
+        starts, ends = self.starts.get(doctor), self.ends.get(doctor)
+        if not starts:
+            return None
+        position = bisect_left(starts, end) - 1
+        until = None
+        while position >= 0 and starts[position] > start - self.max_duration:
+            if ends[position] > start and (until is None or ends[position] > until):
+                until = ends[position]
+            position -= 1
+        return until
+
+    def align(self, moment):
+        """
+        The first slot start at or after `moment` that fits within opening hours.
+        """
+        day = moment - moment % DAY
+        opening, closing = day + self.opening, day + self.closing
+        if moment <= opening:
+            return opening
+        moment = opening - (opening - moment) // self.slot * self.slot
+        if moment + self.slot > closing:
+            return day + DAY + self.opening
+        return moment
+
+    def next_free(self, doctor, moment, before):
+        """
+        The start of the doctor's first free slot at or after `moment`, if any
+        fits before `before`.
+        """
+        moment = self.align(moment)
+        while moment + self.slot <= before:
+            until = self.busy_until(doctor, moment, moment + self.slot)
+            if until is None:
+                return moment
+            moment = self.align(until)
+        return None
+
+    def earliest(self, doctors, after, before, count):
+        """
+        The `count` earliest `(start, doctor)` free slots among `doctors`.
+
+        The heap holds a lower bound of each doctor's next free slot and only the
+        doctor on top gets its bound resolved, so with thousands of doctors just a
+        handful of schedules are actually looked at.
+        """
+        first = self.align(after)
+        heap = [(first, doctor) for doctor in doctors]
+        heapq.heapify(heap)
+        found = []
+        while heap and len(found) < count:
+            moment, doctor = heap[0]
+            free = self.next_free(doctor, moment, before)
+            if free is None:
+                heapq.heappop(heap)
+            elif free > moment:
+                heapq.heapreplace(heap, (free, doctor))
+            else:
+                found.append((free, doctor))
+                heapq.heapreplace(heap, (free + self.slot, doctor))
+        return found
+
+
+class Availability:
+    """
+    Process-wide busy index, kept current by appointment signals.
+
+    Every change also bumps a version in the shared cache; a process noticing that
+    some other process changed appointments rebuilds its index before answering.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.index = None
+        self.version = None
+
+    def new_index(self):
+        config = settings.AVAILABILITY
+        return BusyIndex(
+            opening=config["OPENING_HOUR"] * 60 * 60,
+            closing=config["CLOSING_HOUR"] * 60 * 60,
+            slot=int(config["SLOT"].total_seconds()),
+            max_duration=int(models.MAX_DURATION.total_seconds()),
+        )
+
+    def shared_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, time.time_ns(), None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def get_index(self):
+        with self.lock:
+            version = self.shared_version()
+            if self.index is None or self.version != version:
+                index = self.new_index()
+                rows = models.Appointment.objects.filter(
+                    end__gt=datetime.now(tz=timezone.utc)
+                ).values_list("doctor_id", "date", "end")
+                for doctor, start, end in rows.iterator(chunk_size=10000):
+                    index.add(doctor, timestamp(start), timestamp(end))
+                self.index, self.version = index, version
+            return self.index
+
+    def changed(self, removed=(), added=()):
+        """
+        Apply booked intervals, as `(doctor id, start, end)`, that went away or came in.
+        """
+        with self.lock:
+            try:
+                version = cache.incr(VERSION_KEY)
+            except ValueError:
+                cache.add(VERSION_KEY, time.time_ns(), None)
+                version = None
+            if self.index is None:
+                return
+            if version is None or version != self.version + 1:
+                # missed someone else's change, rebuild on the next lookup
+                self.index = None
+                return
+            for doctor, start, end in removed:
+                self.index.remove(doctor, timestamp(start), timestamp(end))
+            for doctor, start, end in added:
+                self.index.add(doctor, timestamp(start), timestamp(end))
+            self.version = version
+
+    def invalidate(self):
+        with self.lock:
+            try:
+                cache.incr(VERSION_KEY)
+            except ValueError:
+                pass
+            self.index = None
+
+    def earliest(self, doctors, after, before, count):
+        found = self.get_index().earliest(
+            doctors, timestamp(after), timestamp(before), count
+        )
+        slot = settings.AVAILABILITY["SLOT"]
+        return [
+            (doctor, from_timestamp(start), from_timestamp(start) + slot)
+            for start, doctor in found
+        ]
+
+
+availability = Availability()
@@ -0,0 +1,15 @@
+"""
+Emails about appointments, as `(to, subject, body)` ready for the outbox.
+"""
+
+from django.utils.translation import gettext as _
+
+
+def approval(to, doctor, date, approved):
+    if approved:
+        subject = _("Your appointment has been approved")
+        body = _("Hello,\n\n%(doctor)s approved your appointment on %(date)s.")
+    else:
+        subject = _("Your appointment has been rejected")
+        body = _("Hello,\n\n%(doctor)s rejected your appointment on %(date)s.")
+    return to, subject, body % {"doctor": doctor, "date": date.isoformat()}
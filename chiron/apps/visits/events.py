@@ -0,0 +1,169 @@
+"""
+Server-sent events of appointment changes, a plain ASGI application mounted at
+`/appointment/events/` by `chiron.asgi` (Django 4.0 can't stream from async views).
+
+Each event carries the changes of the feed at `/appointment/changes/` that happened
+since the previous one, its id is the feed's watermark: reconnecting clients send it
+back as `Last-Event-ID` and resume without gaps. Publishers only wake streams up, so
+the per-connection buffer holds wake-ups, never changes.
+"""
+
+import asyncio
+import io
+import json
+from importlib import import_module
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from chiron.apps import pubsub
+from chiron.apps.users.authentication import authenticate_async
+from . import models, serializers, sync
+
+PATH = "/appointment/events/"
+
+
+def get_request(scope):
+    request = ASGIRequest(scope, io.BytesIO())
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    return request
+
+
+def current_change():
+    counter = models.Sequence.objects.filter(name=models.CHANGES)
+    return counter.values_list("value", flat=True).first() or 0
+
+
+def render(user, since):
+    """
+    The next event of `user`'s stream as `(watermark, event, more)`, `event` is
+    `None` without any change after `since`.
+    """
+    updated, deleted, watermark, more = sync.changes(
+        user, since, settings.EVENTS["BATCH"]
+    )
+    if not updated and not deleted:
+        return watermark, None, more
+    data = JSONRenderer().render(
+        dict(
+            updated=serializers.AppointmentSerializer(updated, many=True).data,
+            deleted=deleted,
+        )
+    )
+    return watermark, b"id: %d\nevent: changes\ndata: %s\n\n" % (watermark, data), more
+
+
+def parse_since(request):
+    value = request.headers.get("Last-Event-ID") or request.GET.get("since")
+    try:
+        return max(int(value), 0) if value else None
+    except ValueError:
+        return None
+
+
+async def respond(send, status, data):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send({"type": "http.response.body", "body": json.dumps(data).encode()})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def stream(scope, receive, send):
+    """
+    Stream the changes of the authenticated user's appointments, from the change
+    after `Last-Event-ID` (or `?since=`) or from now on.
+    """
+    if scope["method"] != "GET":
+        return await respond(send, 405, {"detail": "Method not allowed."})
+    request = get_request(scope)
+    try:
+        resolved = await authenticate_async(request)
+    except AuthenticationFailed as error:
+        return await respond(send, 403, {"detail": str(error.detail)})
+    if resolved is None:
+        detail = str(NotAuthenticated.default_detail)
+        return await respond(send, 403, {"detail": detail})
+    user = resolved[0]
+
+    config = settings.EVENTS
+    broker = pubsub.get_broker()
+    # subscribe first, changes committed while catching up still wake the stream
+    subscription = broker.subscribe(models.CHANNEL.format(user=user.pk))
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        since = parse_since(request)
+        if since is None:
+            since = await sync_to_async(current_change)()
+        headers = [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]
+        if getattr(settings, "CORS_ALLOW_ALL_ORIGINS", False):
+            headers.append((b"access-control-allow-origin", b"*"))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send(
+            {
+                "type": "http.response.body",
+                "body": b"retry: %d\n\n" % config["RETRY"],
+                "more_body": True,
+            }
+        )
+        while not disconnected.done():
+            since, event, more = await sync_to_async(render)(user, since)
+            if event is not None:
+                # waits for slow clients, nothing piles up meanwhile
+                await send(
+                    {"type": "http.response.body", "body": event, "more_body": True}
+                )
+            if more:
+                continue
+            wakeup = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {wakeup, disconnected},
+                timeout=config["HEARTBEAT"],
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if wakeup not in done:
+                wakeup.cancel()
+            if not done:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": b": heartbeat\n\n",
+                        "more_body": True,
+                    }
+                )
+            # wake-ups coalesce, one fetch covers them all
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.overflowed = False
+    finally:
+        broker.unsubscribe(subscription)
+        disconnected.cancel()
+
+
+def route(application):
+    """
+    Wrap the Django ASGI `application`, serving the event stream at `PATH`.
+    """
+
+    async def router(scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == PATH:
+            return await stream(scope, receive, send)
+        return await application(scope, receive, send)
+
+    return router
@@ -0,0 +1,66 @@
+import csv
+import json
+from heapq import merge
+from itertools import groupby, islice
+from chiron.apps.utils import values_plan
+from . import pagination, serializers
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+
+class Echo:
+    """
+    File-like object handing back whatever gets written to it, for `csv.writer`.
+    """
+
+    def write(self, value):
+        return value
+
+
+def rows(querysets, chunk_size=2000):
+    """
+    Yield appointments as representation dicts, reading the querysets (ordered by
+    `(date, id)`, e.g. the `roles` of a user) in chunks and merging them in order.
+
+    Each one being a range scan of its index, the database sorts nothing: memory
+    stays at a few chunks, however many appointments there are.
+    """
+    plan = values_plan(serializers.AppointmentSerializer)
+    key = pagination.AppointmentCursorPagination.key
+    branches = [
+        plan.values(queryset).iterator(chunk_size=chunk_size) for queryset in querysets
+    ]
+    # a row found by several querysets comes once
+    values = (next(same) for _, same in groupby(merge(*branches, key=key), key))
+    while chunk := list(islice(values, chunk_size)):
+        yield from plan.represent(chunk)
+
+
+def stream(querysets, output, chunk_size=2000):
+    """
+    Yield the rows of `querysets` encoded as `output`, a chunk of `chunk_size` rows at
+    a time.
+    """
+    if output == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(values_plan(serializers.AppointmentSerializer).keys)
+
+        def encode(row):
+            return writer.writerow(row.values())
+
+    else:
+
+        def encode(row):
+            return json.dumps(row) + "\n"
+
+    lines = []
+    for row in rows(querysets, chunk_size):
+        lines.append(encode(row))
+        if len(lines) == chunk_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
@@ -0,0 +1,33 @@
+# Generated by Django 4.0.2 on 2026-10-18 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("visits", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["doctor", "date"], name="appointment_doctor_date"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["patient", "date"], name="appointment_patient_date"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                condition=models.Q(("approved", False)),
+                fields=["doctor", "date"],
+                name="appointment_pending_date",
+            ),
+        ),
+    ]
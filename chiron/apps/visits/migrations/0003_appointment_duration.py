@@ -0,0 +1,46 @@
+import datetime
+import django.core.validators
+from django.db import migrations, models
+
+
+def fill_end(apps, schema_editor):
+    Appointment = apps.get_model("visits", "Appointment")
+    Appointment.objects.update(end=models.F("date") + models.F("duration"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("visits", "0002_appointment_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appointment",
+            name="duration",
+            field=models.DurationField(
+                default=datetime.timedelta(seconds=1800),
+                help_text="Length of the appointment [default: 30 minutes].",
+                validators=[
+                    django.core.validators.MinValueValidator(
+                        datetime.timedelta(seconds=300)
+                    ),
+                    django.core.validators.MaxValueValidator(
+                        datetime.timedelta(seconds=28800)
+                    ),
+                ],
+                verbose_name="duration",
+            ),
+        ),
+        migrations.AddField(
+            model_name="appointment",
+            name="end",
+            field=models.DateTimeField(editable=False, null=True, verbose_name="end"),
+        ),
+        migrations.RunPython(fill_end, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="appointment",
+            name="end",
+            field=models.DateTimeField(editable=False, verbose_name="end"),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.0.2 on 2026-10-18 18:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("visits", "0003_appointment_duration"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="appointment",
+            name="doctor",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="doctors",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="appointment",
+            name="patient",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="patients",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
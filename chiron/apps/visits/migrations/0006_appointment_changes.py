@@ -0,0 +1,87 @@
+# Generated by Django 4.0.2 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+def number_existing(apps, schema_editor):
+    # existing appointments count as changed in id order, before any new change
+    Appointment = apps.get_model("visits", "Appointment")
+    Sequence = apps.get_model("visits", "Sequence")
+    Appointment.objects.update(change_seq=models.F("id"))
+    last = Appointment.objects.aggregate(last=models.Max("id"))["last"] or 0
+    Sequence.objects.create(name="appointment-changes", value=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("visits", "0005_appointment_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Sequence",
+            fields=[
+                (
+                    "name",
+                    models.CharField(
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="name",
+                    ),
+                ),
+                ("value", models.BigIntegerField(default=0, verbose_name="value")),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Tombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("appointment_id", models.BigIntegerField(verbose_name="appointment")),
+                ("user_id", models.BigIntegerField(verbose_name="user")),
+                ("change_seq", models.BigIntegerField(verbose_name="change number")),
+                (
+                    "date_created",
+                    models.DateTimeField(auto_now_add=True, verbose_name="date added"),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="appointment",
+            name="change_seq",
+            field=models.BigIntegerField(
+                default=0,
+                editable=False,
+                help_text="Number of the latest change, increasing over all appointments.",
+                verbose_name="change number",
+            ),
+        ),
+        migrations.RunPython(number_existing, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["doctor", "change_seq"], name="appointment_doctor_seq"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["patient", "change_seq"], name="appointment_patient_seq"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(
+                fields=["user_id", "change_seq"], name="tombstone_user_seq"
+            ),
+        ),
+    ]
@@ -1,7 +1,203 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+from datetime import timedelta
+from functools import partial
+from chiron.apps import pubsub, versions
+from chiron.apps.outbox.models import Email
+from . import emails
+
+DEFAULT_DURATION = timedelta(minutes=30)
+MIN_DURATION = timedelta(minutes=5)
+# bounds how far back an overlapping appointment may start, see `overlapping`
+MAX_DURATION = timedelta(hours=8)
+# sequence ordering every appointment change, see `AppointmentQuerySet.changed_since`
+CHANGES = "appointment-changes"
+# version stamp and event channel of a user's appointments, see `appointments_changed`
+VERSION_KEY = "appointments:version:{user}"
+CHANNEL = "appointments:{user}"
+# version stamp of the user names shown in every appointment list, see `names_changed`
+NAMES_VERSION_KEY = "appointments:names:version"
+# user columns appointment representations show
+NAME_FIELDS = ("username", "first_name", "last_name")
+
+
+def appointments_changed(*users):
+    """
+    Give the appointment lists of the given users (ids) a new version stamp and wake
+    up their event streams, once the current transaction commits.
+    """
+    if users:
+        users = set(users)
+        keys = [VERSION_KEY.format(user=user) for user in users]
+        transaction.on_commit(partial(versions.touch, *keys))
+        channels = [CHANNEL.format(user=user) for user in users]
+        transaction.on_commit(partial(notify, channels))
+
+
+def names_changed():
+    """
+    Give every appointment list a new version once the current transaction commits,
+    for a user whose name lists show was renamed. Renames are rare, finding the
+    users whose lists show the renamed one isn't worth it.
+    """
+    transaction.on_commit(partial(versions.touch, NAMES_VERSION_KEY))
+
+
+def notify(channels):
+    pubsub.get_broker().publish(channels, "changed")
+
+
+class Sequence(models.Model):
+    """
+    Named counters handing out monotonically increasing numbers.
+
+    A number is drawn by incrementing the counter row inside the caller's
+    transaction, which holds the row (on SQLite the whole database) until commit,
+    so numbers also become visible in increasing order.
+    """
+
+    name = models.CharField(_("name"), max_length=64, primary_key=True)
+    value = models.BigIntegerField(_("value"), default=0)
+
+    @classmethod
+    def next(cls, name, count=1):
+        """
+        Draw `count` numbers from the `name` counter, returning the last one. Needs to
+        run in the transaction of the change the numbers are for.
+        """
+        counter = cls.objects.filter(name=name)
+        if not counter.update(value=models.F("value") + count):
+            cls.objects.get_or_create(name=name)
+            counter.update(value=models.F("value") + count)
+        return counter.values_list("value", flat=True).get()
+
+
+def next_change(count=1):
+    return Sequence.next(CHANGES, count)
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def roles(self, user):
+        """
+        The appointments of `user` as the doctor and as the patient, two querysets
+        each answered by its own `(doctor, date)`/`(patient, date)` index.
+
+        Ordered by date, each one is a range scan of its index: pages of both merged
+        (see `pagination`) cost the page, however many appointments the user has.
+        """
+        return [self.filter(doctor=user), self.filter(patient=user)]
+
+    def involving(self, user):
+        """
+        Appointments in which `user` takes part, either as the doctor or the patient.
+
+        The two `roles` are combined with a UNION instead of a full scan for
+        `doctor = user OR patient = user`. Ordering the result sorts all of them,
+        lists page through the `roles` instead.
+        """
+        doctor, patient = self.roles(user)
+        return self.filter(pk__in=doctor.values("pk").union(patient.values("pk")))
+
+    def changed_since(self, user, since):
+        """
+        Appointments involving `user` changed after the change number `since`.
+
+        Like `involving`, each role is looked up in its own `(role, change_seq)` index,
+        so only the changes are read, whatever the size of the history.
+        """
+        ids = (
+            self.filter(doctor=user, change_seq__gt=since)
+            .values("pk")
+            .union(self.filter(patient=user, change_seq__gt=since).values("pk"))
+        )
+        return self.filter(pk__in=ids)
+
+    def overlapping(self, doctor, start, end):
+        """
+        The doctor's appointments that intersect `[start, end)`.
+
+        Appointments never last longer than `MAX_DURATION`, which turns the overlap test
+        into a bounded range scan of the `(doctor, date)` index.
+        """
+        return self.filter(
+            doctor=doctor, date__gt=start - MAX_DURATION, date__lt=end, end__gt=start
+        )
+
+    def set_approval(self, approved):
+        """
+        Approve (or reject) the selected appointments with a single `UPDATE`, returning
+        how many were matched.
+
+        Patients of the appointments that actually change are notified by email, queued
+        in the outbox within the same transaction as the update.
+        """
+        # only the appointments that change count as modified
+        unchanged = models.Q(approved=approved)
+        with transaction.atomic():
+            # read under the write lock: SQLite transactions take it as they begin
+            # (`transaction_mode`), other databases lock the rows read
+            changing = list(
+                self.exclude(approved=approved)
+                .select_for_update(of=("self",))
+                .values_list(
+                    "patient_id",
+                    "doctor_id",
+                    "patient__email",
+                    "doctor__username",
+                    "date",
+                )
+            )
+            if not changing:
+                return self.update(approved=approved)
+            change = next_change()
+            updated = self.update(
+                approved=approved,
+                updated_at=models.Case(
+                    models.When(unchanged, then=models.F("updated_at")),
+                    default=models.Value(timezone.now()),
+                ),
+                change_seq=models.Case(
+                    models.When(unchanged, then=models.F("change_seq")),
+                    default=models.Value(change),
+                ),
+            )
+            notices = [
+                emails.approval(to, doctor, date, approved)
+                for patient_id, doctor_id, to, doctor, date in changing
+                if to
+            ]
+            if notices:
+                Email.objects.enqueue_many(notices)
+        appointments_changed(
+            *(row[0] for row in changing), *(row[1] for row in changing)
+        )
+        return updated
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.end = obj.date + obj.duration
+        if not objs:
+            return objs
+        with transaction.atomic():
+            # a batch is a single change
+            change = next_change()
+            for obj in objs:
+                obj.change_seq = change
+            created = super().bulk_create(objs, *args, **kwargs)
+        appointments_changed(
+            *(obj.patient_id for obj in objs), *(obj.doctor_id for obj in objs)
+        )
+        # bulk inserts send no post_save, book their intervals here
+        from .availability import availability
+
+        intervals = [(obj.doctor_id, obj.date, obj.end) for obj in objs]
+        transaction.on_commit(partial(availability.changed, added=intervals))
+        return created
 
 
 class Appointment(models.Model):
@@ -11,6 +207,7 @@ class Appointment(models.Model):
         blank=False,
         null=False,
         related_name="patients",
+        db_index=False,  # covered by the composite (patient, date) index
     )
 
     doctor = models.ForeignKey(
@@ -19,6 +216,7 @@ class Appointment(models.Model):
         blank=False,
         null=False,
         related_name="doctors",
+        db_index=False,  # covered by the composite (doctor, date) index
     )
 
     description = models.TextField(
@@ -30,11 +228,63 @@ class Appointment(models.Model):
     )
 
     date = models.DateTimeField(_("date"), blank=False, null=False)
+    duration = models.DurationField(
+        _("duration"),
+        default=DEFAULT_DURATION,
+        validators=[MinValueValidator(MIN_DURATION), MaxValueValidator(MAX_DURATION)],
+        help_text=_("Length of the appointment [default: 30 minutes]."),
+    )
+    end = models.DateTimeField(_("end"), editable=False)
     date_created = models.DateTimeField(_("date added"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("date updated"), auto_now=True)
 
     approved = models.BooleanField(
         _("approved"), default=False, null=False, blank=False
     )
+    change_seq = models.BigIntegerField(
+        _("change number"),
+        default=0,
+        editable=False,
+        help_text=_("Number of the latest change, increasing over all appointments."),
+    )
+
+    objects = AppointmentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["doctor", "date"], name="appointment_doctor_date"),
+            models.Index(fields=["patient", "date"], name="appointment_patient_date"),
+            models.Index(
+                fields=["doctor", "date"],
+                condition=models.Q(approved=False),
+                name="appointment_pending_date",
+            ),
+            models.Index(
+                fields=["doctor", "change_seq"], name="appointment_doctor_seq"
+            ),
+            models.Index(
+                fields=["patient", "change_seq"], name="appointment_patient_seq"
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored schedule, so that signal handlers can see what moved
+        instance._stored_schedule = tuple(
+            instance.__dict__.get(name) for name in ("doctor_id", "date", "end")
+        )
+        return instance
+
+    def save(self, *args, update_fields=None, **kwargs):
+        self.end = self.date + self.duration
+        if update_fields is not None:
+            update_fields = {"updated_at", "change_seq", *update_fields}
+            if {"date", "duration"} & update_fields:
+                update_fields.add("end")
+        with transaction.atomic():
+            self.change_seq = next_change()
+            super().save(*args, update_fields=update_fields, **kwargs)
 
     def clean(self) -> None:
         if not self.doctor.is_doctor:
@@ -44,3 +294,21 @@ class Appointment(models.Model):
 
     def __str__(self) -> str:
         return f"{self.patient}-{self.doctor}-{self.date}"
+
+
+class Tombstone(models.Model):
+    """
+    Marks an appointment that no longer involves `user`, because it was deleted or
+    moved to another doctor, for the change feed.
+    """
+
+    appointment_id = models.BigIntegerField(_("appointment"))
+    # no foreign key, deleting a user deletes appointments which leave tombstones
+    user_id = models.BigIntegerField(_("user"))
+    change_seq = models.BigIntegerField(_("change number"))
+    date_created = models.DateTimeField(_("date added"), auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user_id", "change_seq"], name="tombstone_user_seq"),
+        ]
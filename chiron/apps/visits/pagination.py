@@ -0,0 +1,112 @@
+from heapq import merge
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+
+class AppointmentCursorPagination(CursorPagination):
+    """
+    Keyset pagination over appointments ordered by `(date, id)`.
+
+    The cursor carries the `(date, id)` pair of the last (or first) row of the
+    current page, so every page is fetched with a plain range condition on the
+    ordering columns: no OFFSET scans and no COUNT(*), whatever the page number.
+    """
+
+    ordering = ("date", "id")
+    page_size = settings.APPOINTMENT_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        A page of `queryset`, or of the union of a list of querysets (e.g. the
+        `roles` of a user): each one is read up to the page size from the cursor
+        on, in order, and the rows merged.
+        """
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+        position = self.cursor.position if self.cursor else None
+
+        branches = queryset if isinstance(queryset, list) else [queryset]
+        # fetch one extra row to find out whether there is a following page
+        fetched = [
+            list(self.window(branch, position, reverse)[: self.page_size + 1])
+            for branch in branches
+        ]
+        results, seen = [], set()
+        for row in merge(*fetched, key=self.key, reverse=reverse):
+            # a row found by several branches comes once
+            if self.key(row) not in seen:
+                seen.add(self.key(row))
+                results.append(row)
+        results = results[: self.page_size + 1]
+        self.page = results[: self.page_size]
+        has_more = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_previous, self.has_next = has_more, position is not None
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def window(self, queryset, position, reverse):
+        """
+        `queryset` in cursor order, from `position` on.
+        """
+        if reverse:
+            queryset = queryset.order_by("-date", "-id")
+        else:
+            queryset = queryset.order_by("date", "id")
+
+        if position is not None:
+            date, pk = position
+            if reverse:
+                keyset = Q(date__lt=date) | Q(date=date, id__lt=pk)
+            else:
+                keyset = Q(date__gt=date) | Q(date=date, id__gt=pk)
+            queryset = queryset.filter(keyset)
+        return queryset
+
+    @staticmethod
+    def key(row):
+        if isinstance(row, dict):
+            return row["date"], row["id"]
+        return row.date, row.pk
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            date, pk = cursor.position.rsplit("|", 1)
+            date, pk = parse_datetime(date), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=cursor.reverse, position=(date, pk))
+
+    def _get_position_from_instance(self, instance, ordering):
+        date, pk = self.key(instance)
+        return f"{date.isoformat()}|{pk}"
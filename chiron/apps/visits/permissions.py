@@ -0,0 +1,28 @@
+from django.db.models import Q
+from chiron.apps.users.permissions import ScopedPermission
+
+ANY = "any"
+
+
+class IsParticipant(ScopedPermission):
+    """
+    Allow access to the appointments the user takes part in, in the role given for the
+    action by the view's `participant_roles`: "doctor", "patient" or `ANY` of both.
+    Actions without a role aren't restricted.
+    """
+
+    def scope(self, request, view, queryset):
+        role = view.participant_roles.get(view.action)
+        if role is None:
+            return queryset
+        if role != ANY:
+            return queryset.filter(**{role: request.user})
+        if view.detail:
+            # a primary key lookup, checking either role on the row found is enough
+            return queryset.filter(Q(doctor=request.user) | Q(patient=request.user))
+        return queryset.involving(request.user)
+
+    def branches(self, request, view, queryset):
+        if view.participant_roles.get(view.action) == ANY and not view.detail:
+            return queryset.roles(request.user)
+        return super().branches(request, view, queryset)
@@ -0,0 +1,121 @@
+import random
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, transaction
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from . import models
+
+
+class ScheduleConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = _("the doctor already has an appointment at that time")
+    default_code = "schedule_conflict"
+
+
+def lock_schedules(doctors):
+    """
+    Serialize bookings of the given doctors (ids) until the surrounding transaction ends.
+
+    The no-op update takes the doctors' row locks on databases with row locking, and
+    on SQLite turns the transaction into the single writer before anything is read.
+    """
+    get_user_model().objects.filter(pk__in=doctors).update(is_doctor=F("is_doctor"))
+
+
+def retry_locked(function, attempts=8):
+    for attempt in range(attempts):
+        try:
+            return function()
+        except OperationalError as error:
+            # SQLite reports a competing writer instead of waiting for it
+            if "locked" not in str(error) or attempt == attempts - 1:
+                raise
+            time.sleep(random.uniform(0, 0.01 * 2**attempt))
+
+
+def book(doctor, start, duration, save, exclude=None):
+    """
+    Call `save()` if the doctor is free during `[start, start + duration)`, raising
+    `ScheduleConflict` otherwise. Both the check and the save happen while holding
+    the doctor's schedule lock, so concurrent bookings of one slot can't both pass.
+
+    `exclude` is the primary key of an appointment being moved, which can't conflict
+    with itself.
+    """
+
+    def attempt():
+        with transaction.atomic():
+            lock_schedules([doctor.pk])
+            conflicts = models.Appointment.objects.overlapping(
+                doctor, start, start + duration
+            )
+            if exclude is not None:
+                conflicts = conflicts.exclude(pk=exclude)
+            if conflicts.exists():
+                raise ScheduleConflict()
+            return save()
+
+    return retry_locked(attempt)
+
+
+def book_many(appointments):
+    """
+    Insert the given unsaved appointments that fit into their doctors' schedules, in
+    a single transaction and a single `INSERT`. Appointments overlapping an existing
+    one, or an earlier one of the batch, are left out.
+
+    Returns whether each appointment was booked.
+
+    Each doctor's bookings are kept as disjoint intervals sorted by start, so an
+    appointment is checked against the one interval starting last before it ends.
+    """
+    if not appointments:
+        return []
+    doctors = {appointment.doctor_id for appointment in appointments}
+    start = min(appointment.date for appointment in appointments)
+    end = max(appointment.date + appointment.duration for appointment in appointments)
+
+    def attempt():
+        with transaction.atomic():
+            lock_schedules(doctors)
+            # per doctor, the starts and the ends of the booked intervals
+            starts, ends = defaultdict(list), defaultdict(list)
+            existing = (
+                models.Appointment.objects.filter(
+                    doctor__in=doctors,
+                    date__gt=start - models.MAX_DURATION,
+                    date__lt=end,
+                )
+                .order_by("doctor_id", "date")
+                .values_list("doctor_id", "date", "end")
+            )
+            for doctor, date, until in existing:
+                if ends[doctor] and date < ends[doctor][-1]:
+                    # overlapping appointments (booked without a check) count as one
+                    ends[doctor][-1] = max(ends[doctor][-1], until)
+                else:
+                    starts[doctor].append(date)
+                    ends[doctor].append(until)
+
+            outcome, accepted = [], []
+            for appointment in appointments:
+                date, until = appointment.date, appointment.date + appointment.duration
+                doctor_starts = starts[appointment.doctor_id]
+                doctor_ends = ends[appointment.doctor_id]
+                # ends are in order too, the intervals being disjoint
+                i = bisect_left(doctor_starts, until)
+                free = i == 0 or doctor_ends[i - 1] <= date
+                if free:
+                    doctor_starts.insert(i, date)
+                    doctor_ends.insert(i, until)
+                    accepted.append(appointment)
+                outcome.append(free)
+            models.Appointment.objects.bulk_create(accepted)
+            return outcome
+
+    return retry_locked(attempt)
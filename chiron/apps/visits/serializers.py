@@ -1,10 +1,15 @@
+from datetime import timedelta
 from rest_framework import serializers
 from . import models
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
+from chiron.apps.users.serializers import NameSerializer
+from chiron.apps.utils import FlattenMixin
 
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(FlattenMixin, serializers.ModelSerializer):
     patient = serializers.CharField(allow_null=False)
     doctor = serializers.CharField(allow_null=False)
 
@@ -12,16 +17,58 @@ class AppointmentSerializer(serializers.ModelSerializer):
         model = models.Appointment
         fields = "__all__"
         read_only_fields = ["approved"]
+        # doctor__first_name, doctor__last_name
+        flatten = [("doctor", NameSerializer)]
+        # columns of the fields holding users, for ValuesPlan
+        values = {"patient": "patient__username", "doctor": "doctor__username"}
+
+    @classmethod
+    def plan_queryset(cls, queryset):
+        """
+        Load everything the representation needs in a single query: both users are
+        joined in and only the columns that end up in the output are fetched.
+        """
+        return queryset.select_related("patient", "doctor").only(
+            "id",
+            "description",
+            "date",
+            "duration",
+            "end",
+            "date_created",
+            "updated_at",
+            "approved",
+            "change_seq",
+            "patient__username",
+            "doctor__username",
+            "doctor__first_name",
+            "doctor__last_name",
+        )
 
     def validate(self, attrs):
+        # resolve the doctor once, the resolved user is what gets saved; batches
+        # hand in all of their doctors, looked up at once, as `doctors` in the context
+        if self.partial and "doctor" not in attrs:
+            return super().validate(attrs)
+        doctors = self.context.get("doctors")
         try:
-            if get_user_model().objects.get(username=attrs["doctor"]).is_doctor:
-                return super().validate(attrs)
-        except ObjectDoesNotExist:
+            if doctors is not None:
+                doctor = doctors[attrs["doctor"]]
+            else:
+                doctor = (
+                    get_user_model()
+                    .objects.only("pk", "username", "is_doctor")
+                    .get(username=attrs["doctor"])
+                )
+        except (KeyError, ObjectDoesNotExist):
             raise serializers.ValidationError(
                 "mentioned user for doctor does not exist"
             )
-        raise serializers.ValidationError("mentioned user for doctor is not a doctor")
+        if not doctor.is_doctor:
+            raise serializers.ValidationError(
+                "mentioned user for doctor is not a doctor"
+            )
+        attrs["doctor"] = doctor
+        return super().validate(attrs)
 
 
 class AppointmentDoctorSerializer(AppointmentSerializer):
@@ -29,5 +76,68 @@ class AppointmentDoctorSerializer(AppointmentSerializer):
 
     class Meta:
         model = models.Appointment
-        fields = ["id", "doctor", "description", "date"]
+        fields = ["id", "doctor", "description", "date", "duration"]
         read_only_fields = ["id"]
+        flatten = []
+
+
+class SlotQuerySerializer(serializers.Serializer):
+    after = serializers.DateTimeField(required=False)
+    before = serializers.DateTimeField(required=False)
+    count = serializers.IntegerField(
+        required=False, min_value=1, max_value=settings.AVAILABILITY["MAX_RESULTS"]
+    )
+    doctor = serializers.ListField(child=serializers.CharField(), required=False)
+
+    def validate(self, attrs):
+        now = timezone.now()
+        attrs["after"] = max(attrs.get("after", now), now)
+        attrs.setdefault("before", attrs["after"] + timedelta(days=7))
+        attrs.setdefault("count", 10)
+        if attrs["before"] - attrs["after"] > settings.AVAILABILITY["MAX_WINDOW"]:
+            raise serializers.ValidationError("the search window is too long")
+        return attrs
+
+
+class SlotSerializer(serializers.Serializer):
+    doctor = serializers.CharField()
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+
+
+class DateRangeSerializer(serializers.Serializer):
+    after = serializers.DateTimeField(required=False)
+    before = serializers.DateTimeField(required=False)
+
+    def filter_queryset(self, queryset):
+        if "after" in self.validated_data:
+            queryset = queryset.filter(date__gte=self.validated_data["after"])
+        if "before" in self.validated_data:
+            queryset = queryset.filter(date__lt=self.validated_data["before"])
+        return queryset
+
+
+class ApprovalSerializer(DateRangeSerializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, max_length=1000
+    )
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError("select appointments by ids or dates")
+        return attrs
+
+    def filter_queryset(self, queryset):
+        if "ids" in self.validated_data:
+            queryset = queryset.filter(pk__in=self.validated_data["ids"])
+        return super().filter_queryset(queryset)
+
+
+class ChangesQuerySerializer(serializers.Serializer):
+    since = serializers.IntegerField(required=False, min_value=0, default=0)
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=500,
+        default=settings.APPOINTMENT_PAGE_SIZE,
+    )
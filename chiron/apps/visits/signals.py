@@ -0,0 +1,77 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from chiron.apps.users.models import User
+from . import models
+from .availability import availability
+
+
+@receiver(post_save, sender=models.Appointment)
+@receiver(post_delete, sender=models.Appointment)
+def refresh_appointment_lists(sender, instance, **kwargs):
+    # connected first, to still see the doctor an updated appointment moved away from
+    stored = getattr(instance, "_stored_schedule", None) or (None,)
+    users = {instance.patient_id, instance.doctor_id, stored[0]} - {None}
+    models.appointments_changed(*users)
+
+
+@receiver(post_save, sender=models.Appointment)
+def bury_moved_appointment(sender, instance, created, **kwargs):
+    stored = getattr(instance, "_stored_schedule", None)
+    if created or not stored or stored[0] in (None, instance.doctor_id):
+        return
+    # the appointment left the previous doctor's list
+    models.Tombstone.objects.create(
+        appointment_id=instance.pk, user_id=stored[0], change_seq=instance.change_seq
+    )
+
+
+@receiver(post_delete, sender=models.Appointment)
+def bury_deleted_appointment(sender, instance, **kwargs):
+    change = models.next_change()
+    models.Tombstone.objects.bulk_create(
+        models.Tombstone(appointment_id=instance.pk, user_id=user, change_seq=change)
+        for user in {instance.patient_id, instance.doctor_id}
+    )
+
+
+@receiver(post_save, sender=models.Appointment)
+def track_booked_interval(sender, instance, created, **kwargs):
+    stored = getattr(instance, "_stored_schedule", None)
+    current = (instance.doctor_id, instance.date, instance.end)
+    if stored == current:
+        return
+    instance._stored_schedule = current
+    if created:
+        transaction.on_commit(partial(availability.changed, added=[current]))
+    elif stored is None or None in stored:
+        # saved without being loaded first, the old interval is unknown
+        transaction.on_commit(availability.invalidate)
+    else:
+        transaction.on_commit(
+            partial(availability.changed, removed=[stored], added=[current])
+        )
+
+
+@receiver(post_delete, sender=models.Appointment)
+def release_booked_interval(sender, instance, **kwargs):
+    interval = (instance.doctor_id, instance.date, instance.end)
+    transaction.on_commit(partial(availability.changed, removed=[interval]))
+
+
+@receiver(post_save, sender=User)
+def refresh_shown_names(sender, instance, created, update_fields=None, **kwargs):
+    fields = models.NAME_FIELDS
+    if update_fields is not None:
+        fields = [name for name in fields if name in update_fields]
+    if created or not fields:
+        return
+    stored = getattr(instance, "_stored", {})
+    # saved without being loaded first, the old names are unknown
+    if any(
+        name not in stored or stored[name] != getattr(instance, name)
+        for name in fields
+        if name in instance.__dict__
+    ):
+        models.names_changed()
@@ -0,0 +1,57 @@
+from . import models, serializers
+
+
+def changes(user, since, limit):
+    """
+    The changes to `user`'s appointments after the change number `since`, as
+    `(updated, deleted, watermark, more)`: the changed appointments, the ids of the
+    ones that were deleted (or left the user), the change number to resume from
+    and whether there are more changes after it.
+
+    About `limit` changes are returned, never splitting a change (e.g. a bulk
+    approval) between two calls.
+    """
+    appointments = serializers.AppointmentSerializer.plan_queryset(
+        models.Appointment.objects.all()
+    )
+    tombstones = models.Tombstone.objects.filter(user_id=user.pk)
+    updated = list(
+        appointments.changed_since(user, since).order_by("change_seq", "id")[
+            : limit + 1
+        ]
+    )
+    deleted = list(
+        tombstones.filter(change_seq__gt=since)
+        .order_by("change_seq", "id")
+        .values_list("change_seq", "appointment_id")[: limit + 1]
+    )
+    changes = sorted(
+        [appointment.change_seq for appointment in updated]
+        + [change for change, _ in deleted]
+    )
+
+    more = len(changes) > limit
+    if more:
+        # the first change left out, the last fetched row of a longer list comes later
+        boundary = changes[limit]
+        if boundary > changes[0]:
+            until = boundary - 1
+        else:
+            # a single change larger than `limit` is sent whole
+            until = boundary
+            updated = list(
+                appointments.changed_since(user, since).filter(change_seq=boundary)
+            )
+            deleted = list(
+                tombstones.filter(change_seq=boundary).values_list(
+                    "change_seq", "appointment_id"
+                )
+            )
+        updated = [a for a in updated if a.change_seq <= until]
+        deleted = [(change, pk) for change, pk in deleted if change <= until]
+        changes = [change for change in changes if change <= until] or [until]
+
+    watermark = changes[-1] if changes else since
+    present = {appointment.pk for appointment in updated}
+    deleted = list(dict.fromkeys(pk for _, pk in deleted if pk not in present))
+    return updated, deleted, watermark, more
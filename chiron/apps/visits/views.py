@@ -1,5 +1,5 @@
-from django.db import IntegrityError
-from rest_framework.authentication import TokenAuthentication, SessionAuthentication
+from django.db import IntegrityError, router
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.response import Response
 import django.shortcuts as shortcuts
 from rest_framework import (
@@ -10,12 +10,41 @@ from rest_framework import (
     mixins,
     decorators,
 )
-from . import serializers, models
+from . import serializers, models, pagination, scheduling, exports, sync
+from .permissions import ANY, IsParticipant
+from .availability import availability
+from chiron.apps.users.authentication import CachedTokenAuthentication
+from chiron.apps.users.permissions import scope_branches, scope_queryset
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.http import Http404, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.utils.translation import gettext_lazy as _
+from django.views.decorators.http import condition
+from chiron.apps import versions
+from chiron.apps.utils import values_plan
+from chiron.db.routers import ReplicaReadsMixin
+
+
+def list_versions(request, *args, **kwargs):
+    # the user's appointments and the names shown with them
+    return (
+        versions.get(models.VERSION_KEY.format(user=request.user.pk)),
+        versions.get(models.NAMES_VERSION_KEY),
+    )
+
+
+def list_etag(request, *args, **kwargs):
+    # the browsable API and JSON renderings of a version are different entities
+    appointments, names = list_versions(request)
+    return f"{appointments}-{names}-{request.accepted_renderer.format}"
+
+
+def list_last_modified(request, *args, **kwargs):
+    return versions.timestamp(max(list_versions(request)))
 
 
 class AppointmentViewSet(
+    ReplicaReadsMixin,
     viewsets.GenericViewSet,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -34,55 +63,181 @@ class AppointmentViewSet(
 
 
     * **General Lists** [[/appointment/](/appointment/)]:
-        * [`GET`]: lists all appointments for the currently logged-in user
-        * [`POST`]: create an appointment for the currently logged-in user
+        * [`GET`]: lists all appointments for the currently logged-in user (cursor paginated by date, use `page_size` to change the page length, supports `If-None-Match`/`If-Modified-Since`)
+        * [`POST`]: create an appointment for the currently logged-in user (refused with `409` if the doctor is already booked at that time)
     * **Specific Appointment Managements** [`/appointment/<appointment_id>/`]:
         * **Retrieve** [`GET`]: retrieve details of the specific appointment (if owned by user)
         * **Update** & **Delete**  [`PUT`, `DELETE`]: Update/Remove the specific appointment (if owned by the currently logged-in user as its patient)
+    * **Bulk Approval** [[/appointment/approve/](/appointment/approve/), [/appointment/reject/](/appointment/reject/) | `POST`]: approve/reject the currently logged-in doctor's appointments selected by `ids` and/or an `after`/`before` date range
+    * **Changes** [[/appointment/changes/](/appointment/changes/) | `GET`]: the currently logged-in user's appointments created, updated or deleted after the change number `since`, for incremental sync
+    * **Events** [`/appointment/events/` | `GET`]: server-sent events with the changes of the currently logged-in user's appointments as they happen, resumable with `Last-Event-ID` (served by the ASGI application only)
+    * **Export** [[/appointment/export/](/appointment/export/) | `GET`]: stream the appointments of the currently logged-in user as NDJSON or CSV (`output=ndjson|csv`, optional `after`/`before`)
     * **Visit Specific Actions**:
         * **Approve** [`/appointment/<appointment_id>/approve/` | `POST`]: approve the specific appointment (if owned by the currently logged-in user as its doctor)
         * **Reject** [`/appointment/<appointment_id>/reject/` | `POST`]: approve the specific appointment (if owned by the currently logged-in user as its doctor)
         * **Visit** [`/appointment/<appointment_id>/visit/` | `GET`]: retireve contact info of doctor if appointment is approved (if appointment is owned by the currently logged-in user as its patient)
+    * **Bulk Create** [[/appointment/bulk/](/appointment/bulk/) | `POST`]: create a list of appointments for the currently logged-in user, reporting the outcome of each
+    * **Available Slots** [[/appointment/slots/](/appointment/slots/) | `GET`]: the earliest free slots among all doctors (or the given `doctor` usernames) between `after` and `before`
     """
 
     queryset = models.Appointment.objects.all()
-    permission_classes = [drf_permissions.IsAuthenticated]
-    authentication_classes = [SessionAuthentication, TokenAuthentication]
+    permission_classes = [drf_permissions.IsAuthenticated, IsParticipant]
+    authentication_classes = [SessionAuthentication, CachedTokenAuthentication]
+    pagination_class = pagination.AppointmentCursorPagination
+    participant_roles = {
+        "list": ANY,
+        "retrieve": ANY,
+        "destroy": "patient",
+        "update": "patient",
+        "partial_update": "patient",
+        "approve": "doctor",
+        "reject": "doctor",
+        "visit": "patient",
+    }
+    replica_actions = ["retrieve", "changes", "export"]
+    bulk_limit = 1000
+    lookup_value_regex = "[0-9]+"
 
     def get_serializer_class(self):
-        if self.action in ["retrieve", "list", "delete"]:
+        if self.action in ["retrieve", "list", "destroy", "changes"]:
             return serializers.AppointmentSerializer
-        if self.action in ["create", "update"]:
+        if self.action in ["create", "update", "partial_update", "bulk"]:
             return serializers.AppointmentDoctorSerializer
+        if self.action == "slots":
+            return serializers.SlotSerializer
+        if self.action in ["approve_many", "reject_many"]:
+            return serializers.ApprovalSerializer
+        if self.action == "export":
+            return serializers.DateRangeSerializer
         return drf_serializers.Serializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ["retrieve", "list"]:
+            return self.get_serializer_class().plan_queryset(queryset)
+        if self.action == "visit":
+            return queryset.select_related("doctor").only("approved", "doctor__phone")
+        return queryset
+
     def filter_queryset(self, queryset):
-        if self.action in ["list", "retrieve", "delete"]:
-            return queryset.filter(
-                Q(doctor=self.request.user) | Q(patient=self.request.user)
-            )
+        return scope_queryset(self.request, self, queryset)
 
-        return queryset
+    @method_decorator(
+        condition(etag_func=list_etag, last_modified_func=list_last_modified)
+    )
+    def list(self, request, *args, **kwargs):
+        # read-only rows straight from values(), the paginator takes them as well,
+        # and merges the pages of the user's roles
+        plan = values_plan(self.get_serializer_class())
+        page = self.paginate_queryset(
+            scope_branches(request, self, plan.values(self.get_queryset()))
+        )
+        return self.get_paginated_response(plan.represent(page))
 
     def perform_create(self, serializer):
-        serializer.is_valid()
-        serializer.save(
-            patient=self.request.user,
-            doctor=shortcuts.get_object_or_404(
-                get_user_model(), username=serializer.validated_data["doctor"]
-            ),
+        # the doctor has already been resolved by the serializer's validation
+        data, instance = serializer.validated_data, serializer.instance
+        if instance is None:
+            schedule = {"duration": models.DEFAULT_DURATION}
+        else:
+            # what a PUT or a PATCH leaves out keeps its stored value
+            schedule = {
+                name: getattr(instance, name) for name in ["doctor", "date", "duration"]
+            }
+        schedule.update(data)
+        scheduling.book(
+            doctor=schedule["doctor"],
+            start=schedule["date"],
+            duration=schedule["duration"],
+            save=lambda: serializer.save(patient=self.request.user),
+            exclude=instance.pk if instance is not None else None,
         )
 
+    @decorators.action(methods=["POST"], detail=False, name="Bulk Create")
+    def bulk(self, request):
+        """
+        Create a list of appointments at once. Each item is validated and booked on
+        its own: the response lists, in order, either the created appointment
+        (`"status": 201`) or the reasons it was refused (`"status": 400` or `409`).
+
+        **Permissions**:
+
+        * _Authentication_ is required
+        """
+        items = request.data
+        if not isinstance(items, list):
+            raise drf_serializers.ValidationError(_("Expected a list of appointments."))
+        if len(items) > self.bulk_limit:
+            raise drf_serializers.ValidationError(
+                _("At most %(limit)d appointments per request.")
+                % {"limit": self.bulk_limit}
+            )
+
+        # trimmed like the serializer's doctor field trims them
+        usernames = {
+            str(item["doctor"]).strip()
+            for item in items
+            if isinstance(item, dict) and item.get("doctor")
+        }
+        doctors = {
+            doctor.username: doctor
+            for doctor in get_user_model()
+            .objects.only("pk", "username", "is_doctor")
+            .filter(username__in=usernames)
+        }
+        context = {**self.get_serializer_context(), "doctors": doctors}
+
+        results, pending = [None] * len(items), []
+        for position, item in enumerate(items):
+            serializer = self.get_serializer_class()(data=item, context=context)
+            if serializer.is_valid():
+                appointment = models.Appointment(
+                    patient=request.user, **serializer.validated_data
+                )
+                pending.append((position, serializer, appointment))
+            else:
+                results[position] = dict(
+                    status=status.HTTP_400_BAD_REQUEST, errors=serializer.errors
+                )
+
+        booked = scheduling.book_many([appointment for _, _, appointment in pending])
+        for (position, serializer, appointment), success in zip(pending, booked):
+            if success:
+                serializer.instance = appointment
+                results[position] = dict(
+                    status=status.HTTP_201_CREATED, appointment=serializer.data
+                )
+            else:
+                conflict = scheduling.ScheduleConflict()
+                results[position] = dict(
+                    status=conflict.status_code, errors=[conflict.detail]
+                )
+
+        created = sum(result["status"] == status.HTTP_201_CREATED for result in results)
+        if created == len(results):
+            code = status.HTTP_201_CREATED
+        elif created:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response(results, status=code)
+
     def perform_update(self, serializer):
         self.perform_create(serializer)
 
     def apply_approval(self, request, toggle, pk=None):
-        object = self.get_object()
-        if object.doctor == request.user:
-            object.approved = toggle
-            object.save()
+        # a single conditional update, the doctor check is part of its WHERE clause
+        appointments = self.filter_queryset(self.get_queryset()).filter(pk=pk)
+        if appointments.set_approval(toggle):
             return Response(status=status.HTTP_202_ACCEPTED)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        raise Http404
+
+    def apply_bulk_approval(self, request, toggle):
+        selection = self.get_serializer(data=request.data)
+        selection.is_valid(raise_exception=True)
+        appointments = models.Appointment.objects.filter(doctor=request.user)
+        updated = selection.filter_queryset(appointments).set_approval(toggle)
+        return Response(dict(updated=updated), status=status.HTTP_202_ACCEPTED)
 
     @decorators.action(methods=["POST"], detail=True, name="Reject Appointments")
     def reject(self, request, pk=None):
@@ -108,6 +263,112 @@ class AppointmentViewSet(
         """
         return self.apply_approval(request=request, toggle=True, pk=pk)
 
+    @decorators.action(
+        methods=["POST"],
+        detail=False,
+        url_path="reject",
+        url_name="reject-many",
+        name="Reject Many Appointments",
+    )
+    def reject_many(self, request):
+        """
+        Reject the appointments selected by `ids` and/or an `after`/`before` date range,
+        among the ones of the currently logged-in doctor.
+
+        **Permissions**:
+
+        * _Authentication_ is required
+        * Only appointments owned by the doctor are affected
+        """
+        return self.apply_bulk_approval(request=request, toggle=False)
+
+    @decorators.action(
+        methods=["POST"],
+        detail=False,
+        url_path="approve",
+        url_name="approve-many",
+        name="Approve Many Appointments",
+    )
+    def approve_many(self, request):
+        """
+        Approve the appointments selected by `ids` and/or an `after`/`before` date range,
+        among the ones of the currently logged-in doctor.
+
+        **Permissions**:
+
+        * _Authentication_ is required
+        * Only appointments owned by the doctor are affected
+        """
+        return self.apply_bulk_approval(request=request, toggle=True)
+
+    @decorators.action(methods=["GET"], detail=False, name="Changes")
+    def changes(self, request):
+        """
+        Incremental sync: the appointments of the currently logged-in user created or
+        updated (`updated`) and deleted (`deleted`, ids) after the change number
+        `since` (default: 0, everything), at most about `limit` changes at a time.
+
+        Clients keep the returned `watermark` to pass as `since` next time, right away
+        while `more` is true. Deletions are to be applied before updates.
+
+        **Permissions**:
+
+        * _Authentication_ is required
+        """
+        query = serializers.ChangesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        since = query.validated_data["since"]
+        updated, deleted, watermark, more = sync.changes(
+            request.user, since, query.validated_data["limit"]
+        )
+        return Response(
+            dict(
+                since=since,
+                watermark=watermark,
+                more=more,
+                updated=self.get_serializer(updated, many=True).data,
+                deleted=deleted,
+            )
+        )
+
+    @decorators.action(methods=["GET"], detail=False, name="Export")
+    def export(self, request):
+        """
+        Stream all appointments of the currently logged-in user (every appointment for
+        admins) as newline delimited JSON (`?output=ndjson`, default) or CSV
+        (`?output=csv`), optionally limited to an `after`/`before` date range.
+
+        **Permissions**:
+
+        * _Authentication_ is required
+        """
+        output = request.query_params.get("output", "ndjson")
+        if output not in exports.FORMATS:
+            raise drf_serializers.ValidationError({"output": _("Unknown format.")})
+        dates = serializers.DateRangeSerializer(data=request.query_params)
+        dates.is_valid(raise_exception=True)
+
+        # the body is streamed after the view returns, out of replica_reads()
+        appointments = models.Appointment.objects.using(
+            router.db_for_read(models.Appointment)
+        )
+        branches = [appointments]
+        if not request.user.is_staff:
+            # merged in date order, instead of sorting the union of both roles
+            branches = appointments.roles(request.user)
+        branches = [
+            dates.filter_queryset(branch).order_by("date", "id") for branch in branches
+        ]
+
+        content_type, extension = exports.FORMATS[output]
+        response = StreamingHttpResponse(
+            exports.stream(branches, output), content_type=content_type
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="appointments.{extension}"'
+        )
+        return response
+
     @decorators.action(methods=["GET"], detail=True, name="Visit")
     def visit(self, request, pk=None):
         """
@@ -119,9 +380,44 @@ class AppointmentViewSet(
         * API only available to _Owner_ of the appointment (the patient)
         """
         object = self.get_object()
-        if object.patient == request.user and object.approved:
+        if object.approved:
             return Response(
                 data=dict(phone_number=str(object.doctor.phone)),
                 status=status.HTTP_202_ACCEPTED,
             )
         return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    @decorators.action(methods=["GET"], detail=False, name="Available Slots")
+    def slots(self, request):
+        """
+        Find the `count` earliest free slots between `after` (default: now) and
+        `before` (default: a week later), among all doctors or the ones listed
+        with `doctor`.
+
+        **Permissions**:
+
+        * _Authentication_ is required
+        """
+        query = serializers.SlotQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        query = query.validated_data
+
+        doctors = get_user_model().objects.filter(is_doctor=True)
+        if "doctor" in query:
+            doctors = doctors.filter(username__in=query["doctor"])
+        found = availability.earliest(
+            doctors.values_list("pk", flat=True),
+            query["after"],
+            query["before"],
+            query["count"],
+        )
+        usernames = dict(
+            get_user_model()
+            .objects.filter(pk__in={doctor for doctor, _, _ in found})
+            .values_list("pk", "username")
+        )
+        slots = [
+            dict(doctor=usernames[doctor], start=start, end=end)
+            for doctor, start, end in found
+        ]
+        return Response(self.get_serializer(slots, many=True).data)
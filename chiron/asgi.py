@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "chiron.settings")
 
 application = get_asgi_application()
+
+# imported once Django is set up
+from chiron.apps.visits import events  # noqa: E402
+
+application = events.route(application)
@@ -0,0 +1,36 @@
+"""
+Benchmarks of the Chiron back-end, each module runs with `python -m chiron.benchmarks.<name>`.
+"""
+
+import contextlib
+import os
+
+
+def setup():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "chiron.settings")
+    import django
+
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database():
+    """
+    Run the enclosed block against a freshly migrated throwaway database.
+    """
+    setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield name
+    finally:
+        connection.creation.destroy_test_db(name, verbosity=0)
+        teardown_test_environment()
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
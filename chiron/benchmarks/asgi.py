@@ -0,0 +1,134 @@
+"""
+Latency and throughput of the sync and async request paths under ASGI.
+
+    python -m chiron.benchmarks.asgi --requests 2000 --concurrency 1 50 500 --client-delay 0.05
+
+Requests go through the project's ASGI application in-process, `--client-delay`
+makes every client take that many seconds to read the response.
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from . import test_database, percentile
+
+ROUTES = {
+    "appointment list": "/appointment/?page_size=20",
+    "appointment detail": "/appointment/{appointment}/",
+    "user me": "/user/me/",
+    "user drs": "/user/drs/?page_size=20",
+}
+
+
+def fill(doctors, appointments):
+    from rest_framework.authtoken.models import Token
+    from chiron.apps.users.models import User
+    from chiron.apps.visits.models import Appointment
+
+    patient = User.objects.create_user(username="bench_patient")
+    User.objects.bulk_create(
+        User(username=f"bench_doctor{i}", is_doctor=True) for i in range(doctors)
+    )
+    doctors = list(User.objects.filter(is_doctor=True))
+    start = datetime(2021, 1, 1, tzinfo=timezone.utc)
+    Appointment.objects.bulk_create(
+        Appointment(
+            patient=patient,
+            doctor=doctors[i % len(doctors)],
+            date=start + timedelta(minutes=30 * i),
+        )
+        for i in range(appointments)
+    )
+    return Token.objects.create(user=patient).key, Appointment.objects.first().pk
+
+
+async def request(application, path, token, delay):
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [
+            (b"host", b"localhost"),
+            (b"authorization", f"Token {token}".encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        elif delay:
+            await asyncio.sleep(delay)
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+async def load(application, path, token, total, concurrency, delay):
+    timings, statuses, threads = [], set(), [threading.active_count()]
+
+    async def worker(count):
+        for _ in range(count):
+            began = time.perf_counter()
+            statuses.add(await request(application, path, token, delay))
+            timings.append((time.perf_counter() - began) * 1000)
+            threads.append(threading.active_count())
+
+    began = time.perf_counter()
+    share, extra = divmod(total, concurrency)
+    await asyncio.gather(*(worker(share + (i < extra)) for i in range(concurrency)))
+    return timings, total / (time.perf_counter() - began), statuses, max(threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--client-delay", type=float, default=0.0)
+    parser.add_argument("--doctors", type=int, default=500)
+    parser.add_argument("--appointments", type=int, default=10000)
+    args = parser.parse_args()
+
+    with test_database():
+        from chiron.asgi import application
+
+        token, appointment = fill(args.doctors, args.appointments)
+        for concurrency in args.concurrency:
+            for route, path in ROUTES.items():
+                path = path.format(appointment=appointment)
+                for label, prefix in [("sync", ""), ("async", "/async")]:
+                    timings, throughput, statuses, threads = asyncio.run(
+                        load(
+                            application,
+                            prefix + path,
+                            token,
+                            args.requests,
+                            concurrency,
+                            args.client_delay,
+                        )
+                    )
+                    print(
+                        f"{route:>18} {label:>5} x{concurrency:<4}: "
+                        f"p50 {percentile(timings, 0.5):7.2f} ms, "
+                        f"p99 {percentile(timings, 0.99):7.2f} ms, "
+                        f"{throughput:7.0f} req/s, {threads:4} threads, "
+                        f"status {sorted(statuses)}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
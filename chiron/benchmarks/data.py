@@ -0,0 +1,104 @@
+"""
+Synthetic patients, doctors and appointments in bulk, for benchmarks.
+
+Every generated user has the password `PASSWORD`. Doctors see patients on
+consecutive working-hour slots from `START` on, so no two of a doctor's
+appointments overlap, and patients are drawn at random.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+PASSWORD = "bench-password"
+START = datetime(2030, 1, 6, tzinfo=timezone.utc)
+
+FIRST_NAMES = "John Jane Ahmed Maria Wei Olga Pedro Aisha Sara Reza Yuki Lena".split()
+LAST_NAMES = (
+    "Smith Garcia Chen Müller Kowalski Okafor Rossi Tehrani Novak Silva".split()
+)
+STREETS = ["Baker Street", "Elm Road", "Main Avenue", "Harbour Lane", "Hill Close"]
+DESCRIPTIONS = ["", "check-up", "follow-up visit", "prescription renewal", "pain"]
+
+
+def batches(objects, size):
+    objects = iter(objects)
+    while batch := list(islice(objects, size)):
+        yield batch
+
+
+def users(prefix, count, password, doctors=False):
+    from chiron.apps.users.models import User
+
+    role = "dr" if doctors else "patient"
+    for i in range(count):
+        yield User(
+            username=f"{prefix}_{role}{i}",
+            password=password,
+            first_name=random.choice(FIRST_NAMES),
+            last_name=random.choice(LAST_NAMES),
+            email=f"{prefix}_{role}{i}@example.com",
+            # doctors share their phone number with approved patients
+            phone=f"+4420{i:08d}" if doctors else None,
+            address=f"{random.randrange(1, 300)} {random.choice(STREETS)}",
+            is_doctor=doctors,
+            is_patient=not doctors,
+        )
+
+
+def appointments(patients, doctors, count):
+    from django.conf import settings
+    from chiron.apps.visits.models import Appointment
+
+    config = settings.AVAILABILITY
+    opening = timedelta(hours=config["OPENING_HOUR"])
+    hours = config["CLOSING_HOUR"] - config["OPENING_HOUR"]
+    slots = timedelta(hours=hours) // config["SLOT"]
+    for i in range(count):
+        slot = i // len(doctors)
+        day, slot = divmod(slot, slots)
+        yield Appointment(
+            patient_id=random.choice(patients),
+            doctor_id=doctors[i % len(doctors)],
+            date=START + timedelta(days=day) + opening + slot * config["SLOT"],
+            duration=config["SLOT"],
+            description=random.choice(DESCRIPTIONS),
+            approved=random.random() < 0.6,
+        )
+
+
+def generate(
+    patients, doctors, count, prefix="gen", batch_size=10000, seed=0, log=None
+):
+    """
+    Create `patients` patients, `doctors` doctors and `count` appointments between
+    them with `bulk_create`, `batch_size` rows per query.
+    """
+    from django.contrib.auth.hashers import make_password
+    from chiron.apps.users.models import User
+    from chiron.apps.visits.models import Appointment
+
+    random.seed(seed)
+    # hashing is deliberately slow, every user gets the same hash
+    password = make_password(PASSWORD)
+    for is_doctor, total in [(False, patients), (True, doctors)]:
+        for batch in batches(users(prefix, total, password, is_doctor), batch_size):
+            User.objects.bulk_create(batch)
+        if log:
+            log(f"created {total} {'doctors' if is_doctor else 'patients'}")
+
+    generated = User.objects.filter(username__startswith=f"{prefix}_")
+    patient_ids = list(
+        generated.filter(is_doctor=False).order_by("pk").values_list("pk", flat=True)
+    )
+    doctor_ids = list(
+        generated.filter(is_doctor=True).order_by("pk").values_list("pk", flat=True)
+    )
+    if count and patient_ids and doctor_ids:
+        for done, batch in enumerate(
+            batches(appointments(patient_ids, doctor_ids, count), batch_size), 1
+        ):
+            Appointment.objects.bulk_create(batch)
+            if log:
+                log(f"created {min(done * batch_size, count)} appointments")
+    return patient_ids, doctor_ids
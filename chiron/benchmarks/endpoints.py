@@ -0,0 +1,306 @@
+"""
+Latency, throughput and SQL queries of every API route over generated data.
+
+    python -m chiron.benchmarks.endpoints --patients 10000 --doctors 500 \
+        --appointments 100000 --requests 200 --output results.json
+
+Requests go through the test client one at a time, against a throwaway database
+filled by `chiron.benchmarks.data`. The report is JSON, to compare runs over time.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from . import test_database, percentile
+
+ROUTES = {}
+
+
+def route(name, expected):
+    """
+    Register a route: `prepare(env, i)` sets up the `i`-th request out of the
+    measurement and returns its `(client, method, path, data)`.
+    """
+
+    def register(prepare):
+        ROUTES[name] = (prepare, expected)
+        return prepare
+
+    return register
+
+
+class Environment:
+    """
+    The users and clients requests are sent with, and the appointments they create.
+    """
+
+    def __init__(self, patients, doctors):
+        from rest_framework.authtoken.models import Token
+        from rest_framework.test import APIClient
+        from chiron.apps.users.models import User
+
+        self.patient = User.objects.get(pk=patients[0])
+        self.doctor = User.objects.get(pk=doctors[0])
+        self.leaving = User.objects.get(pk=patients[-1])
+        self.doctors = len(doctors)
+        self.anonymous = APIClient()
+        self.patient_client = self.client(Token.objects.create(user=self.patient))
+        self.doctor_client = self.client(Token.objects.create(user=self.doctor))
+        self.created = []
+        # the generated appointments start later, see data.START
+        self.start = datetime(2029, 1, 1, tzinfo=timezone.utc)
+
+    def client(self, token):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
+
+    def date(self, i):
+        return (self.start + timedelta(hours=i)).isoformat()
+
+    def appointment(self, i):
+        from chiron.apps.visits.models import Appointment
+
+        if not self.created:
+            # measured without "appointment create" first
+            appointment = Appointment.objects.create(
+                patient=self.patient,
+                doctor=self.doctor,
+                date=self.start - timedelta(hours=1 + i),
+                approved=True,
+            )
+            self.created.append(appointment.pk)
+        return self.created[i % len(self.created)]
+
+
+@route("login", 200)
+def login(env, i):
+    from .data import PASSWORD
+
+    credentials = dict(username=env.patient.username, password=PASSWORD)
+    return env.anonymous, "post", "/user/login/", credentials
+
+
+@route("me", 200)
+def me(env, i):
+    return env.patient_client, "get", "/user/me/", None
+
+
+@route("user", 200)
+def user(env, i):
+    return env.patient_client, "get", f"/user/{env.doctor.username}/", None
+
+
+@route("drs", 200)
+def drs(env, i):
+    from django.conf import settings
+
+    pages = -(-env.doctors // settings.DOCTOR_DIRECTORY["PAGE_SIZE"])
+    return env.patient_client, "get", f"/user/drs/?page={i % pages + 1}", None
+
+
+@route("search", 200)
+def search(env, i):
+    from .data import LAST_NAMES
+
+    query = LAST_NAMES[i % len(LAST_NAMES)][: i % 4 + 2]
+    return env.patient_client, "get", f"/user/search/?q={query}", None
+
+
+@route("appointment list", 200)
+def appointment_list(env, i):
+    return env.patient_client, "get", "/appointment/", None
+
+
+@route("appointment create", 201)
+def appointment_create(env, i):
+    data = dict(doctor=env.doctor.username, date=env.date(i), description="bench")
+    return env.patient_client, "post", "/appointment/", data
+
+
+@route("appointment retrieve", 200)
+def appointment_retrieve(env, i):
+    return env.patient_client, "get", f"/appointment/{env.appointment(i)}/", None
+
+
+@route("appointment update", 200)
+def appointment_update(env, i):
+    data = dict(doctor=env.doctor.username, date=env.date(i), description=f"#{i}")
+    path = f"/appointment/{env.appointment(i)}/"
+    return env.patient_client, "put", path, data
+
+
+@route("approve", 202)
+def approve(env, i):
+    path = f"/appointment/{env.appointment(i)}/approve/"
+    return env.doctor_client, "post", path, None
+
+
+@route("approve many", 202)
+def approve_many(env, i):
+    data = dict(ids=env.created[:50])
+    return env.doctor_client, "post", "/appointment/approve/", data
+
+
+@route("visit", 202)
+def visit(env, i):
+    path = f"/appointment/{env.appointment(i)}/visit/"
+    return env.patient_client, "get", path, None
+
+
+@route("bulk create", 201)
+def bulk_create(env, i):
+    data = [
+        dict(doctor=env.doctor.username, date=env.date(10000 + 10 * i + j))
+        for j in range(10)
+    ]
+    return env.patient_client, "post", "/appointment/bulk/", data
+
+
+@route("changes", 200)
+def changes(env, i):
+    return env.patient_client, "get", "/appointment/changes/", None
+
+
+@route("slots", 200)
+def slots(env, i):
+    return env.patient_client, "get", "/appointment/slots/", None
+
+
+@route("export", 200)
+def export(env, i):
+    return env.patient_client, "get", "/appointment/export/", None
+
+
+@route("appointment delete", 204)
+def appointment_delete(env, i):
+    appointment = env.appointment(i)
+    env.created.remove(appointment)
+    return env.patient_client, "delete", f"/appointment/{appointment}/", None
+
+
+@route("logout", 202)
+def logout(env, i):
+    from rest_framework.authtoken.models import Token
+
+    token, _ = Token.objects.get_or_create(user=env.leaving)
+    return env.client(token), "post", "/user/logout/", None
+
+
+def send(client, method, path, data):
+    response = getattr(client, method)(path, data, format="json")
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def measure(env, name, requests):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    prepare, expected = ROUTES[name]
+    timings, queries, statuses = [], [], {}
+    for i in range(requests):
+        request = prepare(env, i)
+        with CaptureQueriesContext(connection) as captured:
+            began = time.perf_counter()
+            response = send(*request)
+            timings.append((time.perf_counter() - began) * 1000)
+        queries.append(len(captured))
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if name == "appointment create" and response.status_code == 201:
+            env.created.append(response.json()["id"])
+    return {
+        "requests": requests,
+        "p50_ms": round(percentile(timings, 0.5), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+        "p99_ms": round(percentile(timings, 0.99), 3),
+        "throughput_rps": round(requests / (sum(timings) / 1000), 1),
+        "queries_mean": round(sum(queries) / requests, 2),
+        "queries_max": max(queries),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "unexpected": requests - statuses.get(expected, 0),
+    }
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(patients, doctors, appointments, requests, routes=None):
+    """
+    The report of `requests` requests to each of `routes` (default: all of them),
+    over a fresh database of generated data.
+    """
+    with test_database():
+        import django
+        from . import data
+
+        began = time.perf_counter()
+        patient_ids, doctor_ids = data.generate(
+            patients, doctors, appointments, prefix="bench"
+        )
+        generated = time.perf_counter() - began
+        env = Environment(patient_ids, doctor_ids)
+        results = {
+            name: measure(env, name, requests)
+            for name in ROUTES
+            if not routes or name in routes
+        }
+    return {
+        "date": datetime.now(timezone.utc).isoformat(),
+        "revision": revision(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "data": {
+            "patients": patients,
+            "doctors": doctors,
+            "appointments": appointments,
+            "seconds": round(generated, 1),
+        },
+        "routes": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--doctors", type=int, default=500)
+    parser.add_argument("--appointments", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--route", action="append", choices=list(ROUTES))
+    parser.add_argument("--output", help="File to write the report to, not stdout.")
+    args = parser.parse_args()
+
+    report = run(
+        args.patients, args.doctors, args.appointments, args.requests, args.route
+    )
+    for name, result in report["routes"].items():
+        print(
+            f"{name:>20}: p50 {result['p50_ms']:8.2f} ms, "
+            f"p99 {result['p99_ms']:8.2f} ms, {result['throughput_rps']:7.0f} req/s, "
+            f"{result['queries_mean']:5.1f} queries, {result['unexpected']} unexpected",
+            file=sys.stderr,
+        )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Peak memory of the streaming appointment export for growing row counts.
+
+    python -m chiron.benchmarks.export --rows 10000 100000 1000000
+
+Python's allocations (tracemalloc) leave out SQLite's, sorts included: its peak
+above what it used before the export is reported as well, and the growth of the
+resident set of the process (Linux only) while the export streams.
+"""
+
+import _sqlite3
+import argparse
+import ctypes
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from . import test_database
+
+
+def fill(doctor, patient, total, batch=20000):
+    from chiron.apps.visits.models import Appointment
+
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    existing = Appointment.objects.count()
+    for offset in range(existing, total, batch):
+        Appointment.objects.bulk_create(
+            Appointment(
+                patient=patient,
+                doctor=doctor,
+                date=start + timedelta(minutes=30 * i),
+                description="follow-up visit",
+            )
+            for i in range(offset, min(offset + batch, total))
+        )
+
+
+def sqlite_memory():
+    """
+    SQLite's memory in use and its high-water mark since the previous call (which
+    resets it), in bytes.
+    """
+    library = ctypes.CDLL(_sqlite3.__file__)
+    used, highwater = library.sqlite3_memory_used, library.sqlite3_memory_highwater
+    used.restype = highwater.restype = ctypes.c_int64
+    highwater.argtypes = [ctypes.c_int]
+    return used(), highwater(1)
+
+
+def rss():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def measure(client, output):
+    # the throwaway database is in memory, and SQLite's baseline with it
+    sqlite_baseline, _ = sqlite_memory()
+    baseline = peak_rss = rss()
+    tracemalloc.start()
+    began = time.perf_counter()
+    response = client.get("/appointment/export/", {"output": output})
+    size = 0
+    for chunk in response.streaming_content:
+        size += len(chunk)
+        peak_rss = max(peak_rss, rss())
+    elapsed = time.perf_counter() - began
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    sqlite = sqlite_memory()[1] - sqlite_baseline
+    return size, elapsed, peak, sqlite, peak_rss - baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    with test_database():
+        from rest_framework.test import APIClient
+        from chiron.apps.users.models import User
+
+        doctor = User.objects.create_user(username="bench_doctor", is_doctor=True)
+        patient = User.objects.create_user(username="bench_patient")
+        client = APIClient()
+        client.force_authenticate(patient)
+        for rows in sorted(args.rows):
+            fill(doctor, patient, rows)
+            for output in ["ndjson", "csv"]:
+                size, elapsed, peak, sqlite, growth = measure(client, output)
+                print(
+                    f"{rows:>9} rows {output:>6}: {size / 2**20:8.1f} MiB streamed "
+                    f"in {elapsed:6.1f}s, peak Python {peak / 2**20:6.2f} MiB, "
+                    f"SQLite +{sqlite / 2**20:6.2f} MiB, RSS +{growth / 2**20:6.2f} MiB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Serialization of appointment lists with flattened doctor names, planned against per-row.
+
+    python -m chiron.benchmarks.flatten --rows 20 100 1000 --repeat 50
+
+Appointments are built in memory, no database is involved.
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+from . import percentile, setup
+
+
+def legacy(serializer_class):
+    """
+    `serializer_class` flattening the way `FlattenMixin` did before it was planned:
+    a nested serializer per row and per flattened field.
+    """
+    from rest_framework.serializers import Serializer
+
+    class Legacy(serializer_class):
+        def to_representation(self, obj):
+            composite_names = getattr(self.Meta, "composite_names", True)
+            rep = Serializer.to_representation(self, obj)
+            for field, nested_class in self.Meta.flatten:
+                serializer = nested_class(context=self.context)
+                objrep = serializer.to_representation(getattr(obj, field))
+                for key in objrep:
+                    rep[(field + "__" + key) if composite_names else key] = objrep[key]
+            return rep
+
+    return Legacy
+
+
+def appointments(count):
+    from chiron.apps.users.models import User
+    from chiron.apps.visits.models import Appointment
+
+    doctor = User(pk=1, username="dr", first_name="Ada", last_name="Lovelace")
+    patient = User(pk=2, username="patient", first_name="Alan", last_name="Turing")
+    start = datetime(2030, 1, 7, 9, tzinfo=timezone.utc)
+    return [
+        Appointment(
+            pk=i,
+            patient=patient,
+            doctor=doctor,
+            date=start + timedelta(minutes=30 * i),
+            end=start + timedelta(minutes=30 * i + 30),
+            duration=timedelta(minutes=30),
+            date_created=start,
+            updated_at=start,
+            change_seq=i,
+        )
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[20, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    from chiron.apps.visits.serializers import AppointmentSerializer
+
+    serializers = [
+        ("planned", AppointmentSerializer),
+        ("per-row", legacy(AppointmentSerializer)),
+    ]
+    for rows in args.rows:
+        objects = appointments(rows)
+        outputs = {}
+        for label, serializer_class in serializers:
+            timings = []
+            for _ in range(args.repeat):
+                began = time.perf_counter()
+                outputs[label] = serializer_class(objects, many=True).data
+                timings.append((time.perf_counter() - began) * 1000)
+            print(
+                f"{rows:>6} rows {label:>8}: p50 {percentile(timings, 0.5):8.2f} ms, "
+                f"p95 {percentile(timings, 0.95):8.2f} ms"
+            )
+        assert outputs["planned"] == outputs["per-row"]
+
+
+if __name__ == "__main__":
+    main()
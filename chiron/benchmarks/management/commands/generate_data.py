@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from chiron.benchmarks import data
+
+
+class Command(BaseCommand):
+    help = "Bulk-create synthetic patients, doctors and appointments for benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, default=10000)
+        parser.add_argument("--doctors", type=int, default=500)
+        parser.add_argument("--appointments", type=int, default=100000)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--prefix",
+            default="gen",
+            help="Start of the generated usernames, to be changed for every run "
+            "against the same database.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        data.generate(
+            options["patients"],
+            options["doctors"],
+            options["appointments"],
+            prefix=options["prefix"],
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+            log=self.stdout.write,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "generated {patients} patients, {doctors} doctors and "
+                "{appointments} appointments, password {password!r}".format(
+                    password=data.PASSWORD, **options
+                )
+            )
+        )
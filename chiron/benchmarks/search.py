@@ -0,0 +1,59 @@
+"""
+Latency of the doctor search through the FTS5 index against `icontains` scans.
+
+    python -m chiron.benchmarks.search --doctors 100000 --queries 200
+"""
+
+import argparse
+import random
+import time
+from . import data, test_database, percentile
+
+
+def queries(count):
+    for _ in range(count):
+        first, last = random.choice(data.FIRST_NAMES), random.choice(data.LAST_NAMES)
+        yield random.choice(
+            [
+                last,
+                f"{first[:2]} {last[:3]}",
+                f"{first} {last}",
+                f"{random.randrange(1, 300)} {random.choice(data.STREETS).split()[0]}",
+            ]
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--doctors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    with test_database():
+        from chiron.apps.users import search
+
+        began = time.perf_counter()
+        data.generate(0, args.doctors, 0)
+        print(f"indexed {args.doctors} doctors in {time.perf_counter() - began:.1f}s")
+
+        def scan(text, offset, limit):
+            doctors = search.scan(text)
+            return doctors.count(), list(doctors[offset : offset + limit])
+
+        texts = list(queries(args.queries))
+        for label, find in [("fts5", search.search), ("icontains", scan)]:
+            timings = []
+            for text in texts:
+                began = time.perf_counter()
+                find(text, 0, args.page_size)
+                timings.append((time.perf_counter() - began) * 1000)
+            print(
+                f"{label:>9}: p50 {percentile(timings, 0.5):7.2f} ms, "
+                f"p95 {percentile(timings, 0.95):7.2f} ms, "
+                f"max {max(timings):7.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
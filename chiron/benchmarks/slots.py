@@ -0,0 +1,60 @@
+"""
+Latency of the earliest free slot search over a synthetic busy index.
+
+    python -m chiron.benchmarks.slots --doctors 5000 --appointments 2000000
+"""
+
+import argparse
+import random
+import time
+from . import setup, percentile
+
+DAY = 24 * 60 * 60
+
+
+def build(index, doctors, appointments, days, start):
+    slots = (index.closing - index.opening) // index.slot
+    per_doctor = min(appointments // doctors, days * slots)
+    for doctor in range(doctors):
+        for taken in random.sample(range(days * slots), per_doctor):
+            day, slot = divmod(taken, slots)
+            begin = start + day * DAY + index.opening + slot * index.slot
+            index.add(doctor, begin, begin + index.slot)
+    return doctors * per_doctor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--doctors", type=int, default=5000)
+    parser.add_argument("--appointments", type=int, default=2000000)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--count", type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    from chiron.apps.visits.availability import availability
+
+    index = availability.new_index()
+    start = int(time.time()) // DAY * DAY + DAY
+    began = time.perf_counter()
+    booked = build(index, args.doctors, args.appointments, args.days, start)
+    print(f"indexed {booked} appointments of {args.doctors} doctors", end=" ")
+    print(f"in {time.perf_counter() - began:.1f}s")
+
+    doctors = range(args.doctors)
+    for label, subset in [("all doctors", doctors), ("50 doctors", doctors[:50])]:
+        timings = []
+        for _ in range(args.queries):
+            after = start + random.randrange(args.days - 7) * DAY
+            began = time.perf_counter()
+            index.earliest(subset, after, after + 7 * DAY, args.count)
+            timings.append((time.perf_counter() - began) * 1000)
+        print(
+            f"{label}: p50 {percentile(timings, 0.5):.2f} ms, "
+            f"p95 {percentile(timings, 0.95):.2f} ms, max {max(timings):.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Concurrent reads and writes on SQLite, Django's defaults against the tuned settings.
+
+    python -m chiron.benchmarks.sqlite --readers 8 --writers 2 --seconds 10
+
+Each configuration runs in its own process, settings being read once, against a
+fresh database file: `--readers` threads list a patient's appointments while
+`--writers` threads approve and reject them, each operation a request of its
+own, closing its connection afterwards unless `CONN_MAX_AGE` keeps it.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from . import percentile, setup
+
+CONFIGURATIONS = {
+    # rollback journal, full syncs, a connection per request
+    "default": dict(
+        SQLITE_JOURNAL_MODE="DELETE",
+        SQLITE_SYNCHRONOUS="FULL",
+        SQLITE_MMAP_SIZE="0",
+        SQLITE_CACHE_KIB="2000",
+        SQLITE_TRANSACTION_MODE="DEFERRED",
+        DATABASE_CONN_MAX_AGE="0",
+    ),
+    # settings.DATABASES as shipped
+    "tuned": dict(),
+}
+
+
+def work(kind, ids, seconds, results):
+    from django.db import OperationalError, close_old_connections, transaction
+    from chiron.apps.visits.models import Appointment
+
+    patients, appointments = ids
+    timings, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        try:
+            if kind == "read":
+                list(
+                    Appointment.objects.filter(patient_id=random.choice(patients))
+                    .select_related("doctor")
+                    .order_by("-date")[:20]
+                )
+            else:
+                with transaction.atomic():
+                    appointment = Appointment.objects.get(
+                        pk=random.choice(appointments)
+                    )
+                    appointment.approved = not appointment.approved
+                    appointment.save(update_fields=["approved"])
+            timings.append((time.perf_counter() - began) * 1000)
+        except OperationalError:
+            # "database is locked", once busy_timeout ran out
+            errors += 1
+        finally:
+            # the end of a request, outside of the test client
+            close_old_connections()
+    results.append((kind, timings, errors))
+
+
+def run(args):
+    setup()
+    from django.core.management import call_command
+    from django.db import connection, connections
+    from . import data
+
+    call_command("migrate", verbosity=0)
+    patients, _ = data.generate(args.patients, args.doctors, args.appointments)
+    from chiron.apps.visits.models import Appointment
+
+    ids = patients, list(Appointment.objects.values_list("pk", flat=True))
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode")
+        journal = cursor.fetchone()[0]
+    connections.close_all()
+
+    results = []
+    threads = [
+        threading.Thread(target=work, args=(kind, ids, args.seconds, results))
+        for kind in ["read"] * args.readers + ["write"] * args.writers
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report = dict(journal_mode=journal)
+    for kind in ["read", "write"]:
+        timings = [t for k, samples, _ in results if k == kind for t in samples]
+        report[kind] = dict(
+            per_second=round(len(timings) / args.seconds, 1),
+            p50_ms=round(percentile(timings, 0.5), 2) if timings else None,
+            p99_ms=round(percentile(timings, 0.99), 2) if timings else None,
+            errors=sum(errors for k, _, errors in results if k == kind),
+        )
+    print(json.dumps(report))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--appointments", type=int, default=20000)
+    parser.add_argument("--configuration", choices=CONFIGURATIONS)
+    args = parser.parse_args()
+
+    if args.configuration:
+        return run(args)
+
+    for name, environment in CONFIGURATIONS.items():
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                DATABASE_ENGINE="chiron.db.sqlite3",
+                DATABASE_NAME=os.path.join(directory, "bench.sqlite3"),
+                **environment,
+            )
+            env.pop("DATABASE_REPLICA_NAME", None)
+            output = subprocess.run(
+                [sys.executable, "-m", __spec__.name, "--configuration", name]
+                + sys.argv[1:],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+        report = json.loads(output.splitlines()[-1])
+        print(f"{name} (journal_mode={report['journal_mode']})")
+        for kind in ["read", "write"]:
+            result = report[kind]
+            print(
+                f"  {kind:>5}: {result['per_second']:8.1f}/s, "
+                f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+                f"{result['errors']} errors"
+            )
+
+
+if __name__ == "__main__":
+    main()
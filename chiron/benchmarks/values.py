@@ -0,0 +1,75 @@
+"""
+Rendering of long appointment and doctor lists, DRF serializers against ValuesPlan.
+
+    python -m chiron.benchmarks.values --rows 10000 --repeat 10
+
+Both paths run the same query and render the same JSON bytes, the time covers the
+query, the representation and the rendering.
+"""
+
+import argparse
+import time
+from . import percentile, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with test_database():
+        from rest_framework.renderers import JSONRenderer
+        from chiron.apps.users.models import User
+        from chiron.apps.users.serializers import UserSerializer
+        from chiron.apps.utils import values_plan
+        from chiron.apps.visits.models import Appointment
+        from chiron.apps.visits.serializers import AppointmentSerializer
+        from . import data
+
+        data.generate(args.rows // 10, args.rows, args.rows)
+        lists = [
+            (
+                "appointments",
+                AppointmentSerializer,
+                AppointmentSerializer.plan_queryset(
+                    Appointment.objects.order_by("date", "id")
+                ),
+            ),
+            (
+                "doctors",
+                UserSerializer,
+                User.objects.filter(is_doctor=True).order_by("username"),
+            ),
+        ]
+        renderer = JSONRenderer()
+        for name, serializer_class, queryset in lists:
+            plan = values_plan(serializer_class)
+            paths = [
+                (
+                    "serializer",
+                    lambda: renderer.render(
+                        serializer_class(queryset.all(), many=True).data
+                    ),
+                ),
+                (
+                    "values",
+                    lambda: renderer.render(plan.represent(plan.values(queryset))),
+                ),
+            ]
+            outputs = {}
+            for label, render in paths:
+                timings = []
+                for _ in range(args.repeat):
+                    began = time.perf_counter()
+                    outputs[label] = render()
+                    timings.append((time.perf_counter() - began) * 1000)
+                print(
+                    f"{name:>12} {label:>10}: p50 {percentile(timings, 0.5):8.1f} ms, "
+                    f"p95 {percentile(timings, 0.95):8.1f} ms"
+                )
+            assert outputs["serializer"] == outputs["values"]
+
+
+if __name__ == "__main__":
+    main()
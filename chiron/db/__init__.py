@@ -0,0 +1,4 @@
+"""
+Database configuration of the Chiron back-end: the SQLite backend with tuned
+pragmas (`chiron.db.sqlite3`) and read/write routing (`chiron.db.routers`).
+"""
@@ -0,0 +1,59 @@
+"""
+Routing of reads to the `replica` database, when there is one.
+
+Reads go to the replica only inside `replica_reads()`, which the read-only actions
+of the API views enter (see `ReplicaReadsMixin`); everything else, writes first,
+goes to `default`. The replica may lag behind: requests reading their own writes
+stay out of `replica_reads()`.
+"""
+
+import contextlib
+from contextvars import ContextVar
+from django.db import connections
+
+REPLICA = "replica"
+
+reading = ContextVar("replica_reads", default=False)
+
+
+@contextlib.contextmanager
+def replica_reads(enabled=True):
+    token = reading.set(enabled)
+    try:
+        yield
+    finally:
+        reading.reset(token)
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reading.get() and REPLICA in connections.databases:
+            return REPLICA
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both databases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class ReplicaReadsMixin:
+    """
+    Serve the `replica_actions` of a viewset from the replica.
+
+    Actions answering conditional requests don't belong there: their `ETag`s come
+    from version stamps of the primary's changes, which a lagging replica may not
+    have yet, and clients would keep its stale data under the new `ETag`.
+    """
+
+    replica_actions = ["list", "retrieve"]
+
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get(request.method.lower())
+        with replica_reads(action in self.replica_actions):
+            return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,30 @@
+"""
+Django's SQLite backend, applying the `pragmas` of the database's `OPTIONS` to every
+new connection, e.g. `{"journal_mode": "WAL", "synchronous": "NORMAL"}`, and
+starting transactions with `BEGIN <transaction_mode>` (`DEFERRED` by default).
+
+`IMMEDIATE` takes the write lock at `BEGIN`, waiting up to `busy_timeout` for it:
+a deferred transaction reading before it writes fails with "database is locked"
+right away when another one wrote in between, the busy timeout doesn't apply.
+"""
+
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # not arguments of sqlite3.connect()
+        params.pop("pragmas", None)
+        params.pop("transaction_mode", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict["OPTIONS"].get("pragmas", {}).items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict["OPTIONS"].get("transaction_mode", "DEFERRED")
+        self.cursor().execute(f"BEGIN {mode}")
@@ -5,6 +5,7 @@ Django settings for chiron project.
 from pathlib import Path
 import os
 import sys
+from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,9 +44,16 @@ INSTALLED_APPS = [
     # developed apps
     "chiron.apps.users",
     "chiron.apps.visits",
+    "chiron.apps.outbox",
+    "chiron.apps.observability",
 ]
+# the generate_data command, for benchmark and development databases only
+if os.environ.get("CHIRON_BENCHMARKS"):
+    INSTALLED_APPS.append("chiron.benchmarks")
 
 MIDDLEWARE = [
+    "chiron.apps.observability.middleware.request_metrics",
+    "chiron.apps.observability.profiling.request_profiling",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -83,10 +91,45 @@ WSGI_APPLICATION = "chiron.wsgi.application"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "ENGINE": os.environ.get("DATABASE_ENGINE", "chiron.db.sqlite3"),
+        "NAME": os.environ.get("DATABASE_NAME", BASE_DIR / "db.sqlite3"),
+        "USER": os.environ.get("DATABASE_USER", ""),
+        "PASSWORD": os.environ.get("DATABASE_PASSWORD", ""),
+        "HOST": os.environ.get("DATABASE_HOST", ""),
+        "PORT": os.environ.get("DATABASE_PORT", ""),
+        # seconds connections are reused for, 0 closes them after every request
+        "CONN_MAX_AGE": int(os.environ.get("DATABASE_CONN_MAX_AGE", 60)),
     }
 }
+if DATABASES["default"]["ENGINE"] == "chiron.db.sqlite3":
+    # WAL lets readers run alongside the writer, NORMAL only syncs at checkpoints
+    DATABASES["default"]["OPTIONS"] = {
+        "pragmas": {
+            "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+            "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+            "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+            "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 2**20)),
+            # negative sizes are in KiB
+            "cache_size": -int(os.environ.get("SQLITE_CACHE_KIB", 64 * 1024)),
+            "temp_store": "MEMORY",
+        },
+        # take the write lock up front, waiting for it rather than failing
+        "transaction_mode": os.environ.get("SQLITE_TRANSACTION_MODE", "IMMEDIATE"),
+    }
+
+# Read-only copy of the database serving the reads of read-only endpoints, for
+# SQLite the same file (or a replica of it) opened with writes refused
+if os.environ.get("DATABASE_REPLICA_NAME"):
+    DATABASES["replica"] = dict(
+        DATABASES["default"],
+        NAME=os.environ["DATABASE_REPLICA_NAME"],
+        HOST=os.environ.get("DATABASE_REPLICA_HOST", DATABASES["default"]["HOST"]),
+        TEST={"MIRROR": "default"},
+    )
+    if "OPTIONS" in DATABASES["default"]:
+        pragmas = dict(DATABASES["default"]["OPTIONS"]["pragmas"], query_only="ON")
+        DATABASES["replica"]["OPTIONS"] = {"pragmas": pragmas}
+DATABASE_ROUTERS = ["chiron.db.routers.ReadReplicaRouter"]
 
 
 # Password validation
@@ -141,6 +184,141 @@ AUTH_USER_MODEL = "users.User"
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
+        "chiron.apps.users.authentication.CachedTokenAuthentication",
+    ),
+    # requests per user, see chiron.apps.users.throttling
+    "DEFAULT_THROTTLE_RATES": {
+        "invite": os.environ.get("INVITE_RATE", "20/day"),
+    },
+    # DRF's, timed for the serialize metric
+    "DEFAULT_RENDERER_CLASSES": (
+        "chiron.apps.observability.renderers.JSONRenderer",
+        "chiron.apps.observability.renderers.BrowsableAPIRenderer",
+    ),
+}
+APPOINTMENT_PAGE_SIZE = int(os.environ.get("APPOINTMENT_PAGE_SIZE", 50))
+
+# Shared by every worker, version stamps, cached directory pages and the free slot index
+# of other workers aren't invalidated otherwise, e.g. CACHE_BACKEND=
+# django.core.cache.backends.redis.RedisCache and CACHE_LOCATION=redis://host:6379
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    }
+}
+# Processes serving requests (gunicorn's WEB_CONCURRENCY), more than one refuses to
+# start with a process-local cache
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+# Resolved authentication tokens, "local" keeps them in-process (a single worker only),
+# "django" uses CACHE_ALIAS
+TOKEN_CACHE = {
+    "BACKEND": os.environ.get(
+        "TOKEN_CACHE_BACKEND", "local" if WORKERS == 1 else "django"
     ),
+    "CACHE_ALIAS": os.environ.get("TOKEN_CACHE_ALIAS", "default"),
+    "MAX_ENTRIES": int(os.environ.get("TOKEN_CACHE_MAX_ENTRIES", 10000)),
+    "TIMEOUT": int(os.environ.get("TOKEN_CACHE_TIMEOUT", 300)),
+}
+
+# Cached /user/drs/ pages
+DOCTOR_DIRECTORY = {
+    "PAGE_SIZE": int(os.environ.get("DOCTOR_DIRECTORY_PAGE_SIZE", 50)),
+    "MAX_PAGE_SIZE": 500,
+    "TIMEOUT": int(os.environ.get("DOCTOR_DIRECTORY_TIMEOUT", 24 * 60 * 60)),
+}
+
+# Free slot search, opening hours are in UTC
+AVAILABILITY = {
+    "OPENING_HOUR": int(os.environ.get("OPENING_HOUR", 9)),
+    "CLOSING_HOUR": int(os.environ.get("CLOSING_HOUR", 17)),
+    "SLOT": timedelta(minutes=int(os.environ.get("SLOT_MINUTES", 30))),
+    "MAX_WINDOW": timedelta(days=31),
+    "MAX_RESULTS": 100,
+}
+
+# Outgoing email, queued in the outbox and delivered by `manage.py send_outbox`
+EMAIL_BACKEND = os.environ.get(
+    "EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend"
+)
+EMAIL_HOST = os.environ.get("EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.environ.get("EMAIL_PORT", 25))
+EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = bool(int(os.environ.get("EMAIL_USE_TLS", 0)))
+DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "chiron@localhost")
+OUTBOX = {
+    "BATCH_SIZE": int(os.environ.get("OUTBOX_BATCH_SIZE", 100)),
+    "LEASE": timedelta(minutes=int(os.environ.get("OUTBOX_LEASE_MINUTES", 5))),
+    "MAX_ATTEMPTS": int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 8)),
+    "RETRY_DELAY": timedelta(seconds=int(os.environ.get("OUTBOX_RETRY_SECONDS", 60))),
+    "MAX_RETRY_DELAY": timedelta(hours=6),
+    "POLL_INTERVAL": float(os.environ.get("OUTBOX_POLL_SECONDS", 5)),
+}
+
+# Server-sent appointment events at /appointment/events/ (ASGI only)
+EVENTS = {
+    "BROKER": os.environ.get("EVENTS_BROKER", "chiron.apps.pubsub.LocalBroker"),
+    "BUFFER": int(os.environ.get("EVENTS_BUFFER", 16)),
+    "HEARTBEAT": float(os.environ.get("EVENTS_HEARTBEAT_SECONDS", 15)),
+    "RETRY": 3000,  # milliseconds before browsers reconnect
+    "BATCH": 100,  # changes per event
+}
+
+# Request timing of a SAMPLE_RATE fraction of requests, see /metrics/ and SERVER_TIMING
+OBSERVABILITY = {
+    "SAMPLE_RATE": float(os.environ.get("METRICS_SAMPLE_RATE", 1.0)),
+    "SERVER_TIMING": bool(int(os.environ.get("SERVER_TIMING", 0))),
+    # bearer token scrapers of /metrics/ need, or else they have to connect from
+    # METRICS_IPS without going through a proxy
+    "METRICS_TOKEN": os.environ.get("METRICS_TOKEN", ""),
+    "METRICS_IPS": os.environ.get("METRICS_IPS", "127.0.0.1 ::1").split(),
+    # histogram buckets, in seconds and in queries
+    "BUCKETS": [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    "QUERY_BUCKETS": [1, 2, 5, 10, 20, 50, 100],
+}
+
+# Queries slower than THRESHOLD seconds, logged with their plan to a rotating FILE
+SLOW_QUERIES = {
+    "THRESHOLD": float(os.environ.get("SLOW_QUERY_MS", 100)) / 1000,
+    "FILE": os.environ.get("SLOW_QUERY_LOG", BASE_DIR / "slow_queries.log"),
+    "MAX_BYTES": 10 * 2**20,
+    "BACKUP_COUNT": 5,
+    "MAX_FINGERPRINTS": 1000,  # counted at a time, the least recently seen go first
+}
+
+# cProfile of requests: signed with `manage.py profile_header` or sampled and slow
+PROFILING = {
+    "SAMPLE_RATE": float(os.environ.get("PROFILE_SAMPLE_RATE", 0)),
+    "THRESHOLD": float(os.environ.get("PROFILE_THRESHOLD_MS", 500)) / 1000,
+    "HEADER": "X-Profile",
+    "MAX_AGE": 60 * 60,  # seconds a signed header stays valid
+    "DIRECTORY": os.environ.get("PROFILE_DIR", BASE_DIR / "profiles"),
+    "MAX_PROFILES": int(os.environ.get("PROFILE_MAX_COUNT", 100)),
+}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"timestamped": {"format": "%(asctime)s %(message)s"}},
+    "handlers": {
+        "slow_queries": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": SLOW_QUERIES["FILE"],
+            "maxBytes": SLOW_QUERIES["MAX_BYTES"],
+            "backupCount": SLOW_QUERIES["BACKUP_COUNT"],
+            "delay": True,
+            "formatter": "timestamped",
+        },
+    },
+    "loggers": {
+        "chiron.slow_queries": {
+            "handlers": ["slow_queries"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+    },
 }
@@ -1,5 +1,54 @@
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import pstats
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from urllib.parse import urlencode
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection, connections, router
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.test import TransactionTestCase, modify_settings, override_settings
 from rest_framework.test import APITestCase
+from chiron.apps import pubsub, versions
+from chiron.apps.admin import ApproximateCountPaginator
+from chiron.apps.utils import values_plan
+from chiron.apps.observability import metrics, profiling, slowlog
+from chiron.apps.observability.models import Profile
+from chiron.apps.observability.metrics import Histogram
+from chiron.apps.outbox import delivery
+from chiron.apps.outbox.models import Email
+from chiron.apps.users import authentication, directory, search
+from chiron.apps.users.authentication import token_cache
+from chiron.apps.users.models import User
+from chiron.apps.users.throttling import InviteRateThrottle
+from chiron.apps.users.serializers import (
+    EgoUserSerializer,
+    NameSerializer,
+    UserSerializer,
+)
+from chiron.apps.visits import events, models, scheduling
+from chiron.benchmarks import data, endpoints
+from chiron.db import routers
+from chiron.apps.visits.models import Appointment
+from chiron.apps.visits.serializers import AppointmentSerializer
 
 doctor_data = {
     "email": "",
@@ -176,3 +225,1899 @@ class Tests(APITestCase):
         )
         response = self.client.get("http://chiron.aeonem.xyz/appointment/1/visit/")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AppointmentPaginationTests(APITestCase):
+    def setUp(self):
+        self.doctor = User.objects.create_user(
+            username="test_doctor", password="doc1234", is_doctor=True
+        )
+        self.patient = User.objects.create_user(
+            username="test_patient", password="pat1234"
+        )
+        start = datetime(2021, 2, 15, 9, tzinfo=timezone.utc)
+        # pairs of appointments share a date to exercise the id tie-breaker
+        Appointment.objects.bulk_create(
+            Appointment(
+                patient=self.patient,
+                doctor=self.doctor,
+                date=start + timedelta(hours=i // 2),
+            )
+            for i in range(7)
+        )
+        self.client.force_authenticate(self.patient)
+
+    def test_pages_cover_all_appointments_in_order(self):
+        ids, url = [], "http://chiron.aeonem.xyz/appointment/?page_size=3"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 3)
+            ids += [item["id"] for item in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(ids), 7)
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get("http://chiron.aeonem.xyz/appointment/?page_size=3")
+        second = self.client.get(first.data["next"])
+        back = self.client.get(second.data["previous"])
+        self.assertIsNone(first.data["previous"])
+        self.assertEqual(back.data["results"], first.data["results"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get("http://chiron.aeonem.xyz/appointment/?cursor=xx")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AppointmentQueryPlanTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="test_patient")
+
+    def assertUsesIndexes(self, queryset, *indexes):
+        plan = queryset.explain()
+        for index in indexes:
+            self.assertIn(index, plan)
+        self.assertNotRegex(plan, r"SCAN visits_appointment(?! USING)")
+        return plan
+
+    def test_list_pages_are_index_range_scans(self):
+        self.client.force_authenticate(self.user)
+        position = datetime(2021, 2, 15, 9, tzinfo=timezone.utc).isoformat() + "|7"
+        cursor = base64.b64encode(urlencode({"p": position}).encode()).decode()
+        for path in ["/appointment/", f"/appointment/?cursor={cursor}"]:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("http://chiron.aeonem.xyz" + path)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            plans = []
+            for query in queries:
+                with connection.cursor() as cursor_:
+                    cursor_.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                    plans.append(" ".join(row[-1] for row in cursor_.fetchall()))
+            self.assertEqual(len(plans), 2)
+            for plan, index in zip(
+                plans, ["appointment_doctor_date", "appointment_patient_date"]
+            ):
+                self.assertIn(f"USING INDEX {index} (", plan)
+                self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_involving_uses_role_indexes(self):
+        # membership only, either (role, ...) index covers the primary keys
+        self.assertUsesIndexes(
+            Appointment.objects.involving(self.user),
+            "appointment_doctor_",
+            "appointment_patient_",
+        )
+        for branch, index in zip(
+            Appointment.objects.roles(self.user),
+            ["appointment_doctor_date", "appointment_patient_date"],
+        ):
+            plan = self.assertUsesIndexes(branch.order_by("date", "id")[:51], index)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_changed_since_uses_change_indexes(self):
+        self.assertUsesIndexes(
+            Appointment.objects.changed_since(self.user, 10).order_by("change_seq"),
+            "appointment_doctor_seq (doctor_id=? AND change_seq>?)",
+            "appointment_patient_seq (patient_id=? AND change_seq>?)",
+        )
+
+    def test_pending_requests_use_partial_index(self):
+        self.assertUsesIndexes(
+            Appointment.objects.filter(doctor=self.user, approved=False).order_by(
+                "date"
+            ),
+            "appointment_pending_date",
+        )
+
+
+class AppointmentQueryCountTests(APITestCase):
+    def setUp(self):
+        self.doctor = User.objects.create_user(
+            username="test_doctor",
+            first_name="Ada",
+            last_name="Lovelace",
+            is_doctor=True,
+        )
+        self.patient = User.objects.create_user(username="test_patient")
+        self.client.force_authenticate(self.patient)
+
+    def book(self, count):
+        start = datetime(2021, 2, 15, 9, tzinfo=timezone.utc)
+        Appointment.objects.bulk_create(
+            Appointment(
+                patient=self.patient,
+                doctor=self.doctor,
+                date=start + timedelta(hours=i),
+            )
+            for i in range(count)
+        )
+
+    def test_list_query_count_is_constant(self):
+        # one query per role of the user, see AppointmentQuerySet.roles
+        self.book(1)
+        with self.assertNumQueries(2):
+            response = self.client.get("http://chiron.aeonem.xyz/appointment/")
+        self.assertEqual(len(response.data["results"]), 1)
+        self.book(20)
+        with self.assertNumQueries(2):
+            response = self.client.get("http://chiron.aeonem.xyz/appointment/")
+        self.assertEqual(len(response.data["results"]), 21)
+        self.assertEqual(response.data["results"][0]["doctor"], "test_doctor")
+        self.assertEqual(response.data["results"][0]["patient"], "test_patient")
+        self.assertEqual(response.data["results"][0]["doctor__first_name"], "Ada")
+        self.assertEqual(response.data["results"][0]["doctor__last_name"], "Lovelace")
+
+    def test_flattening_is_planned_once_per_list(self):
+        self.book(5)
+        appointments = AppointmentSerializer.plan_queryset(Appointment.objects.all())
+        built = []
+        original = NameSerializer.__init__
+
+        def init(serializer, *args, **kwargs):
+            built.append(serializer)
+            original(serializer, *args, **kwargs)
+
+        with mock.patch.object(NameSerializer, "__init__", init):
+            data = AppointmentSerializer(appointments, many=True).data
+        self.assertEqual(len(built), 1)
+        self.assertEqual(
+            [(item["doctor__first_name"], item["doctor__last_name"]) for item in data],
+            [("Ada", "Lovelace")] * 5,
+        )
+
+    def test_create_looks_up_doctor_once(self):
+        data = {"doctor": "test_doctor", "date": "2021-02-15\t22:21"}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "http://chiron.aeonem.xyz/appointment/", data, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # one doctor lookup, shared by validation and save
+        lookups = [q for q in queries if q["sql"].startswith('SELECT "users_user"')]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(response.data["doctor"], "test_doctor")
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(
+            username="test_patient", password="pat1234"
+        )
+        response = self.client.post(
+            "http://chiron.aeonem.xyz/user/login/", patient_login, format="json"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + response.json()["token"])
+
+    def get_me(self):
+        return self.client.get("http://chiron.aeonem.xyz/user/me/")
+
+    def test_cached_token_skips_lookup(self):
+        self.assertEqual(self.get_me().status_code, status.HTTP_200_OK)
+        # only the profile itself is fetched once the token is cached
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_me().status_code, status.HTTP_200_OK)
+
+    def test_logout_invalidates_token(self):
+        self.assertEqual(self.get_me().status_code, status.HTTP_200_OK)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("http://chiron.aeonem.xyz/user/logout/")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.get_me().status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_deactivation_invalidates_token(self):
+        self.assertEqual(self.get_me().status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user.save()
+            # still cached until the commit, other requests can only read the old row
+            self.assertEqual(self.get_me().status_code, status.HTTP_200_OK)
+        self.assertTrue(callbacks)
+        self.assertEqual(self.get_me().status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_workers_need_a_shared_token_cache(self):
+        authentication.check_token_cache()
+        with override_settings(WORKERS=2):
+            with self.assertRaises(ImproperlyConfigured):
+                authentication.check_token_cache()
+            shared = authentication.DjangoTokenCache()
+            with mock.patch.object(authentication, "token_cache", shared):
+                authentication.check_token_cache()
+
+    def test_password_change_invalidates_token(self):
+        self.assertEqual(self.get_me().status_code, status.HTTP_200_OK)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "http://chiron.aeonem.xyz/user/cpw/",
+                {
+                    "old_password": "pat1234",
+                    "new_password": "new-pat1234",
+                    "confirm_new_password": "new-pat1234",
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(token_cache.get(Token.objects.get(user=self.user).key))
+
+
+class DoctorDirectoryTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(3):
+            User.objects.create_user(username=f"test_doctor{i}", is_doctor=True)
+        self.client.force_authenticate(User.objects.create_user("test_patient"))
+
+    def get_drs(self, query=""):
+        return self.client.get("http://chiron.aeonem.xyz/user/drs/" + query)
+
+    def usernames(self, response):
+        return [doctor["username"] for doctor in response.json()["results"]]
+
+    def test_pages_are_served_from_cache(self):
+        first = self.get_drs()
+        with self.assertNumQueries(0):
+            second = self.get_drs()
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first.json()["count"], 3)
+
+    def test_paging(self):
+        response = self.get_drs("?page_size=2")
+        self.assertEqual(self.usernames(response), ["test_doctor0", "test_doctor1"])
+        response = self.client.get(response.json()["next"])
+        self.assertEqual(self.usernames(response), ["test_doctor2"])
+        self.assertIsNone(response.json()["next"])
+        self.assertEqual(self.get_drs("?page=3&page_size=2").status_code, 404)
+
+    def test_doctor_changes_invalidate(self):
+        self.get_drs()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username="test_doctor3", is_doctor=True)
+        self.assertIn("test_doctor3", self.usernames(self.get_drs()))
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(username="test_doctor0").delete()
+        self.assertNotIn("test_doctor0", self.usernames(self.get_drs()))
+        doctor = User.objects.get(username="test_doctor1")
+        doctor.is_doctor = False
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.save()
+        self.assertNotIn("test_doctor1", self.usernames(self.get_drs()))
+
+    def test_uncommitted_changes_keep_cache(self):
+        self.get_drs()
+        with self.captureOnCommitCallbacks() as callbacks:
+            User.objects.create_user(username="test_doctor3", is_doctor=True)
+        # the page stays cached until the new doctor is committed
+        with self.assertNumQueries(0):
+            self.get_drs()
+        for callback in callbacks:
+            callback()
+        self.assertIn("test_doctor3", self.usernames(self.get_drs()))
+
+    def test_patient_changes_keep_cache(self):
+        self.get_drs()
+        User.objects.create_user(username="test_patient2")
+        with self.assertNumQueries(0):
+            self.get_drs()
+
+    def test_saves_compare_with_loaded_doctor_status(self):
+        patient = User.objects.get(username="test_patient")
+        # the UPDATE alone, the stored status was loaded along with the user
+        with self.assertNumQueries(1):
+            patient.save()
+        doctor = User.objects.get(username="test_doctor2")
+        doctor.is_doctor = False
+        with self.assertNumQueries(1):
+            doctor.save()
+        self.assertNotIn("test_doctor2", self.usernames(self.get_drs()))
+        # unloaded instances are looked up, when they may have been a doctor
+        unloaded = User(pk=doctor.pk, username="test_doctor2", is_doctor=False)
+        User.objects.filter(pk=doctor.pk).update(is_doctor=True)
+        self.get_drs()
+        unloaded.save()
+        self.assertNotIn("test_doctor2", self.usernames(self.get_drs()))
+
+    def test_concurrent_misses_rebuild_once(self):
+        builds, barrier = [], threading.Barrier(8)
+
+        def build():
+            builds.append(1)
+            time.sleep(0.1)
+            return b"[]"
+
+        def fetch():
+            barrier.wait()
+            results.append(directory.get_or_build("test-stampede", build))
+
+        results = []
+        threads = [threading.Thread(target=fetch) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, [b"[]"] * 8)
+
+
+class DoctorSearchTests(APITestCase):
+    def setUp(self):
+        for username, first, last, address in [
+            ("dr_smith", "John", "Smith", "12 Baker Street"),
+            ("dr_smithers", "Jane", "Smithers", "3 Elm Road"),
+            ("dr_jones", "Johanna", "Jones", "Smith Square"),
+        ]:
+            User.objects.create_user(
+                username=username,
+                first_name=first,
+                last_name=last,
+                address=address,
+                is_doctor=True,
+            )
+        User.objects.create_user(username="smith_patient", last_name="Smith")
+        self.client.force_authenticate(User.objects.get(username="smith_patient"))
+
+    def search(self, query):
+        return self.client.get("http://chiron.aeonem.xyz/user/search/" + query)
+
+    def usernames(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [doctor["username"] for doctor in response.json()["results"]]
+
+    def test_ranked_prefix_matches(self):
+        # names weigh more than addresses, patients never show up
+        self.assertEqual(
+            self.usernames(self.search("?q=smith")),
+            ["dr_smith", "dr_smithers", "dr_jones"],
+        )
+        self.assertEqual(
+            self.usernames(self.search("?q=jo+smi")), ["dr_smith", "dr_jones"]
+        )
+        self.assertEqual(self.usernames(self.search("?q=elm")), ["dr_smithers"])
+        self.assertEqual(self.usernames(self.search('?q="AND*')), [])
+
+    def test_index_follows_changes(self):
+        doctor = User.objects.get(username="dr_jones")
+        doctor.last_name = "Baker"
+        doctor.save()
+        self.assertEqual(
+            self.usernames(self.search("?q=baker")), ["dr_jones", "dr_smith"]
+        )
+        User.objects.filter(username="dr_smith").delete()
+        self.assertEqual(self.usernames(self.search("?q=baker")), ["dr_jones"])
+
+    def test_paging(self):
+        response = self.search("?q=smith&page_size=2")
+        self.assertEqual(response.json()["count"], 3)
+        self.assertEqual(len(response.json()["results"]), 2)
+        response = self.client.get(response.json()["next"])
+        self.assertEqual(self.usernames(response), ["dr_jones"])
+        self.assertEqual(self.search("?q=smith&page=3&page_size=2").status_code, 404)
+
+    def test_matches_scan(self):
+        for query in ["smith", "jo smi", "street", "nobody"]:
+            self.assertEqual(
+                {doctor.username for doctor in search.search(query, 0, 10)[1]},
+                set(search.scan(query).values_list("username", flat=True)),
+            )
+
+    def test_requires_query(self):
+        self.assertEqual(self.search("").status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AdminTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("test_admin", password="test")
+        self.client.force_login(self.admin)
+        self.doctor = User.objects.create_user(
+            username="dr_smith", first_name="John", last_name="Smith", is_doctor=True
+        )
+        self.patient = User.objects.create_user(
+            username="test_patient", last_name="Jones", phone="+12125552368"
+        )
+        self.other = User.objects.create_user(username="other_patient")
+        start = datetime(2021, 1, 1, tzinfo=timezone.utc)
+        for i, patient in enumerate([self.patient, self.other, self.patient]):
+            Appointment.objects.create(
+                patient=patient, doctor=self.doctor, date=start + timedelta(hours=i)
+            )
+
+    def changelist(self, url, query=""):
+        response = self.client.get(url + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return list(response.context["cl"].result_list)
+
+    def test_appointment_list_queries_are_constant(self):
+        url = "/admin/visits/appointment/"
+        with CaptureQueriesContext(connection) as few:
+            self.changelist(url)
+        for i in range(5):
+            Appointment.objects.create(
+                patient=self.other,
+                doctor=self.doctor,
+                date=datetime(2022, 1, 1, i, tzinfo=timezone.utc),
+            )
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(len(self.changelist(url)), 8)
+        self.assertEqual(len(few), len(many))
+
+    def test_appointment_search(self):
+        url = "/admin/visits/appointment/"
+        for query in ["jones", "test_patient", "+12125552368"]:
+            appointments = self.changelist(url, "?" + urlencode({"q": query}))
+            self.assertEqual(
+                {appointment.patient for appointment in appointments}, {self.patient}
+            )
+        self.assertEqual(len(self.changelist(url, "?q=jo+smi")), 3)
+        self.assertEqual(self.changelist(url, "?q=nobody"), [])
+
+    def test_user_autocomplete(self):
+        response = self.client.get(
+            "/admin/autocomplete/",
+            {
+                "app_label": "visits",
+                "model_name": "appointment",
+                "field_name": "doctor",
+                "term": "smi",
+            },
+        )
+        self.assertEqual(
+            [result["text"] for result in response.json()["results"]], ["dr_smith"]
+        )
+
+    def test_token_search(self):
+        Token.objects.create(user=self.patient)
+        Token.objects.create(user=self.other)
+        tokens = self.changelist("/admin/authtoken/tokenproxy/", "?q=jones")
+        self.assertEqual([token.user for token in tokens], [self.patient])
+
+    def test_approximate_count(self):
+        paginator = ApproximateCountPaginator(User.objects.order_by("pk"), 2)
+        paginator.threshold = 2
+        last = User.objects.order_by("pk").last().pk
+        self.patient.delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, last)
+        filtered = User.objects.filter(is_doctor=True).order_by("pk")
+        self.assertEqual(ApproximateCountPaginator(filtered, 2).count, 1)
+        paginator = ApproximateCountPaginator(User.objects.order_by("pk"), 2)
+        self.assertEqual(paginator.count, 3)
+
+
+class ScheduleConflictTests(APITestCase):
+    def setUp(self):
+        User.objects.create_user(username="test_doctor", is_doctor=True)
+        self.client.force_authenticate(User.objects.create_user("test_patient"))
+
+    def book(self, date, **extra):
+        return self.client.post(
+            "http://chiron.aeonem.xyz/appointment/",
+            {"doctor": "test_doctor", "date": date, **extra},
+            format="json",
+        )
+
+    def test_overlapping_booking_is_refused(self):
+        response = self.book("2021-02-15T10:00Z", duration="01:00:00")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.book("2021-02-15T10:30Z")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        response = self.book("2021-02-15T09:45Z")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_adjacent_booking_is_accepted(self):
+        self.assertEqual(self.book("2021-02-15T10:00Z").status_code, 201)
+        self.assertEqual(self.book("2021-02-15T10:30Z").status_code, 201)
+        self.assertEqual(self.book("2021-02-15T09:30Z").status_code, 201)
+
+    def move(self, method, appointment, **data):
+        return getattr(self.client, method)(
+            f"http://chiron.aeonem.xyz/appointment/{appointment}/", data, format="json"
+        )
+
+    def test_updates_keep_stored_duration(self):
+        long = self.book("2021-02-15T09:00Z", duration="02:00:00").data["id"]
+        self.assertEqual(self.book("2021-02-15T12:00Z").status_code, 201)
+        # still two hours long at 11:00, overlapping the 12:00 one
+        response = self.move(
+            "put", long, doctor="test_doctor", date="2021-02-15T11:00Z"
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        response = self.move("patch", long, date="2021-02-15T11:00Z")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        response = self.move("patch", long, date="2021-02-15T10:00Z")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        moved = Appointment.objects.get(pk=long)
+        self.assertEqual(moved.end, datetime(2021, 2, 15, 12, tzinfo=timezone.utc))
+        response = self.move("patch", long, duration="01:00:00")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Appointment.objects.get(pk=long).duration, timedelta(hours=1))
+
+    def test_overlap_query_uses_index(self):
+        start = datetime(2021, 2, 15, 10, tzinfo=timezone.utc)
+        plan = Appointment.objects.overlapping(
+            User.objects.get(username="test_doctor"), start, start + timedelta(hours=1)
+        ).explain()
+        self.assertIn(
+            "appointment_doctor_date (doctor_id=? AND date>? AND date<?)", plan
+        )
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    def test_parallel_bookings_of_one_slot(self):
+        doctor = User.objects.create_user(username="test_doctor", is_doctor=True)
+        patients = [User.objects.create_user(f"test_patient{i}") for i in range(12)]
+        start = datetime(2021, 2, 15, 10, tzinfo=timezone.utc)
+        barrier, outcomes = threading.Barrier(len(patients)), []
+
+        def attempt(patient):
+            barrier.wait()
+            try:
+                scheduling.book(
+                    doctor,
+                    start,
+                    models.DEFAULT_DURATION,
+                    save=lambda: Appointment.objects.create(
+                        patient=patient, doctor=doctor, date=start
+                    ),
+                )
+                outcomes.append("booked")
+            except scheduling.ScheduleConflict:
+                outcomes.append("conflict")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(p,)) for p in patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(outcomes.count("booked"), 1)
+        self.assertEqual(outcomes.count("conflict"), len(patients) - 1)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+
+class AvailabilityTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.first = User.objects.create_user(username="test_doctor", is_doctor=True)
+        self.second = User.objects.create_user(username="test_doctor2", is_doctor=True)
+        self.client.force_authenticate(User.objects.create_user("test_patient"))
+        self.day = datetime.now(tz=timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ) + timedelta(days=1)
+
+    def get_slots(self, **params):
+        params.setdefault("after", self.day.isoformat())
+        response = self.client.get(
+            "http://chiron.aeonem.xyz/appointment/slots/", params
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(slot["doctor"], slot["start"][11:16]) for slot in response.data]
+
+    def test_earliest_slots_skip_bookings(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "http://chiron.aeonem.xyz/appointment/",
+                {
+                    "doctor": "test_doctor2",
+                    "date": (self.day + timedelta(hours=9)).isoformat(),
+                    "duration": "01:00:00",
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            self.get_slots(count=4),
+            [
+                ("test_doctor", "09:00"),
+                ("test_doctor", "09:30"),
+                ("test_doctor", "10:00"),
+                ("test_doctor2", "10:00"),
+            ],
+        )
+        self.assertEqual(
+            self.get_slots(count=2, doctor="test_doctor2"),
+            [("test_doctor2", "10:00"), ("test_doctor2", "10:30")],
+        )
+
+    def test_cancellation_frees_slot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                patient=self.first,
+                doctor=self.first,
+                date=self.day + timedelta(hours=9),
+            )
+        self.assertEqual(
+            self.get_slots(count=1, doctor="test_doctor"), [("test_doctor", "09:30")]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.delete()
+        self.assertEqual(
+            self.get_slots(count=1, doctor="test_doctor"), [("test_doctor", "09:00")]
+        )
+
+    def test_bulk_created_appointments_take_slots(self):
+        self.get_slots(count=1)  # builds the index
+        patient = User.objects.get(username="test_patient")
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.bulk_create(
+                Appointment(
+                    patient=patient,
+                    doctor=self.first,
+                    date=self.day + timedelta(hours=9, minutes=minutes),
+                )
+                for minutes in [0, 30]
+            )
+        self.assertEqual(
+            self.get_slots(count=1, doctor="test_doctor"), [("test_doctor", "10:00")]
+        )
+
+    def test_slots_stay_within_opening_hours(self):
+        slots = self.get_slots(count=17, doctor="test_doctor")
+        self.assertEqual(slots[0], ("test_doctor", "09:00"))
+        self.assertEqual(slots[15], ("test_doctor", "16:30"))
+        self.assertEqual(slots[16], ("test_doctor", "09:00"))
+
+
+class BulkAppointmentTests(APITestCase):
+    def setUp(self):
+        User.objects.create_user(username="test_doctor", is_doctor=True)
+        User.objects.create_user(username="test_doctor2", is_doctor=True)
+        User.objects.create_user(username="test_nodoctor")
+        self.client.force_authenticate(User.objects.create_user("test_patient"))
+
+    def post(self, items):
+        return self.client.post(
+            "http://chiron.aeonem.xyz/appointment/bulk/", items, format="json"
+        )
+
+    def test_all_created(self):
+        items = [
+            {"doctor": doctor, "date": f"2021-02-{day}T10:00Z"}
+            for day in range(10, 15)
+            for doctor in ["test_doctor", "test_doctor2"]
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(items)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Appointment.objects.count(), 10)
+        self.assertTrue(all(item["appointment"]["id"] for item in response.data))
+        lookups = [q for q in queries if q["sql"].startswith('SELECT "users_user"')]
+        inserts = [q for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual((len(lookups), len(inserts)), (1, 1))
+
+    def test_doctor_names_are_trimmed(self):
+        response = self.post([{"doctor": " test_doctor ", "date": "2021-02-10T10:00Z"}])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data[0]["status"], status.HTTP_201_CREATED)
+
+    def test_per_item_errors(self):
+        Appointment.objects.create(
+            patient=User.objects.get(username="test_patient"),
+            doctor=User.objects.get(username="test_doctor"),
+            date=datetime(2021, 2, 15, 10, tzinfo=timezone.utc),
+        )
+        response = self.post(
+            [
+                {"doctor": "test_doctor", "date": "2021-02-15T11:00Z"},
+                {"doctor": "test_nodoctor", "date": "2021-02-15T11:00Z"},
+                {"doctor": "test_missing", "date": "2021-02-15T11:00Z"},
+                {"doctor": "test_doctor", "date": "2021-02-15T10:15Z"},
+                {"doctor": "test_doctor", "date": "2021-02-15T11:15Z"},
+                {"doctor": "test_doctor"},
+            ]
+        )
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [item["status"] for item in response.data], [201, 400, 400, 409, 409, 400]
+        )
+        self.assertEqual(Appointment.objects.count(), 2)
+
+    def test_batch_order_decides_overlaps(self):
+        patient = User.objects.get(username="test_patient")
+        doctors = list(User.objects.filter(is_doctor=True))
+        start = datetime(2021, 2, 15, 9, tzinfo=timezone.utc)
+        Appointment.objects.create(patient=patient, doctor=doctors[0], date=start)
+        generator = random.Random(7)
+        batch = [
+            Appointment(
+                patient=patient,
+                doctor=generator.choice(doctors),
+                date=start + timedelta(minutes=5 * generator.randrange(100)),
+                duration=timedelta(minutes=5 * generator.randrange(1, 12)),
+            )
+            for _ in range(200)
+        ]
+        # whatever the order in time, the first of overlapping appointments wins
+        expected, taken = [], [(doctors[0].pk, start, start + timedelta(minutes=30))]
+        for a in batch:
+            until = a.date + a.duration
+            free = all(
+                doctor != a.doctor_id or end <= a.date or date >= until
+                for doctor, date, end in taken
+            )
+            if free:
+                taken.append((a.doctor_id, a.date, until))
+            expected.append(free)
+        self.assertEqual(scheduling.book_many(batch), expected)
+        self.assertEqual(Appointment.objects.count(), len(taken))
+
+    def test_requires_list(self):
+        response = self.post({"doctor": "test_doctor", "date": "2021-02-15T11:00Z"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ApprovalTests(APITestCase):
+    def setUp(self):
+        self.doctor = User.objects.create_user(username="test_doctor", is_doctor=True)
+        other = User.objects.create_user(username="test_doctor2", is_doctor=True)
+        patient = User.objects.create_user("test_patient")
+        start = datetime(2021, 2, 15, 9, tzinfo=timezone.utc)
+        self.mine = Appointment.objects.bulk_create(
+            Appointment(
+                patient=patient, doctor=self.doctor, date=start + timedelta(days=i)
+            )
+            for i in range(4)
+        )
+        self.other = Appointment.objects.create(
+            patient=patient, doctor=other, date=start
+        )
+        self.client.force_authenticate(self.doctor)
+
+    def approved(self):
+        return set(
+            Appointment.objects.filter(approved=True).values_list("pk", flat=True)
+        )
+
+    def assertSingleUpdate(self, queries):
+        updates = [
+            query
+            for query in queries
+            if query["sql"].startswith('UPDATE "visits_appointment"')
+        ]
+        self.assertEqual(len(updates), 1)
+
+    def test_approve_is_a_single_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f"http://chiron.aeonem.xyz/appointment/{self.mine[0].pk}/approve/"
+            )
+        self.assertSingleUpdate(queries)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.approved(), {self.mine[0].pk})
+
+    def test_approval_reads_in_its_transaction(self):
+        with CaptureQueriesContext(connection) as queries:
+            Appointment.objects.filter(doctor=self.doctor).set_approval(True)
+        statements = [query["sql"].split()[0] for query in queries]
+        # the changing rows are read after the (nested here) transaction began
+        self.assertEqual(statements[:3], ["SAVEPOINT", "SELECT", "UPDATE"])
+        self.assertEqual(len(self.approved()), 4)
+
+    def test_approve_requires_doctor(self):
+        response = self.client.post(
+            f"http://chiron.aeonem.xyz/appointment/{self.other.pk}/approve/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post("http://chiron.aeonem.xyz/appointment/999/approve/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.approved(), set())
+
+    def test_bulk_approve_by_ids(self):
+        ids = [self.mine[0].pk, self.mine[2].pk, self.other.pk]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "http://chiron.aeonem.xyz/appointment/approve/",
+                {"ids": ids},
+                format="json",
+            )
+        self.assertSingleUpdate(queries)
+        self.assertEqual(response.data, {"updated": 2})
+        self.assertEqual(self.approved(), {self.mine[0].pk, self.mine[2].pk})
+
+    def test_bulk_reject_by_dates(self):
+        Appointment.objects.update(approved=True)
+        response = self.client.post(
+            "http://chiron.aeonem.xyz/appointment/reject/",
+            {"after": "2021-02-16T00:00Z", "before": "2021-02-18T00:00Z"},
+            format="json",
+        )
+        self.assertEqual(response.data, {"updated": 2})
+        self.assertEqual(
+            self.approved(), {self.mine[0].pk, self.mine[3].pk, self.other.pk}
+        )
+
+    def test_bulk_requires_selection(self):
+        response = self.client.post(
+            "http://chiron.aeonem.xyz/appointment/approve/", {}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ValuesPlanTests(APITestCase):
+    def setUp(self):
+        self.doctor = User.objects.create_user(
+            username="test_doctor",
+            first_name="Zoë",
+            last_name='O"Neil',
+            phone="+989021110787",
+            is_doctor=True,
+        )
+        self.patient = User.objects.create_user(username="test_patient")
+        start = datetime(2021, 2, 15, 9, 30, 15, 250, tzinfo=timezone.utc)
+        Appointment.objects.bulk_create(
+            Appointment(
+                patient=self.patient,
+                doctor=self.doctor,
+                date=start + timedelta(days=i, minutes=7 * i),
+                duration=timedelta(minutes=15 + 15 * (i % 3)),
+                description=["", 'a, "quoted"\nnote', "ünïcode ✓"][i % 3],
+                approved=i % 2 == 0,
+            )
+            for i in range(6)
+        )
+
+    def assertSameBytes(self, serializer_class, queryset):
+        plan = values_plan(serializer_class)
+        rendered = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        planned = JSONRenderer().render(plan.represent(plan.values(queryset)))
+        self.assertEqual(planned, rendered)
+
+    def test_appointments(self):
+        appointments = AppointmentSerializer.plan_queryset(
+            Appointment.objects.order_by("date", "id")
+        )
+        self.assertSameBytes(AppointmentSerializer, appointments)
+        # offsets other than Z
+        with override_settings(TIME_ZONE="Asia/Tehran"):
+            self.assertSameBytes(AppointmentSerializer, appointments)
+
+    def test_users(self):
+        users = User.objects.order_by("username")
+        for serializer_class in [UserSerializer, EgoUserSerializer, NameSerializer]:
+            self.assertSameBytes(serializer_class, users)
+
+    def test_list_endpoint(self):
+        self.client.force_authenticate(self.patient)
+        response = self.client.get("http://chiron.aeonem.xyz/appointment/?page_size=4")
+        appointments = AppointmentSerializer.plan_queryset(
+            Appointment.objects.order_by("date", "id")
+        )[:4]
+        self.assertEqual(
+            json.dumps(response.json()["results"]),
+            json.dumps(AppointmentSerializer(appointments, many=True).data),
+        )
+        self.assertIsNotNone(response.json()["next"])
+
+
+class OwnershipTests(APITestCase):
+    def setUp(self):
+        self.doctor = User.objects.create_user(username="test_doctor", is_doctor=True)
+        self.patient = User.objects.create_user(username="test_patient")
+        self.stranger = User.objects.create_user(username="test_stranger")
+        self.appointment = Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            date=datetime(2021, 2, 15, 9, tzinfo=timezone.utc),
+            approved=True,
+        )
+
+    def request(self, user, method, action="", **kwargs):
+        self.client.force_authenticate(user)
+        url = f"http://chiron.aeonem.xyz/appointment/{self.appointment.pk}/{action}"
+        return getattr(self.client, method)(url, format="json", **kwargs)
+
+    def test_non_participants_are_not_found(self):
+        update = dict(doctor="test_doctor", date="2021-02-16T09:00:00Z")
+        for user, method, action, kwargs in [
+            (self.stranger, "get", "", {}),
+            (self.stranger, "put", "", dict(data=update)),
+            (self.doctor, "put", "", dict(data=update)),
+            (self.doctor, "delete", "", {}),
+            (self.doctor, "get", "visit/", {}),
+            (self.patient, "post", "approve/", {}),
+            (self.patient, "post", "reject/", {}),
+        ]:
+            # the ownership check is part of the lookup (or of the approval's
+            # SELECT and UPDATE, in a savepoint here)
+            with self.assertNumQueries(4 if method == "post" else 1):
+                response = self.request(user, method, action, **kwargs)
+            self.assertEqual(
+                response.status_code, status.HTTP_404_NOT_FOUND, (method, action)
+            )
+        self.assertTrue(Appointment.objects.get(pk=self.appointment.pk).approved)
+
+    def test_participants_in_one_query(self):
+        for user, action in [
+            (self.doctor, ""),
+            (self.patient, ""),
+            (self.patient, "visit/"),
+        ]:
+            with self.assertNumQueries(1):
+                response = self.request(user, "get", action)
+            self.assertLess(response.status_code, 300)
+        with self.assertNumQueries(1):
+            response = self.request(self.stranger, "get", "visit/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_owners(self):
+        response = self.request(self.patient, "get", "visit/")
+        self.assertEqual(response.data, dict(phone_number=str(self.doctor.phone)))
+        self.assertEqual(
+            self.request(self.doctor, "post", "reject/").status_code,
+            status.HTTP_202_ACCEPTED,
+        )
+        self.assertEqual(
+            self.request(self.patient, "delete").status_code,
+            status.HTTP_204_NO_CONTENT,
+        )
+
+    def test_users_update_themselves_only(self):
+        self.client.force_authenticate(self.stranger)
+        response = self.client.put(
+            "http://chiron.aeonem.xyz/user/test_patient/",
+            dict(first_name="mallory"),
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotEqual(User.objects.get(pk=self.patient.pk).first_name, "mallory")
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        doctor = User.objects.create_user(username="test_doctor", is_doctor=True)
+        self.patient = User.objects.create_user("test_patient")
+        stranger = User.objects.create_user("test_stranger")
+        start = datetime(2021, 2, 15, 9, tzinfo=timezone.utc)
+        Appointment.objects.bulk_create(
+            Appointment(
+                patient=self.patient,
+                doctor=doctor,
+                date=start + timedelta(days=i),
+                description='a, "quoted"\nnote',
+            )
+            for i in range(5)
+        )
+        Appointment.objects.create(patient=stranger, doctor=doctor, date=start)
+        self.client.force_authenticate(self.patient)
+
+    def export(self, query=""):
+        response = self.client.get(
+            "http://chiron.aeonem.xyz/appointment/export/" + query
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_matches_list(self):
+        rows = [json.loads(line) for line in self.export().splitlines()]
+        listed = self.client.get("http://chiron.aeonem.xyz/appointment/").json()
+        self.assertEqual(rows, listed["results"])
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export("?output=csv"))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["description"], 'a, "quoted"\nnote')
+        self.assertEqual(rows[0]["doctor"], "test_doctor")
+
+    def test_date_range(self):
+        lines = self.export("?after=2021-02-16T00:00Z&before=2021-02-18T00:00Z")
+        self.assertEqual(len(lines.splitlines()), 2)
+
+    def test_roles_are_merged_without_sorting(self):
+        doctor = User.objects.get(username="test_doctor")
+        Appointment.objects.create(
+            patient=doctor,
+            doctor=User.objects.create_user("test_doctor2", is_doctor=True),
+            date=datetime(2021, 2, 16, 12, tzinfo=timezone.utc),
+        )
+        self.client.force_authenticate(doctor)
+        with CaptureQueriesContext(connection) as queries:
+            rows = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows, sorted(rows, key=lambda row: (row["date"], row["id"])))
+        self.assertEqual(rows[3]["patient"], "test_doctor")
+        for query in queries:
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                plan = " ".join(row[-1] for row in cursor.fetchall())
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_unknown_output(self):
+        response = self.client.get(
+            "http://chiron.aeonem.xyz/appointment/export/?output=xml"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncViewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.doctor = User.objects.create_user(
+            username="test_doctor", password="doc1234", is_doctor=True
+        )
+        self.patient = User.objects.create_user(
+            username="test_patient", password="pat1234"
+        )
+        other = User.objects.create_user(username="test_other", password="oth1234")
+        start = datetime(2021, 2, 15, 9, tzinfo=timezone.utc)
+        Appointment.objects.bulk_create(
+            Appointment(
+                patient=other if i == 4 else self.patient,
+                doctor=self.doctor,
+                date=start + timedelta(hours=i),
+            )
+            for i in range(5)
+        )
+        self.foreign = Appointment.objects.get(patient=other)
+        token = Token.objects.create(user=self.patient)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+
+    def assertSameContent(self, path):
+        sync = self.client.get("http://chiron.aeonem.xyz" + path)
+        asynchronous = self.client.get("http://chiron.aeonem.xyz/async" + path)
+        self.assertEqual(sync.status_code, asynchronous.status_code)
+        self.assertEqual(
+            sync.content.replace(b"/async/", b"/"),
+            asynchronous.content.replace(b"/async/", b"/"),
+        )
+        return asynchronous
+
+    def test_matches_sync_views(self):
+        first = Appointment.objects.filter(patient=self.patient).first()
+        self.assertSameContent("/user/me/")
+        self.assertSameContent("/user/drs/?page_size=1")
+        self.assertSameContent(f"/appointment/{first.pk}/")
+        response = self.assertSameContent("/appointment/?page_size=3")
+        self.assertEqual(len(response.json()["results"]), 3)
+        cursor = response.json()["next"].split("?")[1]
+        self.assertSameContent(f"/appointment/?{cursor}")
+
+    def test_conditional_like_sync_views(self):
+        for path in ["/user/me/", "/user/drs/", "/appointment/"]:
+            sync = self.client.get("http://chiron.aeonem.xyz" + path)
+            url = "http://chiron.aeonem.xyz/async" + path
+            response = self.client.get(url)
+            self.assertEqual(response["ETag"], sync["ETag"], path)
+            self.assertEqual(response["Last-Modified"], sync["Last-Modified"], path)
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED, path)
+
+    def test_replica_reads_like_sync_views(self):
+        first = Appointment.objects.filter(patient=self.patient).first()
+        self.client.get("http://chiron.aeonem.xyz/async/user/me/")  # caches the token
+        for path, replica in [
+            (f"/async/appointment/{first.pk}/", True),
+            ("/async/appointment/", False),
+        ]:
+            reads = []
+            with mock.patch.object(
+                routers.ReadReplicaRouter,
+                "db_for_read",
+                lambda router, model, **hints: reads.append(routers.reading.get())
+                or "default",
+            ):
+                self.client.get("http://chiron.aeonem.xyz" + path)
+            self.assertEqual(set(reads), {replica}, path)
+
+    def test_foreign_appointment_is_not_found(self):
+        self.assertSameContent(f"/appointment/{self.foreign.pk}/")
+        response = self.client.get(
+            f"http://chiron.aeonem.xyz/async/appointment/{self.foreign.pk}/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cached_token_skips_queries(self):
+        self.client.get("http://chiron.aeonem.xyz/async/user/me/")
+        with self.assertNumQueries(0):
+            response = self.client.get("http://chiron.aeonem.xyz/async/user/me/")
+        self.assertEqual(response.json()["username"], "test_patient")
+
+    def test_authentication(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+        self.assertSameContent("/user/me/")
+        self.client.credentials()
+        response = self.assertSameContent("/appointment/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.login(username="test_doctor", password="doc1234")
+        response = self.client.get("http://chiron.aeonem.xyz/async/user/me/")
+        self.assertEqual(response.json()["username"], "test_doctor")
+
+    def test_method_not_allowed(self):
+        response = self.client.post("http://chiron.aeonem.xyz/async/user/me/")
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionRefusedError("connection refused")
+
+
+class CrashingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        if len(mail.outbox) == 1:
+            raise KeyboardInterrupt
+        return super().send_messages(messages)
+
+
+class OutboxTests(APITestCase):
+    def setUp(self):
+        self.doctor = User.objects.create_user(username="test_doctor", is_doctor=True)
+        self.patient = User.objects.create_user(
+            username="test_patient", email="patient@example.com"
+        )
+
+    def test_registration_queues_welcome(self):
+        response = self.client.post(
+            "http://chiron.aeonem.xyz/user/",
+            {**doctor_data, "username": "test_doctor2", "email": "doc@example.com"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Email.objects.get().to, "doc@example.com")
+        self.assertEqual(delivery.deliver(), (1, 1))
+        self.assertEqual(mail.outbox[0].to, ["doc@example.com"])
+        self.assertIsNotNone(Email.objects.get().sent_at)
+
+    def test_invite(self):
+        self.client.force_authenticate(self.doctor)
+        response = self.client.post(
+            "http://chiron.aeonem.xyz/user/invite/",
+            {"email": "friend@example.com"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(Email.objects.get().to, "friend@example.com")
+        response = self.client.post(
+            "http://chiron.aeonem.xyz/user/invite/", {"phone": "+98901"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invites_are_throttled(self):
+        cache.clear()
+        self.client.force_authenticate(self.doctor)
+        url = "http://chiron.aeonem.xyz/user/invite/"
+        with mock.patch.dict(InviteRateThrottle.THROTTLE_RATES, invite="2/day"):
+            for expected in [202, 202, 429]:
+                response = self.client.post(
+                    url, {"email": "friend@example.com"}, format="json"
+                )
+                self.assertEqual(response.status_code, expected)
+        self.assertEqual(Email.objects.count(), 2)
+
+    def test_approval_notifies_patient_once(self):
+        appointment = Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            date=datetime(2021, 2, 15, 9, tzinfo=timezone.utc),
+        )
+        self.client.force_authenticate(self.doctor)
+        url = f"http://chiron.aeonem.xyz/appointment/{appointment.pk}/approve/"
+        for _ in range(2):
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(Email.objects.get().to, "patient@example.com")
+
+    def test_claims_do_not_overlap(self):
+        Email.objects.enqueue_many(
+            (f"user{i}@example.com", "subject", "body") for i in range(5)
+        )
+        first = Email.objects.claim(3, timedelta(minutes=5))
+        second = Email.objects.claim(3, timedelta(minutes=5))
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({e.pk for e in first} & {e.pk for e in second})
+        self.assertEqual(Email.objects.claim(3, timedelta(minutes=5)), [])
+
+    @override_settings(EMAIL_BACKEND="chiron.tests.CrashingEmailBackend")
+    def test_sent_emails_are_marked_one_by_one(self):
+        Email.objects.enqueue_many(
+            (f"user{i}@example.com", "subject", "body") for i in range(3)
+        )
+        # an interrupted worker isn't a failed delivery
+        with self.assertNoLogs("chiron.apps.outbox.delivery", "WARNING"):
+            with self.assertRaises(KeyboardInterrupt):
+                delivery.deliver()
+        # the one sent before the worker died isn't sent again
+        self.assertEqual(
+            list(Email.objects.filter(sent_at__isnull=False).values_list("to")),
+            [("user0@example.com",)],
+        )
+
+    @override_settings(EMAIL_BACKEND="chiron.tests.FailingEmailBackend")
+    def test_failures_are_retried_with_backoff(self):
+        email = Email.objects.enqueue("patient@example.com", "subject", "body")
+        with self.assertLogs("chiron.apps.outbox.delivery", "WARNING") as logs:
+            self.assertEqual(delivery.deliver(), (1, 0))
+        self.assertEqual(
+            logs.output,
+            [
+                "WARNING:chiron.apps.outbox.delivery:sending email "
+                f"{email.pk} to patient@example.com failed: connection refused"
+            ],
+        )
+        email = Email.objects.get()
+        self.assertEqual(email.attempts, 1)
+        self.assertIn("connection refused", email.last_error)
+        self.assertFalse(email.failed)
+        # not due again before the retry delay is over
+        self.assertEqual(delivery.deliver(), (0, 0))
+        delays = [delivery.retry_delay(attempts) for attempts in range(1, 4)]
+        self.assertEqual(delays[1], 2 * delays[0])
+        self.assertEqual(delays[2], 2 * delays[1])
+
+        with self.settings(OUTBOX={**settings.OUTBOX, "MAX_ATTEMPTS": 2}):
+            Email.objects.update(next_attempt=email.date_created)
+            with self.assertLogs("chiron.apps.outbox.delivery", "WARNING"):
+                delivery.deliver()
+        self.assertTrue(Email.objects.get().failed)
+
+    def test_command_sends_batches(self):
+        Email.objects.enqueue_many(
+            (f"user{i}@example.com", "subject", "body") for i in range(5)
+        )
+        output = io.StringIO()
+        call_command("send_outbox", once=True, batch_size=2, stdout=output)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn("sent 5 emails", output.getvalue())
+        self.assertFalse(Email.objects.filter(sent_at__isnull=True).exists())
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.doctor = User.objects.create_user(username="test_doctor", is_doctor=True)
+        self.patient = User.objects.create_user(username="test_patient")
+        self.appointment = Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            date=datetime(2021, 2, 15, 9, tzinfo=timezone.utc),
+        )
+        token = Token.objects.create(user=self.patient)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+
+    def assertRevalidates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Last-Modified", response)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(cached.content, b"")
+        return response["ETag"]
+
+    def assertChanged(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_profile(self):
+        url = "http://chiron.aeonem.xyz/user/me/"
+        self.client.get(url)  # caches the token
+        etag = self.assertRevalidates(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(pk=self.patient.pk).save()
+        self.assertChanged(url, etag)
+
+    def test_profile_saved_by_another_worker(self):
+        url = "http://chiron.aeonem.xyz/user/me/"
+        self.client.get(url)  # caches the token
+        etag = self.assertRevalidates(url)
+        # another worker's token cache drops the user, this one's still holds it
+        with mock.patch.object(authentication.token_cache, "delete_user"):
+            with self.captureOnCommitCallbacks(execute=True):
+                User.objects.get(pk=self.patient.pk).save()
+        self.assertChanged(url, etag)
+
+    def test_doctor_directory(self):
+        url = "http://chiron.aeonem.xyz/user/drs/"
+        etag = self.assertRevalidates(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username="test_doctor2", is_doctor=True)
+        self.assertChanged(url, etag)
+
+    def test_appointment_list(self):
+        self.client.force_authenticate(self.patient)
+        url = "http://chiron.aeonem.xyz/appointment/"
+        etag = self.assertRevalidates(url)
+        self.assertNotEqual(self.client.get(url + "?format=api")["ETag"], etag)
+
+        self.client.force_authenticate(self.doctor)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                f"http://chiron.aeonem.xyz/appointment/{self.appointment.pk}/approve/"
+            )
+        self.client.force_authenticate(self.patient)
+        self.assertChanged(url, etag)
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.appointment.delete()
+        self.assertChanged(url, etag)
+
+    def test_appointment_list_shows_renames(self):
+        self.client.force_authenticate(self.patient)
+        url = "http://chiron.aeonem.xyz/appointment/"
+        etag = self.assertRevalidates(url)
+        doctor = User.objects.get(pk=self.doctor.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.save(update_fields=["phone"])
+            doctor.save()
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+        doctor.last_name = "Lovelace"
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.save()
+        self.assertChanged(url, etag)
+        self.assertEqual(
+            self.client.get(url).data["results"][0]["doctor__last_name"], "Lovelace"
+        )
+
+    def test_workers_need_a_shared_cache(self):
+        versions.check_shared_cache()
+        with override_settings(WORKERS=2):
+            with self.assertRaises(ImproperlyConfigured):
+                versions.check_shared_cache()
+            redis = {"BACKEND": "django.core.cache.backends.redis.RedisCache"}
+            with override_settings(CACHES={"default": redis}):
+                versions.check_shared_cache()
+
+    def test_approval_stamps_changed_rows_only(self):
+        other = Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            date=datetime(2021, 2, 16, 9, tzinfo=timezone.utc),
+            approved=True,
+        )
+        Appointment.objects.all().set_approval(True)
+        self.appointment.refresh_from_db()
+        self.assertGreater(self.appointment.updated_at, other.updated_at)
+        self.assertEqual(
+            Appointment.objects.get(pk=other.pk).updated_at, other.updated_at
+        )
+
+
+class ChangeFeedTests(APITestCase):
+    def setUp(self):
+        self.doctor = User.objects.create_user(username="test_doctor", is_doctor=True)
+        self.patient = User.objects.create_user(username="test_patient")
+        self.start = datetime(2021, 2, 15, 9, tzinfo=timezone.utc)
+        self.appointments = Appointment.objects.bulk_create(
+            Appointment(
+                patient=self.patient,
+                doctor=self.doctor,
+                date=self.start + timedelta(days=i),
+            )
+            for i in range(3)
+        )
+
+    def changes(self, user, since=0, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get(
+            "http://chiron.aeonem.xyz/appointment/changes/",
+            {"since": since, **params},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_changes_since_watermark(self):
+        first = self.changes(self.patient)
+        self.assertEqual(len(first["updated"]), 3)
+        self.assertFalse(first["more"])
+        self.assertEqual(self.changes(self.patient, first["watermark"])["updated"], [])
+
+        self.client.force_authenticate(self.doctor)
+        self.client.post(
+            f"http://chiron.aeonem.xyz/appointment/{self.appointments[1].pk}/approve/"
+        )
+        update = self.changes(self.patient, first["watermark"])
+        self.assertEqual(
+            [a["id"] for a in update["updated"]], [self.appointments[1].pk]
+        )
+        self.assertTrue(update["updated"][0]["approved"])
+        self.assertGreater(update["watermark"], first["watermark"])
+
+    def test_deletions_leave_tombstones(self):
+        since = self.changes(self.doctor)["watermark"]
+        self.client.force_authenticate(self.patient)
+        response = self.client.delete(
+            f"http://chiron.aeonem.xyz/appointment/{self.appointments[0].pk}/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        for user in [self.patient, self.doctor]:
+            feed = self.changes(user, since)
+            self.assertEqual(feed["deleted"], [self.appointments[0].pk])
+            self.assertEqual(feed["updated"], [])
+
+    def test_moved_appointment_leaves_previous_doctor(self):
+        since = self.changes(self.doctor)["watermark"]
+        other = User.objects.create_user(username="test_doctor2", is_doctor=True)
+        appointment = Appointment.objects.get(pk=self.appointments[0].pk)
+        appointment.doctor = other
+        appointment.save()
+        self.assertEqual(self.changes(self.doctor, since)["deleted"], [appointment.pk])
+        moved = self.changes(other, since)["updated"]
+        self.assertEqual([a["id"] for a in moved], [appointment.pk])
+
+    def test_limit_keeps_changes_whole(self):
+        # the initial bulk insert is a single change of three appointments
+        feed = self.changes(self.patient, limit=2)
+        self.assertEqual(len(feed["updated"]), 3)
+        self.assertTrue(feed["more"])
+
+        for appointment in self.appointments[:2]:
+            appointment.description = "changed"
+            appointment.save()
+        pages, since, seen = 0, 0, []
+        while True:
+            feed = self.changes(self.patient, since, limit=1)
+            pages += 1
+            seen += [a["id"] for a in feed["updated"]]
+            since = feed["watermark"]
+            if not feed["more"]:
+                break
+        self.assertEqual(sorted(seen), sorted(a.pk for a in self.appointments))
+        self.assertEqual(pages, 3)
+
+
+class EventStreamTests(APITestCase):
+    def setUp(self):
+        self.doctor = User.objects.create_user(username="test_doctor", is_doctor=True)
+        self.patient = User.objects.create_user(username="test_patient")
+        self.appointment = Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            date=datetime(2021, 2, 15, 9, tzinfo=timezone.utc),
+        )
+        self.token = Token.objects.create(user=self.patient).key
+
+    def open(self, headers=(), query=b""):
+        """
+        Start a request to the event stream, returning the task running it, the
+        queue of messages sent and a function disconnecting the client.
+        """
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": events.PATH,
+            "query_string": query,
+            "headers": [(b"authorization", b"Token " + self.token.encode())]
+            + list(headers),
+        }
+        sent, disconnect = asyncio.Queue(), asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        task = asyncio.ensure_future(events.route(None)(scope, receive, sent.put))
+        return task, sent, disconnect.set
+
+    async def read_until(self, sent, text):
+        body = b""
+        while text.encode() not in body:
+            message = await asyncio.wait_for(sent.get(), 5)
+            body += message.get("body", b"")
+        return body.decode()
+
+    def approve(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.filter(pk=self.appointment.pk).set_approval(True)
+
+    def test_pushes_changes_and_resumes(self):
+        async def scenario():
+            task, sent, disconnect = self.open()
+            start = await asyncio.wait_for(sent.get(), 5)
+            self.assertEqual(start["status"], 200)
+            await self.read_until(sent, "retry:")
+            await sync_to_async(self.approve)()
+            body = await self.read_until(sent, "\n\n")
+            disconnect()
+            await asyncio.wait_for(task, 5)
+            return body
+
+        body = async_to_sync(scenario)()
+        fields = dict(line.split(": ", 1) for line in body.strip().split("\n"))
+        self.assertEqual(fields["event"], "changes")
+        data = json.loads(fields["data"])
+        self.assertEqual(data["updated"][0]["id"], self.appointment.pk)
+        self.assertTrue(data["updated"][0]["approved"])
+        self.assertEqual(pubsub.get_broker().subscriptions, {})
+
+        pk = self.appointment.pk
+        self.appointment.delete()
+
+        async def resume():
+            task, sent, disconnect = self.open(
+                headers=[(b"last-event-id", fields["id"].encode())]
+            )
+            body = await self.read_until(sent, "event: changes")
+            disconnect()
+            await asyncio.wait_for(task, 5)
+            return body
+
+        body = async_to_sync(resume)()
+        self.assertIn(f'"deleted":[{pk}]', body)
+
+    @override_settings(EVENTS={**settings.EVENTS, "HEARTBEAT": 0.01})
+    def test_heartbeat(self):
+        async def scenario():
+            task, sent, disconnect = self.open()
+            await self.read_until(sent, ": heartbeat")
+            disconnect()
+            await asyncio.wait_for(task, 5)
+
+        async_to_sync(scenario)()
+
+    def test_requires_authentication(self):
+        self.token = "invalid"
+
+        async def scenario():
+            task, sent, _ = self.open()
+            await asyncio.wait_for(task, 5)
+            return await sent.get()
+
+        self.assertEqual(async_to_sync(scenario)()["status"], 403)
+
+    def test_buffer_is_bounded(self):
+        broker = pubsub.LocalBroker(buffer=2)
+
+        async def scenario():
+            subscription = broker.subscribe("channel")
+            for _ in range(5):
+                broker.publish(["channel"], "changed")
+            await asyncio.sleep(0)
+            broker.unsubscribe(subscription)
+            return subscription
+
+        subscription = async_to_sync(scenario)()
+        self.assertEqual(subscription.queue.qsize(), 2)
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual(broker.subscriptions, {})
+
+
+@override_settings(OBSERVABILITY=dict(settings.OBSERVABILITY, SERVER_TIMING=True))
+class RequestMetricsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.doctor = User.objects.create_user(username="test_doctor", is_doctor=True)
+        self.patient = User.objects.create_user(username="test_patient")
+        start = datetime(2021, 2, 15, 9, tzinfo=timezone.utc)
+        for i in range(3):
+            Appointment.objects.create(
+                patient=self.patient,
+                doctor=self.doctor,
+                date=start + timedelta(hours=i),
+            )
+        token = Token.objects.create(user=self.patient)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+
+    def timing(self, response):
+        return {
+            name: dict(part.split("=", 1) for part in params)
+            for name, *params in (
+                entry.split(";") for entry in response["Server-Timing"].split(", ")
+            )
+        }
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("http://chiron.aeonem.xyz/appointment/")
+        timing = self.timing(response)
+        self.assertEqual(timing["db"]["desc"], f'"{len(queries)} queries"')
+        self.assertGreater(float(timing["serialize"]["dur"]), 0)
+        self.assertGreaterEqual(float(timing["app"]["dur"]), float(timing["db"]["dur"]))
+
+    def test_async_views_record_queries(self):
+        response = self.client.get("http://chiron.aeonem.xyz/async/appointment/")
+        self.assertNotEqual(self.timing(response)["db"]["desc"], '"0 queries"')
+
+    def test_server_timing_is_opt_in(self):
+        config = dict(settings.OBSERVABILITY, SERVER_TIMING=False)
+        with override_settings(OBSERVABILITY=config):
+            response = self.client.get("http://chiron.aeonem.xyz/appointment/")
+        self.assertNotIn("Server-Timing", response)
+
+    def test_metrics(self):
+        self.client.get("http://chiron.aeonem.xyz/appointment/")
+        response = self.client.get("http://chiron.aeonem.xyz/metrics/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        text = response.content.decode()
+        worker = f'worker="{metrics.worker()}"'
+        self.assertIn("# TYPE chiron_request_duration_seconds histogram", text)
+        self.assertIn(
+            'chiron_request_queries_bucket{route="appointment-list",method="GET",'
+            f'{worker},le="+Inf"}}',
+            text,
+        )
+        self.assertIn(
+            'chiron_requests_total{route="appointment-list",method="GET",'
+            f'status="200",{worker}}}',
+            text,
+        )
+
+    def test_metrics_are_local(self):
+        url = "http://chiron.aeonem.xyz/metrics/"
+        response = self.client.get(url, REMOTE_ADDR="203.0.113.7")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        # a local proxy forwarding a remote client
+        response = self.client.get(url, HTTP_X_FORWARDED_FOR="203.0.113.7")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_metrics_token(self):
+        url = "http://chiron.aeonem.xyz/metrics/"
+        config = dict(settings.OBSERVABILITY, METRICS_TOKEN="secret")
+        self.client.credentials()
+        with override_settings(OBSERVABILITY=config):
+            self.assertEqual(
+                self.client.get(url, HTTP_AUTHORIZATION="Bearer wrong").status_code,
+                status.HTTP_404_NOT_FOUND,
+            )
+            response = self.client.get(
+                url, REMOTE_ADDR="203.0.113.7", HTTP_AUTHORIZATION="Bearer secret"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_sampling(self):
+        config = dict(settings.OBSERVABILITY, SAMPLE_RATE=0)
+        with override_settings(OBSERVABILITY=config):
+            response = self.client.get("http://chiron.aeonem.xyz/appointment/")
+        self.assertNotIn("Server-Timing", response)
+
+    def test_histogram(self):
+        histogram = Histogram("test_seconds", "Test.", ("route",), [0.1, 1])
+        for value in [0.05, 0.1, 0.5, 3]:
+            histogram.observe(("a",), value)
+        self.assertEqual(
+            list(histogram.samples()),
+            [
+                'test_seconds_bucket{route="a",le="0.1"} 2',
+                'test_seconds_bucket{route="a",le="1.0"} 3',
+                'test_seconds_bucket{route="a",le="+Inf"} 4',
+                'test_seconds_sum{route="a"} 3.65',
+                'test_seconds_count{route="a"} 4',
+            ],
+        )
+
+
+class SlowQueryLogTests(APITestCase):
+    def setUp(self):
+        slowlog.queries.entries.clear()
+        self.doctor = User.objects.create_user(username="test_doctor", is_doctor=True)
+        self.patient = User.objects.create_user(username="test_patient")
+        Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            date=datetime(2021, 2, 15, 9, tzinfo=timezone.utc),
+        )
+        self.client.force_authenticate(self.patient)
+
+    def entries(self, logs):
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    def slow_entries(self, path, times=1):
+        config = dict(settings.SLOW_QUERIES, THRESHOLD=0)
+        with override_settings(SLOW_QUERIES=config):
+            with self.assertLogs("chiron.slow_queries") as logs:
+                for _ in range(times):
+                    self.client.get("http://chiron.aeonem.xyz" + path)
+        # the list reads each role of the user, the patient's has the appointment
+        return [
+            entry
+            for entry in self.entries(logs)
+            if '"visits_appointment"."patient_id" = ?' in entry["sql"]
+        ]
+
+    def test_logs_plan_and_origin(self):
+        (entry,) = self.slow_entries("/appointment/")
+        self.assertEqual(entry["origin"], "GET appointment-list /appointment/")
+        self.assertEqual(entry["count"], 1)
+        self.assertIn("appointment_", " ".join(entry["plan"]))
+        self.assertNotIn("'test_patient'", entry["sql"])
+
+    def test_deduplicates_by_fingerprint(self):
+        entries = self.slow_entries("/appointment/", times=5)
+        self.assertEqual([entry["count"] for entry in entries], [1, 2, 4])
+        self.assertEqual(len({entry["fingerprint"] for entry in entries}), 1)
+
+    def test_fast_queries_are_not_logged(self):
+        with self.assertNoLogs("chiron.slow_queries"):
+            self.client.get("http://chiron.aeonem.xyz/appointment/")
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            slowlog.normalize(
+                "SELECT *  FROM t WHERE a = 'x''y' AND b IN (%s, %s,%s) LIMIT 21"
+            ),
+            "SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?",
+        )
+
+
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.settings = override_settings(
+            PROFILING=dict(settings.PROFILING, DIRECTORY=directory)
+        )
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        self.patient = User.objects.create_user(username="test_patient")
+        self.client.force_authenticate(self.patient)
+
+    def configure(self, **config):
+        return override_settings(PROFILING=dict(settings.PROFILING, **config))
+
+    def get(self, path="/appointment/", **headers):
+        return self.client.get("http://chiron.aeonem.xyz" + path, **headers)
+
+    def test_signed_requests_are_profiled(self):
+        response = self.get(HTTP_X_PROFILE=profiling.sign())
+        profile = Profile.objects.get(pk=response["X-Profile-Id"])
+        self.assertEqual(profile.route, "appointment-list")
+        self.assertEqual(profile.reason, Profile.REQUESTED)
+        stats = pstats.Stats(profile.path_on_disk)
+        self.assertTrue(
+            any(name == "list" for _, _, name in stats.stats),
+            "the view is part of the profile",
+        )
+
+    def test_unsigned_requests_are_not_profiled(self):
+        response = self.get(HTTP_X_PROFILE="profile:forged")
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertFalse(Profile.objects.exists())
+
+    def test_sampled_requests_are_kept_when_slow(self):
+        with self.configure(SAMPLE_RATE=1, THRESHOLD=60):
+            self.get()
+        self.assertFalse(Profile.objects.exists())
+        with self.configure(SAMPLE_RATE=1, THRESHOLD=0):
+            self.get("/user/drs/")
+        self.assertEqual(Profile.objects.get().reason, Profile.SLOW)
+        self.assertEqual(Profile.objects.get().route, "user-drs")
+
+    def test_ring_buffer(self):
+        with self.configure(SAMPLE_RATE=1, THRESHOLD=0, MAX_PROFILES=2):
+            for _ in range(3):
+                self.get()
+        profiles = list(Profile.objects.order_by("pk"))
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual(
+            sorted(os.listdir(settings.PROFILING["DIRECTORY"])),
+            sorted(profile.file for profile in profiles),
+        )
+
+    def test_admin(self):
+        response = self.get(HTTP_X_PROFILE=profiling.sign())
+        pk = response["X-Profile-Id"]
+        self.client.force_login(User.objects.create_superuser("test_admin"))
+        response = self.client.get(f"/admin/observability/profile/{pk}/change/")
+        self.assertContains(response, "cumulative")
+        response = self.client.get(f"/admin/observability/profile/{pk}/download/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("attachment", response["Content-Disposition"])
+        with open(Profile.objects.get(pk=pk).path_on_disk, "rb") as file:
+            self.assertEqual(b"".join(response.streaming_content), file.read())
+        response.close()
+
+
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(username="test_patient")
+        self.client.force_authenticate(self.patient)
+
+    def test_sqlite_pragmas(self):
+        with connection.cursor() as cursor:
+            for pragma, value in [
+                ("synchronous", 1),  # NORMAL
+                ("busy_timeout", 5000),
+                ("cache_size", -65536),
+                ("temp_store", 2),  # MEMORY
+            ]:
+                cursor.execute(f"PRAGMA {pragma}")
+                self.assertEqual(cursor.fetchone()[0], value, pragma)
+
+    def test_router(self):
+        self.assertEqual(router.db_for_read(User), "default")
+        with mock.patch.dict(connections.databases, {routers.REPLICA: {}}):
+            self.assertEqual(router.db_for_read(User), "default")
+            with routers.replica_reads():
+                self.assertEqual(router.db_for_read(User), routers.REPLICA)
+                self.assertEqual(router.db_for_write(User), "default")
+                with routers.replica_reads(False):
+                    self.assertEqual(router.db_for_read(User), "default")
+            self.assertFalse(router.allow_migrate(routers.REPLICA, "users"))
+        # without a replica, everything stays on default
+        with routers.replica_reads():
+            self.assertEqual(router.db_for_read(User), "default")
+
+    def reads(self, method, path, **kwargs):
+        reads = []
+        original = routers.ReadReplicaRouter.db_for_read
+
+        def db_for_read(router, model, **hints):
+            reads.append(routers.reading.get())
+            return original(router, model, **hints)
+
+        with mock.patch.object(routers.ReadReplicaRouter, "db_for_read", db_for_read):
+            response = getattr(self.client, method)(
+                "http://chiron.aeonem.xyz" + path, **kwargs
+            )
+        self.assertLess(response.status_code, 400)
+        self.assertTrue(reads)
+        return set(reads)
+
+    def test_read_only_actions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor = User.objects.create_user(username="test_doctor", is_doctor=True)
+        self.assertEqual(self.reads("get", "/appointment/changes/"), {True})
+        self.assertEqual(self.reads("get", "/user/search/", data={"q": "doc"}), {True})
+        # ETags stamp the primary's changes, the replica may not have them yet
+        self.assertEqual(self.reads("get", "/appointment/"), {False})
+        self.assertEqual(self.reads("get", "/user/drs/"), {False})
+        created = self.reads(
+            "post",
+            "/appointment/",
+            data=dict(doctor=doctor.username, date="2030-01-07T10:00:00Z"),
+            format="json",
+        )
+        self.assertEqual(created, {False})
+
+
+@modify_settings(INSTALLED_APPS={"append": "chiron.benchmarks"})
+class BenchmarkTests(APITestCase):
+    def test_generate_data(self):
+        call_command(
+            "generate_data",
+            patients=20,
+            doctors=3,
+            appointments=100,
+            batch_size=30,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(User.objects.filter(is_doctor=True).count(), 3)
+        self.assertEqual(User.objects.filter(is_patient=True).count(), 20)
+        self.assertEqual(Appointment.objects.count(), 100)
+        doctor = User.objects.get(username="gen_dr0")
+        self.assertTrue(doctor.check_password(data.PASSWORD))
+        # consecutive slots, never overlapping for a doctor
+        self.assertFalse(
+            any(
+                models.Appointment.objects.overlapping(
+                    appointment.doctor_id, appointment.date, appointment.end
+                )
+                .exclude(pk=appointment.pk)
+                .exists()
+                for appointment in Appointment.objects.filter(doctor=doctor)
+            )
+        )
+
+    def test_every_route_answers_as_expected(self):
+        patients, doctors = data.generate(10, 2, 40, prefix="bench")
+        env = endpoints.Environment(patients, doctors)
+        for name in endpoints.ROUTES:
+            result = endpoints.measure(env, name, 2)
+            self.assertEqual(result["unexpected"], 0, (name, result["statuses"]))
@@ -20,6 +20,9 @@ from django.conf import settings
 
 import chiron.apps.users.views as user_views
 import chiron.apps.visits.views as visit_views
+import chiron.apps.users.async_views as user_async_views
+import chiron.apps.visits.async_views as visit_async_views
+import chiron.apps.observability.views as observability_views
 
 router = routers.DefaultRouter()
 router.get_api_root_view().cls.__name__ = "ChironAPIRoot"
@@ -32,7 +35,21 @@ router.register("appointment", visit_views.AppointmentViewSet, basename="appoint
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("auth/", include("rest_framework.urls")),
+    path("metrics/", observability_views.metrics, name="metrics"),
     path("", include(router.urls)),
+    # async request path of the most requested reads, for ASGI deployments
+    path("async/user/me/", user_async_views.me, name="async-user-me"),
+    path("async/user/drs/", user_async_views.drs, name="async-user-drs"),
+    path(
+        "async/appointment/",
+        visit_async_views.appointment_list,
+        name="async-appointment-list",
+    ),
+    path(
+        "async/appointment/<int:pk>/",
+        visit_async_views.appointment_detail,
+        name="async-appointment-detail",
+    ),
 ]
 
 if settings.DEBUG: